@@ -18,6 +18,91 @@ class Settings:
     # Default to 7 days so users stay logged in for a week
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
     DATABASE_URL: str = os.getenv("DATABASE_URL")
+    # Connection pool (per worker). Keep workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) below Postgres max_connections
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_RECYCLE_SECONDS: int = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+    DB_POOL_TIMEOUT_SECONDS: float = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "10"))
+    # Server-side statement_timeout applied to every pooled connection (0 disables)
+    DB_STATEMENT_TIMEOUT_MS: int = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "15000"))
+    # Optional streaming replica for catalog/reporting reads; falls back to the primary when lagging or down
+    DATABASE_REPLICA_URL: str = os.getenv("DATABASE_REPLICA_URL", "")
+    REPLICA_MAX_LAG_SECONDS: float = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+    REPLICA_CHECK_INTERVAL_SECONDS: float = float(os.getenv("REPLICA_CHECK_INTERVAL_SECONDS", "5"))
+    # After a user writes, their own reads stay on the primary for this long (read-your-writes)
+    REPLICA_STICKY_SECONDS: float = float(os.getenv("REPLICA_STICKY_SECONDS", "10"))
+    # Per-request SQL accounting (Server-Timing header + log line). SQL_QUERY_BUDGET=0 disables the global budget;
+    # strict mode raises instead of logging when a route exceeds its budget (use in tests)
+    SQL_STATS_ENABLED: bool = bool(int(os.getenv("SQL_STATS_ENABLED", "1")))
+    SQL_QUERY_BUDGET: int = int(os.getenv("SQL_QUERY_BUDGET", "0"))
+    SQL_QUERY_BUDGET_STRICT: bool = bool(int(os.getenv("SQL_QUERY_BUDGET_STRICT", "0")))
+    SQL_N_PLUS_ONE_THRESHOLD: int = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "5"))
+    # Slow-query log: statements over SLOW_QUERY_MS go to an in-memory ring buffer (admin diagnostics);
+    # a sampled fraction of slow SELECTs also gets an EXPLAIN (ANALYZE, BUFFERS) plan
+    SLOW_QUERY_MS: float = float(os.getenv("SLOW_QUERY_MS", "500"))
+    SLOW_QUERY_EXPLAIN_SAMPLE_RATE: float = float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE_RATE", "0.05"))
+    SLOW_QUERY_BUFFER_SIZE: int = int(os.getenv("SLOW_QUERY_BUFFER_SIZE", "200"))
+    # Response compression (gzip, or brotli when installed) for responses >= COMPRESSION_MIN_BYTES;
+    # public GET payloads are kept precompressed in a COMPRESSION_CACHE_MB LRU (0 disables the cache)
+    COMPRESSION_ENABLED: bool = bool(int(os.getenv("COMPRESSION_ENABLED", "1")))
+    COMPRESSION_MIN_BYTES: int = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+    COMPRESSION_GZIP_LEVEL: int = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+    COMPRESSION_BROTLI_QUALITY: int = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+    COMPRESSION_CACHE_MB: int = int(os.getenv("COMPRESSION_CACHE_MB", "32"))
+    # Microcache for anonymous catalog GETs (per worker): listings/product detail, and the slower-changing
+    # categories/banners/payment config; stale entries are served while one request refreshes them
+    MICROCACHE_ENABLED: bool = bool(int(os.getenv("MICROCACHE_ENABLED", "1")))
+    MICROCACHE_TTL_SECONDS: float = float(os.getenv("MICROCACHE_TTL_SECONDS", "5"))
+    MICROCACHE_STATIC_TTL_SECONDS: float = float(os.getenv("MICROCACHE_STATIC_TTL_SECONDS", "30"))
+    MICROCACHE_STALE_SECONDS: float = float(os.getenv("MICROCACHE_STALE_SECONDS", "30"))
+    MICROCACHE_MAX_ENTRIES: int = int(os.getenv("MICROCACHE_MAX_ENTRIES", "1000"))
+    # Prometheus scrape endpoint (GET /metrics); requires "Authorization: Bearer <METRICS_TOKEN>", and
+    # without a token it only answers direct loopback requests (local scraper, development)
+    METRICS_ENABLED: bool = bool(int(os.getenv("METRICS_ENABLED", "1")))
+    METRICS_TOKEN: str = os.getenv("METRICS_TOKEN", "")
+    # On-demand request profiling: admins send "X-Profile: 1"; PROFILING_SAMPLE_RATE also profiles a random share
+    PROFILING_ENABLED: bool = bool(int(os.getenv("PROFILING_ENABLED", "1")))
+    PROFILING_SAMPLE_RATE: float = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+    PROFILING_INTERVAL_MS: float = float(os.getenv("PROFILING_INTERVAL_MS", "5"))
+    PROFILING_BUFFER_SIZE: int = int(os.getenv("PROFILING_BUFFER_SIZE", "50"))
+    # Memory diagnostics: MEMORY_TRACEMALLOC_FRAMES > 0 starts tracemalloc at boot (admins can also start it
+    # at runtime); while tracing, MEMORY_ROUTE_SAMPLE_RATE of requests get their allocation peak recorded per route
+    MEMORY_TRACEMALLOC_FRAMES: int = int(os.getenv("MEMORY_TRACEMALLOC_FRAMES", "0"))
+    MEMORY_ROUTE_SAMPLE_RATE: float = float(os.getenv("MEMORY_ROUTE_SAMPLE_RATE", "0.01"))
+    # Upload size caps by sniffed kind; larger files are refused with 413 while streaming
+    MEDIA_MAX_IMAGE_MB: float = float(os.getenv("MEDIA_MAX_IMAGE_MB", "20"))
+    MEDIA_MAX_VIDEO_MB: float = float(os.getenv("MEDIA_MAX_VIDEO_MB", "200"))
+    # Remote image imports (image_urls): timeout per download and downloads in flight per worker
+    MEDIA_FETCH_TIMEOUT_SECONDS: float = float(os.getenv("MEDIA_FETCH_TIMEOUT_SECONDS", "15"))
+    MEDIA_FETCH_CONCURRENCY: int = int(os.getenv("MEDIA_FETCH_CONCURRENCY", "8"))
+    # Responsive image variants (needs Pillow): widths, formats and encoder processes per worker
+    MEDIA_VARIANTS_ENABLED: bool = bool(int(os.getenv("MEDIA_VARIANTS_ENABLED", "1")))
+    MEDIA_VARIANT_WIDTHS: str = os.getenv("MEDIA_VARIANT_WIDTHS", "320,640,960,1280,1920")
+    MEDIA_VARIANT_FORMATS: str = os.getenv("MEDIA_VARIANT_FORMATS", "webp,avif")
+    MEDIA_VARIANT_WORKERS: int = int(os.getenv("MEDIA_VARIANT_WORKERS", "2"))
+    # On-demand resizing (/media/...?w=&h=&fmt=): allowed sizes and the on-disk result cache
+    MEDIA_RESIZE_ENABLED: bool = bool(int(os.getenv("MEDIA_RESIZE_ENABLED", "1")))
+    MEDIA_RESIZE_SIZES: str = os.getenv("MEDIA_RESIZE_SIZES", "64,96,128,160,200,240,320,400,480,640,768,960,1080,1280,1600,1920")
+    MEDIA_RESIZE_CACHE_DIR: str = os.getenv("MEDIA_RESIZE_CACHE_DIR", "")
+    MEDIA_RESIZE_CACHE_MB: int = int(os.getenv("MEDIA_RESIZE_CACHE_MB", "1024"))
+    # Behind nginx: internal location prefix for X-Accel-Redirect, so nginx sends media bodies (sendfile)
+    MEDIA_ACCEL_REDIRECT_PREFIX: str = os.getenv("MEDIA_ACCEL_REDIRECT_PREFIX", "")
+    # Where media bytes live: "local" (MEDIA_ROOT) or "s3" (any S3-compatible bucket, needs boto3)
+    MEDIA_STORAGE_BACKEND: str = os.getenv("MEDIA_STORAGE_BACKEND", "local")
+    # S3 bucket and endpoint (empty endpoint = AWS; e.g. http://localhost:9000 for MinIO)
+    MEDIA_S3_BUCKET: str = os.getenv("MEDIA_S3_BUCKET", "")
+    MEDIA_S3_ENDPOINT_URL: str = os.getenv("MEDIA_S3_ENDPOINT_URL", "")
+    MEDIA_S3_REGION: str = os.getenv("MEDIA_S3_REGION", "")
+    # Key prefix inside the bucket (e.g. "kidora/"); keys otherwise equal the /media URL path
+    MEDIA_S3_PREFIX: str = os.getenv("MEDIA_S3_PREFIX", "")
+    # Public/CDN base URL of the bucket; when set /media redirects there instead of streaming
+    MEDIA_S3_PUBLIC_URL: str = os.getenv("MEDIA_S3_PUBLIC_URL", "")
+    # Multipart upload part size (S3 minimum is 5); files up to one part use a single PUT
+    MEDIA_S3_PART_MB: int = int(os.getenv("MEDIA_S3_PART_MB", "8"))
+    # Create the bucket on first use (development/MinIO)
+    MEDIA_S3_CREATE_BUCKET: bool = bool(int(os.getenv("MEDIA_S3_CREATE_BUCKET", "0")))
+    # Run pending schema migrations on startup; set 0 when `python -m app.migrations` runs at release time
+    AUTO_MIGRATE: bool = bool(int(os.getenv("AUTO_MIGRATE", "1")))
     # Primary legacy single admin email (kept for backward compatibility)
     ADMIN_EMAIL: str = os.getenv("ADMIN_EMAIL")
     # Optional comma separated list of additional admin emails (including primary if desired)
@@ -28,6 +113,9 @@ class Settings:
     EMAIL_BACKEND: str = os.getenv("EMAIL_BACKEND", "console").lower()
     # Feature flag for sending notification emails
     ENABLE_EMAIL_NOTIFICATIONS: bool = bool(int(os.getenv("ENABLE_EMAIL_NOTIFICATIONS", "1")))
+    # Password reset codes: wrong guesses allowed per code, and how often stale rows are purged
+    OTP_MAX_ATTEMPTS: int = int(os.getenv("OTP_MAX_ATTEMPTS", "5"))
+    OTP_PURGE_INTERVAL_SECONDS: int = int(os.getenv("OTP_PURGE_INTERVAL_SECONDS", "900"))
 
 
 @lru_cache
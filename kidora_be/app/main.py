@@ -1,5 +1,4 @@
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 from app.routers import auth, products
@@ -13,230 +12,116 @@ from app.routers import user as user_router
 from app.routers import admin_dashboard
 from app.routers import admin_returns
 from app.utils.storage import MEDIA_ROOT
-from sqlalchemy import text
+from app.utils import scheduler
+from app.utils.fast_json import FastJSONResponse
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
 
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 
 @app.on_event("startup")
 def on_startup():
-    # Ensure all DB tables exist after all models are imported
-    from app.models.user import Base, engine  # Base/engine single source
-    import app.models.product  # register Product model
-    import app.models.cart  # register Cart/CartItem models
-    import app.models.order  # register Order/OrderItem models
-    import app.models.wishlist  # register Wishlist models
-    import app.models.address  # register Address model
-    import app.models.hero_banner  # register HeroBanner model
-    import app.models.return_request  # register ReturnRequest model
-    import app.models.payment_config  # register PaymentConfig model
-    Base.metadata.create_all(bind=engine)
-
-    # Lightweight, idempotent migrations for schema drift across environments
-    # - Ensure hero_banners.updated_at exists (matches SQLAlchemy model)
-    # - Ensure hero_banners.link_url exists and backfill from legacy button_link if present
+    # Apply pending versioned migrations (app/migrations/versions.py). When the schema is
+    # current this is a single version read; otherwise one worker migrates under an advisory lock.
+    from app.config import get_settings
+    from app.models.user import engine  # Base/engine single source
+    from app.migrations.runner import run_migrations, check_schema_version
     try:
-        with engine.begin() as conn:
-            conn.execute(text(
-                "ALTER TABLE IF EXISTS hero_banners "
-                "ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP"
-            ))
-            conn.execute(text(
-                "ALTER TABLE IF EXISTS hero_banners "
-                "ADD COLUMN IF NOT EXISTS link_url VARCHAR(255)"
-            ))
-            # Best-effort backfill from previous column name if it exists
-            # This UPDATE will be a no-op if button_link doesn't exist
-            try:
-                conn.execute(text(
-                    "UPDATE hero_banners SET link_url = button_link "
-                    "WHERE link_url IS NULL AND button_link IS NOT NULL"
-                ))
-            except Exception:
-                # Ignore if button_link column isn't present
-                pass
-
-            # Ensure wishlist tables are aligned with models
-            # Add missing wishlist_id column on wishlist_items if schema drifted
-            conn.execute(text(
-                "ALTER TABLE IF EXISTS wishlist_items "
-                "ADD COLUMN IF NOT EXISTS wishlist_id INTEGER"
-            ))
-            # Add missing user_id column on wishlist_items for legacy compatibility
-            conn.execute(text(
-                "ALTER TABLE IF EXISTS wishlist_items "
-                "ADD COLUMN IF NOT EXISTS user_id INTEGER"
-            ))
-            # Add missing created_at column on wishlist_items if schema drifted
-            conn.execute(text(
-                "ALTER TABLE IF EXISTS wishlist_items "
-                "ADD COLUMN IF NOT EXISTS created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP"
-            ))
-            # Helpful index for join/filter
-            conn.execute(text(
-                "CREATE INDEX IF NOT EXISTS ix_wishlist_items_wishlist_id ON wishlist_items (wishlist_id)"
-            ))
-            # Attempt to add FK; ignore if it already exists
-            try:
-                conn.execute(text(
-                    "ALTER TABLE IF EXISTS wishlist_items "
-                    "ADD CONSTRAINT fk_wishlist_items_wishlist_id "
-                    "FOREIGN KEY (wishlist_id) REFERENCES wishlists(id) ON DELETE CASCADE"
-                ))
-            except Exception:
-                pass
-
-            # --- Backfill and relax legacy wishlist_items.user_id column if present ---
-            # Some environments previously used a user_id column on wishlist_items (NOT NULL).
-            # Our current model uses wishlist_id instead. To avoid INSERT failures, we:
-            # 1) Ensure each user referenced by wishlist_items has a wishlist row.
-            # 2) Backfill missing wishlist_id from user_id.
-            # 3) Backfill missing user_id from wishlist.user_id (best-effort).
-            # 4) Drop NOT NULL from wishlist_items.user_id so inserts without user_id succeed.
-            try:
-                # 1) Create missing wishlists for legacy rows (only if user_id column exists)
-                conn.execute(text(
-                    "INSERT INTO wishlists (user_id) "
-                    "SELECT DISTINCT wi.user_id FROM wishlist_items wi "
-                    "LEFT JOIN wishlists w ON w.user_id = wi.user_id "
-                    "WHERE wi.user_id IS NOT NULL AND w.id IS NULL"
-                ))
-            except Exception:
-                pass
-            try:
-                # 2) Backfill wishlist_id where NULL using the user's wishlist
-                conn.execute(text(
-                    "UPDATE wishlist_items wi SET wishlist_id = w.id "
-                    "FROM wishlists w "
-                    "WHERE wi.wishlist_id IS NULL AND wi.user_id IS NOT NULL AND w.user_id = wi.user_id"
-                ))
-            except Exception:
-                pass
-            try:
-                # 3) Backfill user_id where NULL using parent wishlist
-                conn.execute(text(
-                    "UPDATE wishlist_items wi SET user_id = w.user_id "
-                    "FROM wishlists w "
-                    "WHERE wi.user_id IS NULL AND wi.wishlist_id IS NOT NULL AND w.id = wi.wishlist_id"
-                ))
-            except Exception:
-                pass
-            try:
-                # Drop legacy unique constraints on (user_id, product_id) if present
-                conn.execute(text(
-                    "ALTER TABLE IF EXISTS wishlist_items DROP CONSTRAINT IF EXISTS wishlist_items_user_id_product_id_key"
-                ))
-            except Exception:
-                pass
-            try:
-                # Ensure unified unique constraint on (wishlist_id, product_id)
-                conn.execute(text(
-                    "ALTER TABLE IF EXISTS wishlist_items ADD CONSTRAINT uq_wishlist_product UNIQUE (wishlist_id, product_id)"
-                ))
-            except Exception:
-                pass
-            try:
-                # 4) Drop NOT NULL on user_id so future inserts without user_id don't fail
-                conn.execute(text(
-                    "ALTER TABLE IF EXISTS wishlist_items ALTER COLUMN user_id DROP NOT NULL"
-                ))
-            except Exception:
-                # Column may not exist; ignore
-                pass
-
-            # Ensure new payment columns exist on orders table for online payments
-            try:
-                conn.execute(text(
-                    "ALTER TABLE IF EXISTS orders ADD COLUMN IF NOT EXISTS payment_provider VARCHAR(50)"
-                ))
-                conn.execute(text(
-                    "ALTER TABLE IF EXISTS orders ADD COLUMN IF NOT EXISTS payment_sender_number VARCHAR(50)"
-                ))
-                conn.execute(text(
-                    "ALTER TABLE IF EXISTS orders ADD COLUMN IF NOT EXISTS payment_transaction_id VARCHAR(100)"
-                ))
-                conn.execute(text(
-                    "ALTER TABLE IF EXISTS orders ADD COLUMN IF NOT EXISTS shipping_name VARCHAR(255)"
-                ))
-                conn.execute(text(
-                    "ALTER TABLE IF EXISTS orders ADD COLUMN IF NOT EXISTS shipping_phone VARCHAR(50)"
-                ))
-            except Exception:
-                pass
-
-            # Ensure per-size inventory column exists on products
-            try:
-                conn.execute(text(
-                    "ALTER TABLE IF EXISTS products ADD COLUMN IF NOT EXISTS sizes_stock JSONB"
-                ))
-            except Exception:
-                pass
-
-            # Ensure video_url column exists on products
-            try:
-                conn.execute(text(
-                    "ALTER TABLE IF EXISTS products ADD COLUMN IF NOT EXISTS video_url VARCHAR(500)"
-                ))
-            except Exception:
-                pass
-
-            # Ensure free_shipping column exists on products (boolean default false)
-            try:
-                conn.execute(text(
-                    "ALTER TABLE IF EXISTS products ADD COLUMN IF NOT EXISTS free_shipping BOOLEAN DEFAULT FALSE"
-                ))
-            except Exception:
-                pass
-
-            # Ensure orders.status and orders.payment_status check constraints allow our canonical set
-            # Normalize any existing lowercase/mismatched values before re-adding constraints
-            try:
-                conn.execute(text("UPDATE orders SET status = UPPER(status) WHERE status IS NOT NULL"))
-                conn.execute(text("UPDATE orders SET payment_status = UPPER(payment_status) WHERE payment_status IS NOT NULL"))
-            except Exception:
-                pass
-            try:
-                # Drop existing constraints if present (names may vary; handle common names)
-                conn.execute(text("ALTER TABLE IF EXISTS orders DROP CONSTRAINT IF EXISTS orders_status_check"))
-            except Exception:
-                pass
-            try:
-                conn.execute(text("ALTER TABLE IF EXISTS orders DROP CONSTRAINT IF EXISTS order_status_check"))
-            except Exception:
-                pass
-            try:
-                conn.execute(text("ALTER TABLE IF EXISTS orders DROP CONSTRAINT IF EXISTS orders_payment_status_check"))
-            except Exception:
-                pass
-            try:
-                conn.execute(text("ALTER TABLE IF EXISTS orders DROP CONSTRAINT IF EXISTS order_payment_status_check"))
-            except Exception:
-                pass
-
-            # Recreate constraints with UPPER() to accept any case and enforce canonical values
-            try:
-                conn.execute(text(
-                    "ALTER TABLE IF EXISTS orders "
-                    "ADD CONSTRAINT orders_status_check CHECK (UPPER(status) IN ('PENDING','CONFIRMED','PACKED','OUT_FOR_DELIVERY','SHIPPED','DELIVERED','CANCELLED'))"
-                ))
-            except Exception:
-                pass
-            try:
-                conn.execute(text(
-                    "ALTER TABLE IF EXISTS orders "
-                    "ADD CONSTRAINT orders_payment_status_check CHECK (UPPER(payment_status) IN ('PENDING','PAID','REFUNDED'))"
-                ))
-            except Exception:
-                pass
+        if get_settings().AUTO_MIGRATE:
+            run_migrations(engine)
     except Exception as e:
         logging.error(f"Startup migration failed: {e}")
+    # Verify the schema once here; request handlers fail fast instead of issuing DDL
+    try:
+        check_schema_version(engine)
+    except Exception as e:
+        logging.error(f"Schema version check failed: {e}")
+
+
+@app.on_event("startup")
+async def start_background_jobs():
+    from app.config import get_settings
+    from app.utils.security import purge_stale_otps
+    settings = get_settings()
+    # Keep the otps table down to live codes (used/expired rows are purged)
+    scheduler.schedule_periodic("purge_stale_otps", settings.OTP_PURGE_INTERVAL_SECONDS, purge_stale_otps, initial_delay=30)
+    # Replica lag probe; reads stay on the primary until the first successful check
+    from app.models.replica import replica_engine, refresh_replica_health
+    if replica_engine is not None:
+        scheduler.schedule_periodic("replica_health", settings.REPLICA_CHECK_INTERVAL_SECONDS, refresh_replica_health, initial_delay=0)
+
+
+@app.on_event("shutdown")
+async def stop_background_jobs():
+    await scheduler.stop_all()
+    from app.utils.media_variants import shutdown_pool
+    shutdown_pool()
+    from app.models.async_db import async_engine
+    from app.models.replica import async_replica_engine
+    await async_engine.dispose()
+    if async_replica_engine is not None:
+        await async_replica_engine.dispose()
 
 # Ensure media directory exists before mounting
 MEDIA_ROOT.mkdir(parents=True, exist_ok=True)
 
-# Serve uploaded media files
-app.mount("/media", StaticFiles(directory=str(MEDIA_ROOT)), name="media")
+# Serve uploaded media files from the storage backend (immutable caching, strong ETags, ranges);
+# ?w=&h=&fmt= requests get resized copies from a local disk cache
+from app.config import get_settings as _get_settings
+from app.utils.media_resize import MediaResizeApp
+from app.utils.media_server import MediaFiles
+from app.utils.storage import BASE_DIR as _BASE_DIR
+from app.utils.storage_backends import get_backend
+_settings = _get_settings()
+app.mount(
+    "/media",
+    MediaResizeApp(
+        MediaFiles(get_backend(), accel_prefix=_settings.MEDIA_ACCEL_REDIRECT_PREFIX or None),
+        cache_dir=_settings.MEDIA_RESIZE_CACHE_DIR or str(_BASE_DIR / "media_cache"),
+        max_bytes=_settings.MEDIA_RESIZE_CACHE_MB * 1024 * 1024,
+        sizes=[int(s) for s in _settings.MEDIA_RESIZE_SIZES.split(",") if s.strip()],
+        enabled=_settings.MEDIA_RESIZE_ENABLED,
+    ),
+    name="media",
+)
+
+# Innermost: sampling profiler for admin "X-Profile: 1" requests (and PROFILING_SAMPLE_RATE)
+from app.utils.profiling import ProfilingMiddleware
+if _settings.PROFILING_ENABLED:
+    app.add_middleware(
+        ProfilingMiddleware,
+        sample_rate=_settings.PROFILING_SAMPLE_RATE,
+        interval_ms=_settings.PROFILING_INTERVAL_MS,
+        buffer_size=_settings.PROFILING_BUFFER_SIZE,
+    )
+
+# Allocation peaks of sampled requests per route (only while tracemalloc is tracing)
+from app.utils.memory import MemorySamplingMiddleware, start_tracing
+if _settings.MEMORY_TRACEMALLOC_FRAMES > 0:
+    start_tracing(_settings.MEMORY_TRACEMALLOC_FRAMES)
+if _settings.MEMORY_ROUTE_SAMPLE_RATE > 0:
+    app.add_middleware(MemorySamplingMiddleware, sample_rate=_settings.MEMORY_ROUTE_SAMPLE_RATE)
+
+# Per-request SQL counts / DB time (Server-Timing header, N+1 and query budget warnings)
+from app.utils.query_stats import QueryStatsMiddleware
+if _settings.SQL_STATS_ENABLED:
+    app.add_middleware(
+        QueryStatsMiddleware,
+        default_budget=_settings.SQL_QUERY_BUDGET,
+        strict=_settings.SQL_QUERY_BUDGET_STRICT,
+        n_plus_one_threshold=_settings.SQL_N_PLUS_ONE_THRESHOLD,
+    )
+
+# Anonymous catalog GETs: short-TTL full-response cache with single-flight and stale-while-revalidate.
+# Sits inside CORS so per-origin headers are never cached.
+from app.utils.microcache import MicrocacheMiddleware, default_rules
+if _settings.MICROCACHE_ENABLED:
+    app.add_middleware(
+        MicrocacheMiddleware,
+        rules=default_rules(_settings.MICROCACHE_TTL_SECONDS, _settings.MICROCACHE_STATIC_TTL_SECONDS),
+        stale_seconds=_settings.MICROCACHE_STALE_SECONDS,
+        max_entries=_settings.MICROCACHE_MAX_ENTRIES,
+    )
 
 # CORS configuration for frontend
 app.add_middleware(
@@ -247,6 +132,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost: compress final response bodies (streamed media passes through)
+from app.utils.compression import CompressionMiddleware
+if _settings.COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=_settings.COMPRESSION_MIN_BYTES,
+        gzip_level=_settings.COMPRESSION_GZIP_LEVEL,
+        brotli_quality=_settings.COMPRESSION_BROTLI_QUALITY,
+        cache_bytes=_settings.COMPRESSION_CACHE_MB * 1024 * 1024,
+    )
+
+# Outside everything else: request latency/status by route template, in-flight requests
+from app.utils.request_metrics import RequestMetricsMiddleware
+if _settings.METRICS_ENABLED:
+    app.add_middleware(RequestMetricsMiddleware)
+
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(products.router, prefix="/api/products", tags=["products"])
@@ -262,6 +163,11 @@ app.include_router(admin_dashboard.router, prefix="/api/admin", tags=["admin-das
 app.include_router(admin_returns.router, prefix="/api/admin/returns", tags=["admin-returns"])
 from app.routers import admin_payment_config
 app.include_router(admin_payment_config.router, prefix="/api", tags=["payment-config"])
+from app.routers import admin_diagnostics
+app.include_router(admin_diagnostics.router, prefix="/api/admin/diagnostics", tags=["admin-diagnostics"])
+if _settings.METRICS_ENABLED:
+    from app.routers import metrics as metrics_router
+    app.include_router(metrics_router.router, tags=["metrics"])
 
 
 # --- Entry point for Railway / local ---
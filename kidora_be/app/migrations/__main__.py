@@ -0,0 +1,10 @@
+"""Apply pending schema migrations: `python -m app.migrations` (e.g. as a release/pre-deploy step)."""
+import logging
+
+from app.migrations.runner import run_migrations
+from app.models.user import engine
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+
+if __name__ == "__main__":
+    run_migrations(engine)
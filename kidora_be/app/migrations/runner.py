@@ -0,0 +1,182 @@
+import logging
+import time
+from typing import Callable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from app.utils.metrics import Gauge
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION = Gauge("db_schema_version", "Schema revision applied in the database (read once at startup)")
+SCHEMA_EXPECTED_VERSION = Gauge("db_schema_expected_version", "Latest schema revision known to this build")
+
+# Filled by check_schema_version() at startup; request handlers never probe the schema themselves
+schema_state = {"version": None, "expected": None, "current": None}
+
+# Arbitrary but fixed key for pg_advisory_lock; every worker must use the same value
+MIGRATION_LOCK_KEY = 0x6B69646F7261  # "kidora"
+
+
+class Migration:
+    """A single schema revision. `upgrade` receives a connection inside an open transaction.
+
+    Revisions with transactional=False run in autocommit mode instead (needed for
+    CREATE INDEX CONCURRENTLY); they must be safe to re-run after a partial failure.
+    """
+
+    def __init__(self, version: int, name: str, upgrade: Callable[[Connection], None], transactional: bool = True):
+        self.version = version
+        self.name = name
+        self.upgrade = upgrade
+        self.transactional = transactional
+
+    def __repr__(self) -> str:
+        return f"<Migration {self.version:04d} {self.name}>"
+
+
+def best_effort(conn: Connection, sql: str) -> bool:
+    """Execute `sql` inside a SAVEPOINT so a failure doesn't abort the surrounding transaction.
+
+    Used for legacy drift fixes where the object may or may not exist. Returns True on success.
+    """
+    try:
+        with conn.begin_nested():
+            conn.execute(text(sql))
+        return True
+    except Exception as e:
+        logger.debug("Migration statement skipped (%s): %s", e.__class__.__name__, sql)
+        return False
+
+
+def create_index_concurrently(conn: Connection, name: str, table: str, columns: str) -> None:
+    """Build an index without blocking writes. Use only in transactional=False revisions.
+
+    An interrupted CONCURRENTLY build leaves an INVALID index behind that IF NOT EXISTS would
+    happily skip, so drop such leftovers first.
+    """
+    invalid = conn.execute(text(
+        "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = :name AND NOT i.indisvalid"
+    ), {"name": name}).scalar()
+    if invalid:
+        logger.warning("Dropping invalid index %s left by an interrupted build", name)
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns})"))
+
+
+def _current_version(conn: Connection) -> int:
+    exists = conn.execute(text("SELECT to_regclass('schema_migrations')")).scalar()
+    if not exists:
+        return 0
+    return int(conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")).scalar() or 0)
+
+
+def _ensure_version_table(conn: Connection) -> None:
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, "
+        "name VARCHAR(200) NOT NULL, "
+        "applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+    ))
+
+
+def _record_version(conn: Connection, m: Migration) -> None:
+    conn.execute(
+        text("INSERT INTO schema_migrations (version, name) VALUES (:v, :n)"),
+        {"v": m.version, "n": m.name},
+    )
+
+
+def latest_version(migrations: Optional[List[Migration]] = None) -> int:
+    if migrations is None:
+        from app.migrations.versions import MIGRATIONS
+        migrations = MIGRATIONS
+    return max((m.version for m in migrations), default=0)
+
+
+def get_schema_version(engine: Engine) -> int:
+    """Return the highest applied revision (0 for an unmanaged database)."""
+    with engine.connect() as conn:
+        return _current_version(conn)
+
+
+def check_schema_version(engine: Engine) -> bool:
+    """Record the database revision against the one this build expects. Returns True when current.
+
+    Called once at startup (after any migration attempt) so requests can fail fast on schema
+    errors instead of trying to repair the schema themselves.
+    """
+    expected = latest_version()
+    version = get_schema_version(engine)
+    current = version >= expected
+    schema_state.update(version=version, expected=expected, current=current)
+    SCHEMA_VERSION.set(version)
+    SCHEMA_EXPECTED_VERSION.set(expected)
+    if not current:
+        logger.error(
+            "Database schema is at revision %s but this build expects %s; run `python -m app.migrations`",
+            version, expected,
+        )
+    return current
+
+
+def run_migrations(engine: Engine, migrations: Optional[List[Migration]] = None) -> int:
+    """Apply pending revisions and return the resulting schema version.
+
+    Fast path: one read of schema_migrations; nothing else runs when the database is current.
+    Slow path: take a Postgres session advisory lock so only one worker migrates, re-check the
+    version (another worker may have finished meanwhile), then apply each pending revision in
+    its own transaction and record it.
+    """
+    if migrations is None:
+        from app.migrations.versions import MIGRATIONS
+        migrations = MIGRATIONS
+    target = latest_version(migrations)
+    started = time.perf_counter()
+
+    with engine.connect() as conn:
+        current = _current_version(conn)
+        conn.rollback()
+        if current >= target:
+            logger.info("Schema up to date at revision %s (%.1f ms)", current, (time.perf_counter() - started) * 1000)
+            return current
+
+        # Migrations (and waiting on the lock) may legitimately outlive DB_STATEMENT_TIMEOUT_MS
+        conn.execute(text("SET statement_timeout = 0"))
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        conn.commit()
+        try:
+            with conn.begin():
+                _ensure_version_table(conn)
+            current = _current_version(conn)
+            conn.rollback()
+            for m in sorted(migrations, key=lambda m: m.version):
+                if m.version <= current:
+                    continue
+                t0 = time.perf_counter()
+                if m.transactional:
+                    with conn.begin():
+                        m.upgrade(conn)
+                        _record_version(conn, m)
+                else:
+                    conn.execution_options(isolation_level="AUTOCOMMIT")
+                    try:
+                        m.upgrade(conn)
+                        conn.commit()
+                    finally:
+                        conn.rollback()
+                        conn.execution_options(isolation_level=conn.default_isolation_level)
+                    with conn.begin():
+                        _record_version(conn, m)
+                current = m.version
+                logger.info("Applied migration %04d %s in %.1f ms", m.version, m.name, (time.perf_counter() - t0) * 1000)
+        finally:
+            conn.rollback()
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            conn.execute(text("RESET statement_timeout"))
+            conn.commit()
+
+    logger.info("Schema migrated to revision %s (%.1f ms)", current, (time.perf_counter() - started) * 1000)
+    return current
@@ -0,0 +1,380 @@
+"""Ordered schema revisions. Append new entries; never edit or renumber applied ones.
+
+Every revision must be idempotent (IF [NOT] EXISTS, guarded UPDATEs) because databases that
+predate the runner already carry some of these changes from the old startup block. Spell
+the DDL out rather than deriving it from the models, so a revision keeps doing the same thing
+after the models move on.
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.migrations.runner import Migration, best_effort, create_index_concurrently
+
+# Tables and indexes as the models defined them at revision 1, frozen here so the baseline
+# never changes with the models: anything added later (columns, tables, indexes) is created
+# by its own revision, on fresh and existing databases alike. Never edit.
+_BASELINE_DDL = (
+    """
+    CREATE TABLE IF NOT EXISTS hero_banners (
+        id SERIAL NOT NULL,
+        title VARCHAR(255),
+        subtitle VARCHAR(500),
+        image_url VARCHAR(255),
+        link_url VARCHAR(255),
+        created_at TIMESTAMP WITHOUT TIME ZONE,
+        updated_at TIMESTAMP WITHOUT TIME ZONE,
+        PRIMARY KEY (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_hero_banners_id ON hero_banners (id)",
+    """
+    CREATE TABLE IF NOT EXISTS otps (
+        id SERIAL NOT NULL,
+        email VARCHAR(255),
+        code VARCHAR(10),
+        created_at TIMESTAMP WITHOUT TIME ZONE,
+        expires_at TIMESTAMP WITHOUT TIME ZONE,
+        used BOOLEAN,
+        PRIMARY KEY (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_otps_email ON otps (email)",
+    "CREATE INDEX IF NOT EXISTS ix_otps_id ON otps (id)",
+    """
+    CREATE TABLE IF NOT EXISTS payment_config (
+        id SERIAL NOT NULL,
+        bkash_number VARCHAR(30),
+        nagad_number VARCHAR(30),
+        rocket_number VARCHAR(30),
+        updated_at TIMESTAMP WITHOUT TIME ZONE,
+        PRIMARY KEY (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_payment_config_id ON payment_config (id)",
+    """
+    CREATE TABLE IF NOT EXISTS products (
+        id SERIAL NOT NULL,
+        title VARCHAR(255) NOT NULL,
+        description VARCHAR(1000),
+        price NUMERIC(10, 2) NOT NULL,
+        category VARCHAR(100),
+        stock INTEGER,
+        rating FLOAT,
+        discount INTEGER,
+        main_image VARCHAR(255),
+        video_url VARCHAR(500),
+        images JSONB,
+        sizes_stock JSONB,
+        free_shipping BOOLEAN,
+        PRIMARY KEY (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_products_category ON products (category)",
+    "CREATE INDEX IF NOT EXISTS ix_products_id ON products (id)",
+    """
+    CREATE TABLE IF NOT EXISTS token_blacklist (
+        id SERIAL NOT NULL,
+        jti VARCHAR(255) NOT NULL,
+        created_at TIMESTAMP WITHOUT TIME ZONE,
+        PRIMARY KEY (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_token_blacklist_id ON token_blacklist (id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_token_blacklist_jti ON token_blacklist (jti)",
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id SERIAL NOT NULL,
+        first_name VARCHAR(100),
+        last_name VARCHAR(100),
+        email VARCHAR(255),
+        phone VARCHAR(20),
+        password VARCHAR(255) NOT NULL,
+        role VARCHAR(20),
+        PRIMARY KEY (id)
+    )
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_email ON users (email)",
+    "CREATE INDEX IF NOT EXISTS ix_users_id ON users (id)",
+    """
+    CREATE TABLE IF NOT EXISTS addresses (
+        id SERIAL NOT NULL,
+        user_id INTEGER NOT NULL,
+        street VARCHAR(255) NOT NULL,
+        city VARCHAR(100) NOT NULL,
+        state VARCHAR(100) NOT NULL,
+        zip_code VARCHAR(20) NOT NULL,
+        country VARCHAR(100) NOT NULL,
+        is_default BOOLEAN,
+        created_at TIMESTAMP WITHOUT TIME ZONE,
+        updated_at TIMESTAMP WITHOUT TIME ZONE,
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES users (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_addresses_id ON addresses (id)",
+    "CREATE INDEX IF NOT EXISTS ix_addresses_user_id ON addresses (user_id)",
+    """
+    CREATE TABLE IF NOT EXISTS carts (
+        id SERIAL NOT NULL,
+        user_id INTEGER NOT NULL,
+        created_at TIMESTAMP WITHOUT TIME ZONE,
+        updated_at TIMESTAMP WITHOUT TIME ZONE,
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES users (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_carts_id ON carts (id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_carts_user_id ON carts (user_id)",
+    """
+    CREATE TABLE IF NOT EXISTS orders (
+        id SERIAL NOT NULL,
+        user_id INTEGER NOT NULL,
+        shipping_name VARCHAR(255),
+        shipping_phone VARCHAR(50),
+        shipping_street VARCHAR(255),
+        shipping_city VARCHAR(100),
+        shipping_state VARCHAR(100),
+        shipping_zip_code VARCHAR(20),
+        shipping_country VARCHAR(100),
+        payment_method VARCHAR(50),
+        payment_provider VARCHAR(50),
+        payment_sender_number VARCHAR(50),
+        payment_transaction_id VARCHAR(100),
+        total_amount FLOAT,
+        status VARCHAR(20),
+        payment_status VARCHAR(20),
+        created_at TIMESTAMP WITHOUT TIME ZONE,
+        updated_at TIMESTAMP WITHOUT TIME ZONE,
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES users (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_orders_id ON orders (id)",
+    "CREATE INDEX IF NOT EXISTS ix_orders_user_id ON orders (user_id)",
+    """
+    CREATE TABLE IF NOT EXISTS wishlists (
+        id SERIAL NOT NULL,
+        user_id INTEGER NOT NULL,
+        created_at TIMESTAMP WITHOUT TIME ZONE,
+        updated_at TIMESTAMP WITHOUT TIME ZONE,
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES users (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_wishlists_id ON wishlists (id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_wishlists_user_id ON wishlists (user_id)",
+    """
+    CREATE TABLE IF NOT EXISTS cart_items (
+        id SERIAL NOT NULL,
+        cart_id INTEGER NOT NULL,
+        product_id INTEGER NOT NULL,
+        selected_size VARCHAR(50),
+        quantity INTEGER NOT NULL,
+        created_at TIMESTAMP WITHOUT TIME ZONE,
+        updated_at TIMESTAMP WITHOUT TIME ZONE,
+        PRIMARY KEY (id),
+        CONSTRAINT uq_cart_product_size UNIQUE (cart_id, product_id, selected_size),
+        FOREIGN KEY(cart_id) REFERENCES carts (id),
+        FOREIGN KEY(product_id) REFERENCES products (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_cart_items_cart_id ON cart_items (cart_id)",
+    "CREATE INDEX IF NOT EXISTS ix_cart_items_id ON cart_items (id)",
+    """
+    CREATE TABLE IF NOT EXISTS order_items (
+        id SERIAL NOT NULL,
+        order_id INTEGER NOT NULL,
+        product_id INTEGER NOT NULL,
+        quantity INTEGER NOT NULL,
+        selected_size VARCHAR(50),
+        price FLOAT NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY(order_id) REFERENCES orders (id),
+        FOREIGN KEY(product_id) REFERENCES products (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_order_items_id ON order_items (id)",
+    "CREATE INDEX IF NOT EXISTS ix_order_items_order_id ON order_items (order_id)",
+    """
+    CREATE TABLE IF NOT EXISTS return_requests (
+        id SERIAL NOT NULL,
+        order_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        reason VARCHAR(500),
+        status VARCHAR(20),
+        created_at TIMESTAMP WITHOUT TIME ZONE,
+        updated_at TIMESTAMP WITHOUT TIME ZONE,
+        PRIMARY KEY (id),
+        FOREIGN KEY(order_id) REFERENCES orders (id),
+        FOREIGN KEY(user_id) REFERENCES users (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_return_requests_id ON return_requests (id)",
+    "CREATE INDEX IF NOT EXISTS ix_return_requests_order_id ON return_requests (order_id)",
+    "CREATE INDEX IF NOT EXISTS ix_return_requests_user_id ON return_requests (user_id)",
+    """
+    CREATE TABLE IF NOT EXISTS wishlist_items (
+        id SERIAL NOT NULL,
+        user_id INTEGER,
+        wishlist_id INTEGER NOT NULL,
+        product_id INTEGER NOT NULL,
+        created_at TIMESTAMP WITHOUT TIME ZONE,
+        PRIMARY KEY (id),
+        CONSTRAINT uq_wishlist_product UNIQUE (wishlist_id, product_id),
+        FOREIGN KEY(user_id) REFERENCES users (id),
+        FOREIGN KEY(wishlist_id) REFERENCES wishlists (id),
+        FOREIGN KEY(product_id) REFERENCES products (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_wishlist_items_id ON wishlist_items (id)",
+    "CREATE INDEX IF NOT EXISTS ix_wishlist_items_product_id ON wishlist_items (product_id)",
+    "CREATE INDEX IF NOT EXISTS ix_wishlist_items_user_id ON wishlist_items (user_id)",
+    "CREATE INDEX IF NOT EXISTS ix_wishlist_items_wishlist_id ON wishlist_items (wishlist_id)",
+)
+
+
+
+def _0001_baseline(conn: Connection) -> None:
+    # Create any missing tables as of this revision, then fold in historical schema drift fixes
+    for statement in _BASELINE_DDL:
+        conn.execute(text(statement))
+
+    # hero_banners: updated_at + link_url (backfilled from legacy button_link when present)
+    conn.execute(text(
+        "ALTER TABLE IF EXISTS hero_banners "
+        "ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP"
+    ))
+    conn.execute(text("ALTER TABLE IF EXISTS hero_banners ADD COLUMN IF NOT EXISTS link_url VARCHAR(255)"))
+    best_effort(conn,
+        "UPDATE hero_banners SET link_url = button_link "
+        "WHERE link_url IS NULL AND button_link IS NOT NULL"
+    )
+
+    # wishlist_items: align legacy (user_id, product_id) layout with the wishlist_id model
+    conn.execute(text("ALTER TABLE IF EXISTS wishlist_items ADD COLUMN IF NOT EXISTS wishlist_id INTEGER"))
+    conn.execute(text("ALTER TABLE IF EXISTS wishlist_items ADD COLUMN IF NOT EXISTS user_id INTEGER"))
+    conn.execute(text(
+        "ALTER TABLE IF EXISTS wishlist_items "
+        "ADD COLUMN IF NOT EXISTS created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP"
+    ))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_wishlist_items_wishlist_id ON wishlist_items (wishlist_id)"))
+    best_effort(conn,
+        "ALTER TABLE IF EXISTS wishlist_items "
+        "ADD CONSTRAINT fk_wishlist_items_wishlist_id "
+        "FOREIGN KEY (wishlist_id) REFERENCES wishlists(id) ON DELETE CASCADE"
+    )
+    best_effort(conn,
+        "INSERT INTO wishlists (user_id) "
+        "SELECT DISTINCT wi.user_id FROM wishlist_items wi "
+        "LEFT JOIN wishlists w ON w.user_id = wi.user_id "
+        "WHERE wi.user_id IS NOT NULL AND w.id IS NULL"
+    )
+    best_effort(conn,
+        "UPDATE wishlist_items wi SET wishlist_id = w.id "
+        "FROM wishlists w "
+        "WHERE wi.wishlist_id IS NULL AND wi.user_id IS NOT NULL AND w.user_id = wi.user_id"
+    )
+    best_effort(conn,
+        "UPDATE wishlist_items wi SET user_id = w.user_id "
+        "FROM wishlists w "
+        "WHERE wi.user_id IS NULL AND wi.wishlist_id IS NOT NULL AND w.id = wi.wishlist_id"
+    )
+    best_effort(conn, "ALTER TABLE IF EXISTS wishlist_items DROP CONSTRAINT IF EXISTS wishlist_items_user_id_product_id_key")
+    best_effort(conn, "ALTER TABLE IF EXISTS wishlist_items ADD CONSTRAINT uq_wishlist_product UNIQUE (wishlist_id, product_id)")
+    best_effort(conn, "ALTER TABLE IF EXISTS wishlist_items ALTER COLUMN user_id DROP NOT NULL")
+
+    # orders: online payment + shipping contact columns
+    conn.execute(text("ALTER TABLE IF EXISTS orders ADD COLUMN IF NOT EXISTS payment_provider VARCHAR(50)"))
+    conn.execute(text("ALTER TABLE IF EXISTS orders ADD COLUMN IF NOT EXISTS payment_sender_number VARCHAR(50)"))
+    conn.execute(text("ALTER TABLE IF EXISTS orders ADD COLUMN IF NOT EXISTS payment_transaction_id VARCHAR(100)"))
+    conn.execute(text("ALTER TABLE IF EXISTS orders ADD COLUMN IF NOT EXISTS shipping_name VARCHAR(255)"))
+    conn.execute(text("ALTER TABLE IF EXISTS orders ADD COLUMN IF NOT EXISTS shipping_phone VARCHAR(50)"))
+
+    # products: per-size inventory, video, free shipping
+    conn.execute(text("ALTER TABLE IF EXISTS products ADD COLUMN IF NOT EXISTS sizes_stock JSONB"))
+    conn.execute(text("ALTER TABLE IF EXISTS products ADD COLUMN IF NOT EXISTS video_url VARCHAR(500)"))
+    conn.execute(text("ALTER TABLE IF EXISTS products ADD COLUMN IF NOT EXISTS free_shipping BOOLEAN DEFAULT FALSE"))
+
+    # orders.status / payment_status: normalize case (only rows that need it) and accept the canonical set
+    conn.execute(text(
+        "UPDATE orders SET status = UPPER(status) "
+        "WHERE status IS NOT NULL AND status <> UPPER(status)"
+    ))
+    conn.execute(text(
+        "UPDATE orders SET payment_status = UPPER(payment_status) "
+        "WHERE payment_status IS NOT NULL AND payment_status <> UPPER(payment_status)"
+    ))
+    for name in ("orders_status_check", "order_status_check", "orders_payment_status_check", "order_payment_status_check"):
+        conn.execute(text(f"ALTER TABLE IF EXISTS orders DROP CONSTRAINT IF EXISTS {name}"))
+    # Rows with unknown legacy values would reject the constraint; don't fail the whole revision for it
+    best_effort(conn,
+        "ALTER TABLE IF EXISTS orders "
+        "ADD CONSTRAINT orders_status_check CHECK (UPPER(status) IN "
+        "('PENDING','CONFIRMED','PACKED','OUT_FOR_DELIVERY','SHIPPED','DELIVERED','CANCELLED'))"
+    )
+    best_effort(conn,
+        "ALTER TABLE IF EXISTS orders "
+        "ADD CONSTRAINT orders_payment_status_check CHECK (UPPER(payment_status) IN ('PENDING','PAID','REFUNDED'))"
+    )
+
+
+def _0002_otp_attempts(conn: Connection) -> None:
+    # Password reset codes: attempt counter + partial covering index over active codes
+    conn.execute(text("ALTER TABLE IF EXISTS otps ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0"))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_otps_active_email ON otps (email, expires_at) "
+        "INCLUDE (id, code) WHERE used = false"
+    ))
+
+
+def _0003_access_path_indexes(conn: Connection) -> None:
+    # Indexes for the hot predicates/sorts (see scripts/bench_indexes.py). Built CONCURRENTLY so
+    # large orders/order_items tables keep taking writes while the migration runs.
+    create_index_concurrently(conn, "ix_orders_created_at", "orders", "created_at")
+    create_index_concurrently(conn, "ix_orders_user_id_created_at", "orders", "user_id, created_at")
+    # Also serve the FK checks Postgres runs on every product delete
+    create_index_concurrently(conn, "ix_order_items_product_id", "order_items", "product_id")
+    create_index_concurrently(conn, "ix_cart_items_product_id", "cart_items", "product_id")
+    create_index_concurrently(conn, "ix_return_requests_created_at", "return_requests", "created_at")
+    create_index_concurrently(conn, "ix_hero_banners_created_at", "hero_banners", "created_at")
+    create_index_concurrently(conn, "ix_products_stock", "products", "stock")
+
+
+def _0004_media_objects(conn: Connection) -> None:
+    # Reference counts for media files; existing references are backfilled from products and
+    # banners so deletes stay safe for files stored before content addressing (sha256 stays NULL)
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS media_objects (
+            url VARCHAR(255) NOT NULL,
+            sha256 VARCHAR(64),
+            size BIGINT,
+            content_type VARCHAR(100),
+            ref_count INTEGER NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE,
+            updated_at TIMESTAMP WITHOUT TIME ZONE,
+            PRIMARY KEY (url)
+        )
+    """))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_media_objects_sha256 ON media_objects (sha256)"))
+    conn.execute(text("""
+        INSERT INTO media_objects (url, ref_count, created_at, updated_at)
+        SELECT url, count(*), now(), now()
+        FROM (
+            SELECT main_image AS url FROM products
+            UNION ALL
+            SELECT jsonb_array_elements_text(images) FROM products WHERE jsonb_typeof(images) = 'array'
+            UNION ALL
+            SELECT image_url FROM hero_banners
+        ) refs
+        WHERE url LIKE '/media/%'
+        GROUP BY url
+        ON CONFLICT (url) DO NOTHING
+    """))
+
+
+MIGRATIONS = [
+    Migration(1, "baseline_schema_drift", _0001_baseline),
+    Migration(2, "otp_attempts_and_active_index", _0002_otp_attempts),
+    Migration(3, "access_path_indexes", _0003_access_path_indexes, transactional=False),
+    Migration(4, "media_objects_refcounts", _0004_media_objects),
+]
@@ -0,0 +1,21 @@
+"""Async engine/session for read-heavy endpoints (psycopg3 async driver).
+
+Shares DATABASE_URL and pool settings with the sync engine in app.models.user, so each worker
+holds up to two pools: size workers * 2 * (DB_POOL_SIZE + DB_MAX_OVERFLOW) against
+max_connections. On Windows psycopg async needs a selector event loop (not Proactor).
+"""
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.models.user import DATABASE_URL, settings
+from app.utils.db_pool import InstrumentedAsyncQueuePool, engine_options, instrument_pool
+
+async_engine = create_async_engine(DATABASE_URL, poolclass=InstrumentedAsyncQueuePool, **engine_options(settings))
+instrument_pool(async_engine.sync_engine, "primary_async")
+
+# expire_on_commit=False: attributes stay loaded after commit (no implicit async lazy loads)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
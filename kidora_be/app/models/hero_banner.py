@@ -11,5 +11,5 @@ class HeroBanner(Base):
     subtitle = Column(String(500), nullable=True)
     image_url = Column(String(255), nullable=True)
     link_url = Column(String(255), nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,19 @@
+from sqlalchemy import BigInteger, Column, DateTime, Integer, String
+from datetime import datetime
+from app.models.user import Base
+
+
+class MediaObject(Base):
+    """A stored media file and the number of rows (product images, banners) referencing its URL.
+
+    New files are content-addressed (<sha256><ext>), so identical uploads share one row/file.
+    """
+    __tablename__ = "media_objects"
+
+    url = Column(String(255), primary_key=True)
+    sha256 = Column(String(64), index=True)  # NULL for files stored before content addressing
+    size = Column(BigInteger)
+    content_type = Column(String(100))
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.models.user import Base
@@ -6,6 +6,10 @@ from app.models.user import Base
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        # "My orders": filter by user, newest first
+        Index("ix_orders_user_id_created_at", "user_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
@@ -27,7 +31,7 @@ class Order(Base):
     status = Column(String(20), default="PENDING")  # PENDING, CONFIRMED, SHIPPED, DELIVERED, CANCELLED
     payment_status = Column(String(20), default="PENDING")  # PENDING, PAID, REFUNDED
 
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)  # admin listing sort
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
@@ -38,7 +42,7 @@ class OrderItem(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     order_id = Column(Integer, ForeignKey("orders.id"), nullable=False, index=True)
-    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
     quantity = Column(Integer, nullable=False)
     selected_size = Column(String(50))
     price = Column(Float, nullable=False)  # unit price at time of order
@@ -10,7 +10,7 @@ class Product(Base):
     description = Column(String(1000))
     price = Column(Numeric(10, 2), nullable=False)
     category = Column(String(100), index=True)
-    stock = Column(Integer, default=0)
+    stock = Column(Integer, default=0, index=True)  # low-stock report
     rating = Column(Float, default=0.0)
     discount = Column(Integer, default=0)
     main_image = Column(String(255))
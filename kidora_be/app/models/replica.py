@@ -0,0 +1,205 @@
+"""Optional read-replica routing.
+
+When DATABASE_REPLICA_URL is set, read-only dependencies (get_read_db / get_async_read_db)
+hand out sessions that send SELECTs to the replica and everything else to the primary. A
+background job measures replication lag; while the replica is down, lagging beyond
+REPLICA_MAX_LAG_SECONDS, behind with its WAL receiver down, or not yet checked, reads silently use the primary. Without a replica
+URL both dependencies are plain primary sessions.
+"""
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy import create_engine, text
+from starlette.requests import Request
+from starlette.responses import Response
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql.dml import UpdateBase
+
+from app.models.user import SessionLocal, engine, normalize_database_url, settings
+from app.models.async_db import AsyncSessionLocal, async_engine
+from app.utils.db_pool import InstrumentedAsyncQueuePool, InstrumentedQueuePool, engine_options, instrument_pool
+from app.utils.metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+REPLICA_LAG = Gauge("db_replica_lag_seconds", "Replication lag measured by the last health check")
+REPLICA_AVAILABLE = Gauge("db_replica_available", "1 when read traffic is being routed to the replica")
+READ_SESSIONS = Counter("db_read_sessions_total", "Read-only sessions handed out, by target", ["target"])
+
+MAX_LAG_SECONDS = float(getattr(settings, "REPLICA_MAX_LAG_SECONDS", 5))
+CHECK_INTERVAL_SECONDS = float(getattr(settings, "REPLICA_CHECK_INTERVAL_SECONDS", 5))
+STICKY_SECONDS = float(getattr(settings, "REPLICA_STICKY_SECONDS", 10))
+
+REPLICA_URL = normalize_database_url(getattr(settings, "DATABASE_REPLICA_URL", "") or "")
+
+replica_engine = None
+async_replica_engine = None
+if REPLICA_URL:
+    replica_engine = create_engine(REPLICA_URL, poolclass=InstrumentedQueuePool, future=True, **engine_options(settings))
+    instrument_pool(replica_engine, "replica")
+    async_replica_engine = create_async_engine(REPLICA_URL, poolclass=InstrumentedAsyncQueuePool, **engine_options(settings))
+    instrument_pool(async_replica_engine.sync_engine, "replica_async")
+
+# Lag is judged against the primary's current WAL position rather than the replica's own
+# receive/replay LSNs: those are equal both when the replica is caught up and when its WAL
+# receiver has stalled or disconnected (nothing new received), which must not read as fresh.
+_PRIMARY_LSN_SQL = text("SELECT pg_current_wal_lsn()::text")
+_REPLICA_SQL = text(
+    "SELECT pg_is_in_recovery(), "
+    "COALESCE(pg_last_wal_replay_lsn() >= CAST(:primary_lsn AS pg_lsn), false), "
+    "COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0), "
+    "(SELECT status FROM pg_stat_wal_receiver LIMIT 1)"
+)
+
+_health = {"available": False, "lag": None, "checked_at": 0.0}
+
+
+def _measure_lag() -> float:
+    """Seconds the replica is behind the primary; raises when it cannot catch up on its own."""
+    with engine.connect() as conn:
+        primary_lsn = conn.execute(_PRIMARY_LSN_SQL).scalar()
+    with replica_engine.connect() as conn:
+        in_recovery, caught_up, replay_age, receiver = conn.execute(_REPLICA_SQL, {"primary_lsn": primary_lsn}).one()
+    if not in_recovery or caught_up:
+        # Replayed everything the primary had written when we asked (an idle primary isn't lag)
+        return 0.0
+    if receiver != "streaming":
+        raise RuntimeError(f"replica is behind and its WAL receiver is {receiver or 'not running'}")
+    # Behind while streaming: age of the last replayed transaction. Right after a write to a long-idle
+    # primary this overstates the lag for one check, which only keeps reads on the primary briefly
+    return float(replay_age or 0.0)
+
+
+def refresh_replica_health() -> Optional[float]:
+    """Measure replica lag and update routing state. Scheduled periodically from app startup."""
+    if replica_engine is None:
+        return None
+    try:
+        lag = _measure_lag()
+    except Exception as e:
+        if _health["available"]:
+            logger.warning("Replica health check failed, routing reads to primary: %s", e)
+        _health.update(available=False, lag=None, checked_at=time.monotonic())
+        REPLICA_AVAILABLE.set(0)
+        return None
+    available = lag <= MAX_LAG_SECONDS
+    if available != _health["available"]:
+        logger.info("Replica %s (lag %.2fs)", "in rotation" if available else "lagging, routing reads to primary", lag)
+    _health.update(available=available, lag=lag, checked_at=time.monotonic())
+    REPLICA_LAG.set(lag)
+    REPLICA_AVAILABLE.set(1 if available else 0)
+    return lag
+
+
+def replica_available() -> bool:
+    if replica_engine is None or not _health["available"]:
+        return False
+    # A stalled checker means we no longer know the lag; don't trust the replica
+    return time.monotonic() - float(_health["checked_at"]) <= max(3 * CHECK_INTERVAL_SECONDS, MAX_LAG_SECONDS)
+
+
+# ---- read-your-writes -------------------------------------------------------------------
+#
+# Two markers, either of which sends the writer's next reads to the primary for
+# REPLICA_STICKY_SECONDS: a cookie on the write response (works whichever worker or instance
+# serves the follow-up read) and, for clients that drop cookies, an in-memory map that only
+# covers follow-up reads landing on the same worker process (best-effort).
+
+WRITE_COOKIE = "kidora_wrote_at"
+
+_recent_writes: "OrderedDict[str, float]" = OrderedDict()
+_recent_lock = threading.Lock()
+_MAX_TRACKED_WRITERS = 10000
+
+
+def note_write(key: Optional[str], response: Optional[Response] = None) -> None:
+    """Remember that `key` (usually the user's email) just committed a write."""
+    if replica_engine is None or not key:
+        return
+    if response is not None:
+        # Wall-clock seconds: the cookie is checked by other processes. Tampering can only make
+        # the client's own reads go to the primary.
+        response.set_cookie(WRITE_COOKIE, str(int(time.time())), max_age=max(1, math.ceil(STICKY_SECONDS)),
+                            httponly=True, samesite="lax")
+    with _recent_lock:
+        _recent_writes[key] = time.monotonic()
+        _recent_writes.move_to_end(key)
+        while len(_recent_writes) > _MAX_TRACKED_WRITERS:
+            _recent_writes.popitem(last=False)
+
+
+def wrote_recently(key: Optional[str], request: Optional[Request] = None) -> bool:
+    if replica_engine is None:
+        return False
+    if request is not None:
+        raw = request.cookies.get(WRITE_COOKIE, "")
+        if raw.isdigit() and 0 <= time.time() - int(raw) < STICKY_SECONDS:
+            return True
+    if not key:
+        return False
+    with _recent_lock:
+        ts = _recent_writes.get(key)
+    return ts is not None and time.monotonic() - ts < STICKY_SECONDS
+
+
+def prefer_primary(db) -> None:
+    """Route every remaining statement of this (sync or async) session to the primary."""
+    db.info["use_primary"] = True
+
+
+def stick_if_recent_writer(db, key: Optional[str], request: Optional[Request] = None) -> None:
+    if wrote_recently(key, request):
+        prefer_primary(db)
+
+
+# ---- routing sessions -------------------------------------------------------------------
+
+class RoutingSession(Session):
+    """Reads go to the replica; flushes and DML go to the primary.
+
+    After the first write (or prefer_primary()) the session stays on the primary, so reads that
+    follow a write in the same session always see it.
+    """
+
+    primary_bind = engine
+    replica_bind = replica_engine
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self.info.get("use_primary") or self._flushing or isinstance(clause, UpdateBase):
+            self.info["use_primary"] = True
+            return self.primary_bind
+        return self.replica_bind
+
+
+class AsyncRoutingSession(RoutingSession):
+    primary_bind = async_engine.sync_engine
+    replica_bind = async_replica_engine.sync_engine if async_replica_engine is not None else None
+
+
+ReadSessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, future=True)
+AsyncReadSessionLocal = async_sessionmaker(sync_session_class=AsyncRoutingSession, autoflush=False, expire_on_commit=False)
+
+
+def get_read_db():
+    """Like get_db, but served from the replica when it is healthy."""
+    use_replica = replica_available()
+    READ_SESSIONS.labels(target="replica" if use_replica else "primary").inc()
+    db = ReadSessionLocal() if use_replica else SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db():
+    """Async twin of get_read_db."""
+    use_replica = replica_available()
+    READ_SESSIONS.labels(target="replica" if use_replica else "primary").inc()
+    factory = AsyncReadSessionLocal if use_replica else AsyncSessionLocal
+    async with factory() as db:
+        yield db
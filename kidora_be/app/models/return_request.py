@@ -11,5 +11,5 @@ class ReturnRequest(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     reason = Column(String(500), nullable=True)
     status = Column(String(20), default="PENDING")  # PENDING, APPROVED, REJECTED, COMPLETED
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
 from app.models.user import get_db, User
+from app.models.replica import get_read_db
 from app.models.product import Product
 from app.models.order import Order
 from app.utils.security import get_current_admin_user
@@ -17,7 +18,7 @@ def _is_admin_or_sub(email: str) -> bool:
 
 # 40. Get Dashboard Overview
 @router.get("/dashboard/overview")
-def get_dashboard_overview(db: Session = Depends(get_db), current_user_email: str = Depends(get_current_admin_user)):
+def get_dashboard_overview(db: Session = Depends(get_read_db), current_user_email: str = Depends(get_current_admin_user)):
     users = db.query(User).count()
     products = db.query(Product).count()
     orders = db.query(Order).count()
@@ -0,0 +1,156 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+
+from app.config import get_settings
+from app.utils.db_pool import pool_status
+from app.utils import memory
+from app.utils.metrics import snapshot
+from app.utils.profiling import clear_profiles, get_profile, recent_profiles
+from app.utils.security import get_current_admin_user
+from app.utils.slow_queries import clear_slow_queries, recent_slow_queries, slow_query_config
+
+
+router = APIRouter()
+
+
+@router.get("/db-pool")
+def get_db_pool_stats(current_user_email: str = Depends(get_current_admin_user)):
+    """Live pool state plus cumulative checkout/wait/timeout counters for this worker."""
+    settings = get_settings()
+    return {
+        "config": {
+            "poolSize": settings.DB_POOL_SIZE,
+            "maxOverflow": settings.DB_MAX_OVERFLOW,
+            "poolTimeoutSeconds": settings.DB_POOL_TIMEOUT_SECONDS,
+            "poolRecycleSeconds": settings.DB_POOL_RECYCLE_SECONDS,
+            "statementTimeoutMs": settings.DB_STATEMENT_TIMEOUT_MS,
+        },
+        "pools": pool_status(),
+        "metrics": snapshot("db_pool_"),
+    }
+
+
+@router.get("/slow-queries")
+def get_slow_queries(
+    limit: int = Query(50, ge=1, le=1000),
+    current_user_email: str = Depends(get_current_admin_user),
+):
+    """Most recent slow statements on this worker (newest first), with sampled EXPLAIN plans."""
+    return {"config": slow_query_config(), "queries": recent_slow_queries(limit)}
+
+
+@router.delete("/slow-queries")
+def reset_slow_queries(current_user_email: str = Depends(get_current_admin_user)):
+    return {"cleared": clear_slow_queries()}
+
+
+@router.get("/profiles")
+def list_profiles(
+    limit: int = Query(50, ge=1, le=1000),
+    current_user_email: str = Depends(get_current_admin_user),
+):
+    """Profiled requests on this worker (newest first): route, duration and time per category."""
+    return {"profiles": recent_profiles(limit)}
+
+
+@router.get("/profiles/{profile_id}")
+def read_profile(profile_id: str, current_user_email: str = Depends(get_current_admin_user)):
+    profile = get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found (it may have been evicted or run on another worker)")
+    return profile
+
+
+@router.get("/profiles/{profile_id}/folded", response_class=PlainTextResponse)
+def read_profile_folded(profile_id: str, current_user_email: str = Depends(get_current_admin_user)):
+    """Folded stacks for flamegraph.pl / speedscope / inferno."""
+    profile = get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found (it may have been evicted or run on another worker)")
+    return PlainTextResponse(profile["folded"] + "\n")
+
+
+@router.delete("/profiles")
+def reset_profiles(current_user_email: str = Depends(get_current_admin_user)):
+    return {"cleared": clear_profiles()}
+
+
+@router.get("/memory")
+def get_memory_status(current_user_email: str = Depends(get_current_admin_user)):
+    """RSS, GC state, tracemalloc totals and the stored snapshots of this worker."""
+    return memory.memory_status()
+
+
+@router.post("/memory/tracemalloc")
+def start_tracemalloc(
+    frames: int = Query(1, ge=1, le=50, description="Traceback depth kept per allocation"),
+    current_user_email: str = Depends(get_current_admin_user),
+):
+    memory.start_tracing(frames)
+    return memory.tracemalloc_status()
+
+
+@router.delete("/memory/tracemalloc")
+def stop_tracemalloc(current_user_email: str = Depends(get_current_admin_user)):
+    memory.stop_tracing()
+    return memory.tracemalloc_status()
+
+
+@router.post("/memory/snapshots")
+def create_memory_snapshot(
+    label: Optional[str] = Query(None, max_length=100),
+    current_user_email: str = Depends(get_current_admin_user),
+):
+    try:
+        return memory.take_snapshot(label)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.get("/memory/snapshots/{snapshot_id}")
+def get_memory_snapshot(
+    snapshot_id: int,
+    key_type: str = Query("lineno", alias="keyType", pattern="^(lineno|filename|traceback)$"),
+    limit: int = Query(25, ge=1, le=500),
+    current_user_email: str = Depends(get_current_admin_user),
+):
+    """Top allocators in one snapshot."""
+    try:
+        return {"top": memory.top_allocators(snapshot_id, key_type, limit)}
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+
+
+@router.get("/memory/diff")
+def diff_memory_snapshots(
+    base: int = Query(..., description="Earlier snapshot id"),
+    target: Optional[int] = Query(None, description="Later snapshot id; a new snapshot when omitted"),
+    key_type: str = Query("lineno", alias="keyType", pattern="^(lineno|filename|traceback)$"),
+    limit: int = Query(25, ge=1, le=500),
+    current_user_email: str = Depends(get_current_admin_user),
+):
+    """Allocators that grew the most between two snapshots."""
+    try:
+        return memory.diff_snapshots(base, target, key_type, limit)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.delete("/memory/snapshots")
+def reset_memory_snapshots(current_user_email: str = Depends(get_current_admin_user)):
+    return {"cleared": memory.clear_snapshots()}
+
+
+@router.get("/memory/routes")
+def get_route_memory(current_user_email: str = Depends(get_current_admin_user)):
+    """Sampled allocation peaks per route template (largest first)."""
+    return {"tracing": memory.tracemalloc_status()["tracing"], "routes": memory.route_peaks()}
+
+
+@router.delete("/memory/routes")
+def reset_route_memory(current_user_email: str = Depends(get_current_admin_user)):
+    memory.clear_route_peaks()
+    return {"cleared": True}
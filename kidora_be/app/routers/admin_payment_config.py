@@ -1,7 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.models.user import get_db
+from app.models.async_db import get_async_db
 from app.models.payment_config import PaymentConfig, get_or_create_payment_config
 from app.utils.security import get_current_user, is_admin_email
 
@@ -9,8 +12,8 @@ router = APIRouter()
 
 
 @router.get("/payments/config")
-def public_payment_config(db: Session = Depends(get_db)):
-    cfg = db.query(PaymentConfig).first()
+async def public_payment_config(db: AsyncSession = Depends(get_async_db)):
+    cfg = (await db.execute(select(PaymentConfig).limit(1))).scalars().first()
     # Default masked placeholders if not yet configured
     default_mask = "017xxxxxxxx"
     if not cfg:
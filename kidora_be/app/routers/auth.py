@@ -6,6 +6,7 @@ from app.utils.security import create_access_token, get_current_user_email, blac
 from app.config import get_settings
 from app.utils.email_templates import welcome_email, password_reset_code, password_reset_success
 from datetime import datetime, timedelta
+import hmac
 import random
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
@@ -58,8 +59,8 @@ def forgot_password(payload: dict, db: Session = Depends(get_db)):
     code = f"{random.randint(0, 999999):06d}"
     expires_at = datetime.utcnow() + timedelta(minutes=10)
     if user:
-        # Invalidate previous OTPs
-        db.query(OTP).filter(OTP.email == email, OTP.used == False).update({OTP.used: True})  # type: ignore
+        # Drop previous codes for this email instead of flagging them; keeps otps small
+        db.query(OTP).filter(OTP.email == email).delete(synchronize_session=False)
         db.add(OTP(email=email, code=code, expires_at=expires_at))
         db.commit()
         # Send email
@@ -88,11 +89,37 @@ def reset_password(payload: dict, db: Session = Depends(get_db)):
     user = db.query(User).filter(User.email == email).first()
     if not user:
         raise HTTPException(status_code=400, detail="Invalid code or email")
-    otp = db.query(OTP).filter(OTP.email == email, OTP.code == code, OTP.used == False).first()  # type: ignore
-    if not otp or not otp.expires_at or otp.expires_at < datetime.utcnow():
+    # Active code via ix_otps_active_email, row-locked until this transaction ends: concurrent
+    # guesses for the same code queue up and each sees the attempts/used state the previous
+    # one committed (Postgres re-checks `used = false` on the locked row)
+    otp = (
+        db.query(OTP.id, OTP.code)
+        .filter(OTP.email == email, OTP.used == False, OTP.expires_at > datetime.utcnow())  # type: ignore
+        .order_by(OTP.expires_at.desc())
+        .with_for_update()
+        .first()
+    )
+    if not otp:
+        raise HTTPException(status_code=400, detail="Invalid or expired code")
+    if not hmac.compare_digest(otp.code or "", code):
+        # Count the failed guess; burn the code once the attempt budget is spent
+        settings = get_settings()
+        max_attempts = max(1, int(getattr(settings, 'OTP_MAX_ATTEMPTS', 5) or 5))
+        db.query(OTP).filter(OTP.id == otp.id).update(
+            {OTP.attempts: OTP.attempts + 1, OTP.used: OTP.attempts + 1 >= max_attempts},
+            synchronize_session=False,
+        )
+        db.commit()
+        raise HTTPException(status_code=400, detail="Invalid or expired code")
+    # Consume the code (exactly once) and update the password in the same transaction
+    consumed = (
+        db.query(OTP)
+        .filter(OTP.id == otp.id, OTP.used == False)  # type: ignore
+        .update({OTP.used: True}, synchronize_session=False)
+    )
+    if consumed != 1:
+        db.rollback()
         raise HTTPException(status_code=400, detail="Invalid or expired code")
-    # Mark OTP used and update password
-    otp.used = True
     user.password = new_password  # NOTE: hash in production
     db.commit()
     # Send confirmation
@@ -107,7 +134,7 @@ def reset_password(payload: dict, db: Session = Depends(get_db)):
 
 
 @router.post("/logout")
-def logout(creds: HTTPAuthorizationCredentials = Depends(bearer)):
+def logout(creds: HTTPAuthorizationCredentials = Depends(bearer), db: Session = Depends(get_db)):
     if not creds or not creds.credentials:
         raise HTTPException(status_code=401, detail="Not authenticated")
     from jose import jwt
@@ -117,7 +144,7 @@ def logout(creds: HTTPAuthorizationCredentials = Depends(bearer)):
         payload = jwt.decode(creds.credentials, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         jti = payload.get("jti")
         if jti:
-            blacklist_token(jti)
+            blacklist_token(jti, db)
         return {"message": "Logged out"}
     except Exception:
         # Even if token invalid, respond 200 to avoid token probing
@@ -1,14 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 from sqlalchemy.exc import IntegrityError
 from datetime import datetime
 from typing import List, Optional
 
 from app.models.user import User, get_db
+from app.models.async_db import get_async_db
 from app.models.cart import Cart, CartItem
 from app.models.product import Product
 from app.schemas.cart import CartItemIn, CartOut, CartItemOut
-from app.utils.security import get_current_user
+from app.utils.security import get_current_user, get_current_user_async
+from app.utils.query_stats import query_budget
 
 
 router = APIRouter()
@@ -32,14 +36,16 @@ def _serialize_cart(cart: Cart) -> CartOut:
 
 
 # 20. Get Cart
-@router.get("/", response_model=CartOut)
-def get_cart(db: Session = Depends(get_db), current_user_email: str = Depends(get_current_user)):
-    user = db.query(User).filter(User.email == current_user_email).first()
-    if not user:
+@router.get("/", response_model=CartOut, dependencies=[Depends(query_budget(4))])
+async def get_cart(db: AsyncSession = Depends(get_async_db), current_user_email: str = Depends(get_current_user_async)):
+    user_id = (await db.execute(select(User.id).where(User.email == current_user_email))).scalar_one_or_none()
+    if user_id is None:
         raise HTTPException(status_code=401, detail="Invalid user")
-    cart = _get_or_create_cart(db, user.id)
-    db.commit()  # ensure cart persisted if created
-    db.refresh(cart)
+    stmt = select(Cart).options(selectinload(Cart.items)).where(Cart.user_id == user_id)
+    cart = (await db.execute(stmt)).scalars().first()
+    if not cart:
+        # Read-only: a missing cart is simply empty; writes create it via _get_or_create_cart
+        return CartOut(items=[])
     return _serialize_cart(cart)
 
 
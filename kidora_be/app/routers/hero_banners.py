@@ -1,12 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
 from app.models.user import get_db
+from app.models.async_db import get_async_db
 from app.models.hero_banner import HeroBanner
 from app.schemas.hero_banner import HeroBannerOut
 from app.utils.security import get_current_user, is_admin_email
-from app.utils.storage import save_upload_file, save_from_path_or_url, delete_media_file
+from app.utils.media_variants import variants_for
+from app.utils.storage import save_upload_file, save_from_path_or_url, release_media, purge_unreferenced
 
 
 router = APIRouter()
@@ -22,13 +26,14 @@ def _to_out(b: HeroBanner) -> HeroBannerOut:
         title=b.title,
         subtitle=b.subtitle,
         imageUrl=b.image_url,
+        imageVariants=variants_for(b.image_url),
         linkUrl=b.link_url,
     )
 
 
 @router.get("/", response_model=List[HeroBannerOut])
-def get_hero_banners(db: Session = Depends(get_db)):
-    banners = db.query(HeroBanner).order_by(HeroBanner.created_at.desc()).all()
+async def get_hero_banners(db: AsyncSession = Depends(get_async_db)):
+    banners = (await db.execute(select(HeroBanner).order_by(HeroBanner.created_at.desc()))).scalars().all()
     return [_to_out(b) for b in banners]
 
 
@@ -47,9 +52,9 @@ def create_hero_banner(
 
     img = None
     if image and image.filename:
-        img = save_upload_file(image, subdir="banners")
+        img = save_upload_file(image, subdir="banners", db=db)
     elif imageUrl:
-        img = save_from_path_or_url(imageUrl, subdir="banners")
+        img = save_from_path_or_url(imageUrl, subdir="banners", db=db)
 
     banner = HeroBanner(title=title, subtitle=subtitle, image_url=img, link_url=linkUrl)
     db.add(banner)
@@ -77,12 +82,17 @@ def update_hero_banner(
     banner.title = title
     banner.subtitle = subtitle
     banner.link_url = linkUrl
+    replaced = []
     if image and image.filename:
-        banner.image_url = save_upload_file(image, subdir="banners")
+        replaced.append(banner.image_url)
+        banner.image_url = save_upload_file(image, subdir="banners", db=db)
     elif imageUrl:
-        banner.image_url = save_from_path_or_url(imageUrl, subdir="banners")
+        replaced.append(banner.image_url)
+        banner.image_url = save_from_path_or_url(imageUrl, subdir="banners", db=db)
+    released = release_media(db, replaced)
     db.commit()
     db.refresh(banner)
+    purge_unreferenced(released)
     return _to_out(banner)
 
 
@@ -93,12 +103,9 @@ def delete_hero_banner(id: int, db: Session = Depends(get_db), current_user_emai
     banner = db.query(HeroBanner).filter(HeroBanner.id == id).first()
     if not banner:
         raise HTTPException(status_code=404, detail="Banner not found")
-    # Attempt to remove associated image file if stored locally
-    try:
-        if banner.image_url:
-            delete_media_file(banner.image_url)
-    except Exception:
-        pass
+    # The image file goes only when nothing else references it
+    released = release_media(db, [banner.image_url])
     db.delete(banner)
     db.commit()
+    purge_unreferenced(released)
     return {"message": "Banner deleted"}
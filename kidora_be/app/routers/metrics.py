@@ -0,0 +1,38 @@
+import hmac
+
+from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+
+from app.config import get_settings
+from app.utils.metrics import render_prometheus
+
+
+router = APIRouter()
+
+
+_LOOPBACK = {"127.0.0.1", "::1", "localhost"}
+
+
+def _direct_local(request: Request) -> bool:
+    """A client on this host talking to the app directly (not relayed by a proxy on this host)."""
+    client = request.client.host if request.client else None
+    proxied = "x-forwarded-for" in request.headers or "forwarded" in request.headers
+    return client in _LOOPBACK and not proxied
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics(request: Request, authorization: Optional[str] = Header(None)):
+    """Prometheus text exposition of this worker's metrics.
+
+    Async on purpose: threadpool gauges are read from the event loop. Fails closed: scrapers
+    must send `Authorization: Bearer <METRICS_TOKEN>`; without a token configured only direct
+    loopback requests (a local scraper or sidecar, development) are answered.
+    """
+    token = get_settings().METRICS_TOKEN
+    if token:
+        if not hmac.compare_digest(authorization or "", f"Bearer {token}"):
+            raise HTTPException(status_code=401, detail="Invalid metrics token")
+    elif not _direct_local(request):
+        raise HTTPException(status_code=403, detail="Metrics are only served to local clients unless METRICS_TOKEN is set")
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,11 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.orm import Session, selectinload
 from typing import List
 from datetime import datetime
 from sqlalchemy.exc import ProgrammingError, IntegrityError
-from sqlalchemy import text
+import logging
 
 from app.models.user import User, get_db
+from app.models.replica import get_read_db, note_write, stick_if_recent_writer
 from app.models.order import Order, OrderItem
 from app.models.product import Product
 from app.schemas.order import (
@@ -18,12 +19,64 @@ from app.schemas.order import (
 from app.utils.security import get_current_user, send_email
 from app.config import get_settings
 from app.utils.email_templates import order_confirmation, order_status_update, payment_status_update
-from app.models.user import engine
+from app.utils.metrics import Counter
+from app.utils.query_stats import query_budget
+from app.utils.fast_json import model_response
+from app.migrations.runner import schema_state
 
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 admin_router = APIRouter()
 
+DB_SCHEMA_ERRORS = Counter(
+    "db_schema_errors_total",
+    "Order writes rejected by the database because its schema lags the code",
+    ["operation", "error"],
+)
+
+
+# undefined_column / undefined_table: the code writes to something the database doesn't have yet
+_SCHEMA_DRIFT_SQLSTATES = {"42703", "42P01"}
+_CHECK_VIOLATION = "23514"
+# Status checks that revision 1 rewrites; before it they reject the canonical upper-case values
+_LEGACY_STATUS_CONSTRAINTS = {
+    "orders_status_check", "order_status_check", "orders_payment_status_check", "order_payment_status_check",
+}
+
+
+def _is_schema_drift(exc: Exception) -> bool:
+    orig = getattr(exc, "orig", None)
+    sqlstate = getattr(orig, "sqlstate", None)
+    if sqlstate in _SCHEMA_DRIFT_SQLSTATES:
+        return True
+    if sqlstate == _CHECK_VIOLATION and not schema_state.get("current"):
+        return getattr(getattr(orig, "diag", None), "constraint_name", None) in _LEGACY_STATUS_CONSTRAINTS
+    return False
+
+
+def _schema_failure(db: Session, operation: str, exc: Exception) -> Exception:
+    """Roll back a failed order write and pick what to raise.
+
+    Schema mismatches (missing column/table, legacy status constraint on an unmigrated
+    database) fail fast with a 503: repair belongs to the migration runner at startup, never to
+    a live request. Other integrity errors (bad references, races) are a 409; anything else is
+    re-raised unchanged.
+    """
+    db.rollback()
+    if _is_schema_drift(exc):
+        DB_SCHEMA_ERRORS.labels(operation=operation, error=exc.__class__.__name__).inc()
+        logger.error(
+            "%s rejected by database (schema revision %s, expected %s): %s",
+            operation, schema_state.get("version"), schema_state.get("expected"), getattr(exc, "orig", exc),
+        )
+        return HTTPException(status_code=503, detail="Database schema is out of date; please retry later")
+    if isinstance(exc, IntegrityError):
+        logger.warning("%s violated a database constraint: %s", operation, getattr(exc, "orig", exc))
+        return HTTPException(status_code=409, detail="Order conflicts with the current data; please refresh and retry")
+    return exc
+
 
 def map_order_to_out(order: Order) -> OrderOut:
     shipping = {
@@ -65,6 +118,7 @@ def map_order_to_out(order: Order) -> OrderOut:
 @router.post("/", response_model=OrderOut)
 def create_order(
     payload: OrderCreate,
+    response: Response,
     db: Session = Depends(get_db),
     current_user_email: str = Depends(get_current_user),
 ):
@@ -119,21 +173,8 @@ def create_order(
     db.add(order)
     try:
         db.flush()  # get order.id
-    except ProgrammingError as e:
-        # Handle missing columns on legacy DBs: add columns then retry once
-        db.rollback()
-        try:
-            with engine.begin() as conn:
-                conn.execute(text("ALTER TABLE IF EXISTS orders ADD COLUMN IF NOT EXISTS payment_provider VARCHAR(50)"))
-                conn.execute(text("ALTER TABLE IF EXISTS orders ADD COLUMN IF NOT EXISTS payment_sender_number VARCHAR(50)"))
-                conn.execute(text("ALTER TABLE IF EXISTS orders ADD COLUMN IF NOT EXISTS payment_transaction_id VARCHAR(100)"))
-                conn.execute(text("ALTER TABLE IF EXISTS orders ADD COLUMN IF NOT EXISTS shipping_name VARCHAR(255)"))
-                conn.execute(text("ALTER TABLE IF EXISTS orders ADD COLUMN IF NOT EXISTS shipping_phone VARCHAR(50)"))
-        except Exception:
-            pass
-        # Re-add and flush again
-        db.add(order)
-        db.flush()
+    except (ProgrammingError, IntegrityError) as e:
+        raise _schema_failure(db, "create_order", e)
 
     for item in payload.items:
         unit_price = discounted_unit_prices.get(item.productId, float(item.price) if item.price is not None else 0.0)
@@ -182,7 +223,11 @@ def create_order(
             except Exception:
                 pass
 
-    db.commit()
+    try:
+        db.commit()  # flushes the order items and stock updates
+    except (ProgrammingError, IntegrityError) as e:
+        raise _schema_failure(db, "create_order", e)
+    note_write(current_user_email, response)
     db.refresh(order)
     # Send confirmation email
     try:
@@ -197,32 +242,44 @@ def create_order(
 
 
 # 15. Get User Orders
-@router.get("/", response_model=List[OrderOut])
+@router.get("/", response_model=List[OrderOut], dependencies=[Depends(query_budget(3))])
 def get_user_orders(
-    db: Session = Depends(get_db),
+    request: Request,
+    read_db: Session = Depends(get_read_db),
     current_user_email: str = Depends(get_current_user),
 ):
-    user = db.query(User).filter(User.email == current_user_email).first()
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid user")
-    orders = db.query(Order).filter(Order.user_id == user.id).order_by(Order.created_at.desc()).all()
-    return [map_order_to_out(o) for o in orders]
+    # Served from the replica unless this user wrote recently (read-your-writes).
+    # Filter through the users join: the caller is already authenticated on the primary.
+    stick_if_recent_writer(read_db, current_user_email, request)
+    orders = (
+        read_db.query(Order)
+        .join(User, User.id == Order.user_id)
+        .filter(User.email == current_user_email)
+        .options(selectinload(Order.items))  # one IN query instead of a lazy load per order
+        .order_by(Order.created_at.desc())
+        .all()
+    )
+    return model_response(request, [map_order_to_out(o) for o in orders], List[OrderOut])
 
 
 # 16. Get Order by ID
 @router.get("/{id}", response_model=OrderOut)
 def get_order_by_id(
     id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    read_db: Session = Depends(get_read_db),
     current_user_email: str = Depends(get_current_user),
 ):
-    user = db.query(User).filter(User.email == current_user_email).first()
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid user")
-    order = db.query(Order).filter(Order.id == id, Order.user_id == user.id).first()
+    stick_if_recent_writer(read_db, current_user_email, request)
+    order = (
+        read_db.query(Order)
+        .join(User, User.id == Order.user_id)
+        .filter(Order.id == id, User.email == current_user_email)
+        .first()
+    )
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
-    return map_order_to_out(order)
+    return model_response(request, map_order_to_out(order), OrderOut)
 
 
 # 17. Update Order Status (user's own order)
@@ -230,6 +287,7 @@ def get_order_by_id(
 def update_order_status(
     id: int,
     payload: OrderStatusUpdate,
+    response: Response,
     db: Session = Depends(get_db),
     current_user_email: str = Depends(get_current_user),
 ):
@@ -245,24 +303,9 @@ def update_order_status(
     order.updated_at = datetime.utcnow()
     try:
         db.commit()
-    except IntegrityError:
-        # Likely due to legacy CHECK constraint not allowing our canonical statuses
-        db.rollback()
-        try:
-            with engine.begin() as conn:
-                # Normalize existing values to uppercase
-                conn.execute(text("UPDATE orders SET status = UPPER(status) WHERE status IS NOT NULL"))
-                # Drop old constraints with common names
-                conn.execute(text("ALTER TABLE IF EXISTS orders DROP CONSTRAINT IF EXISTS orders_status_check"))
-                conn.execute(text("ALTER TABLE IF EXISTS orders DROP CONSTRAINT IF EXISTS order_status_check"))
-                # Recreate compatible constraint
-                conn.execute(text(
-                    "ALTER TABLE IF EXISTS orders "
-                    "ADD CONSTRAINT orders_status_check CHECK (UPPER(status) IN ('PENDING','CONFIRMED','PACKED','OUT_FOR_DELIVERY','SHIPPED','DELIVERED','CANCELLED'))"
-                ))
-        except Exception:
-            pass
-        db.commit()
+    except (ProgrammingError, IntegrityError) as e:
+        raise _schema_failure(db, "update_order_status", e)
+    note_write(current_user_email, response)
     db.refresh(order)
     return map_order_to_out(order)
 
@@ -271,6 +314,7 @@ def update_order_status(
 @router.post("/{id}/cancel", response_model=OrderOut)
 def cancel_order(
     id: int,
+    response: Response,
     db: Session = Depends(get_db),
     current_user_email: str = Depends(get_current_user),
 ):
@@ -292,6 +336,7 @@ def cancel_order(
             product.stock = product.stock + item.quantity
 
     db.commit()
+    note_write(current_user_email, response)
     db.refresh(order)
     return map_order_to_out(order)
 
@@ -299,35 +344,45 @@ def cancel_order(
 # 19. Get Admin Orders (Admin/Sub-Admin)
 @admin_router.get("/", response_model=List[OrderOut])
 def get_admin_orders(
+    request: Request,
     page: int = Query(0, ge=0),
     size: int = Query(20, ge=1),
-    db: Session = Depends(get_db),
+    read_db: Session = Depends(get_read_db),
     current_user_email: str = Depends(get_current_user),
 ):
     from app.utils.security import is_admin_email
     if not is_admin_email(current_user_email):
         raise HTTPException(status_code=403, detail="Admin access required")
 
-    query = db.query(Order).order_by(Order.created_at.desc())
+    stick_if_recent_writer(read_db, current_user_email, request)
+    query = read_db.query(Order).options(selectinload(Order.items)).order_by(Order.created_at.desc())
     orders = query.offset(page * size).limit(size).all()
-    return [map_order_to_out(o) for o in orders]
+    return model_response(request, [map_order_to_out(o) for o in orders], List[OrderOut])
 
 
 @admin_router.get("/by-user/{user_id}", response_model=List[OrderOut])
 def get_admin_orders_by_user(
     user_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    read_db: Session = Depends(get_read_db),
     current_user_email: str = Depends(get_current_user),
 ):
     """List all orders for a given user (admin only)."""
     from app.utils.security import is_admin_email
     if not is_admin_email(current_user_email):
         raise HTTPException(status_code=403, detail="Admin access required")
-    user = db.query(User).filter(User.id == user_id).first()
+    stick_if_recent_writer(read_db, current_user_email, request)
+    user = read_db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    orders = db.query(Order).filter(Order.user_id == user.id).order_by(Order.created_at.desc()).all()
-    return [map_order_to_out(o) for o in orders]
+    orders = (
+        read_db.query(Order)
+        .filter(Order.user_id == user.id)
+        .options(selectinload(Order.items))
+        .order_by(Order.created_at.desc())
+        .all()
+    )
+    return model_response(request, [map_order_to_out(o) for o in orders], List[OrderOut])
 
 
 # 20. Admin: Update Order Status
@@ -335,6 +390,7 @@ def get_admin_orders_by_user(
 def admin_update_order_status(
     id: int,
     payload: OrderStatusUpdate,
+    response: Response,
     db: Session = Depends(get_db),
     current_user_email: str = Depends(get_current_user),
 ):
@@ -350,20 +406,9 @@ def admin_update_order_status(
     order.updated_at = datetime.utcnow()
     try:
         db.commit()
-    except IntegrityError:
-        db.rollback()
-        try:
-            with engine.begin() as conn:
-                conn.execute(text("UPDATE orders SET status = UPPER(status) WHERE status IS NOT NULL"))
-                conn.execute(text("ALTER TABLE IF EXISTS orders DROP CONSTRAINT IF EXISTS orders_status_check"))
-                conn.execute(text("ALTER TABLE IF EXISTS orders DROP CONSTRAINT IF EXISTS order_status_check"))
-                conn.execute(text(
-                    "ALTER TABLE IF EXISTS orders "
-                    "ADD CONSTRAINT orders_status_check CHECK (UPPER(status) IN ('PENDING','CONFIRMED','PACKED','OUT_FOR_DELIVERY','SHIPPED','DELIVERED','CANCELLED'))"
-                ))
-        except Exception:
-            pass
-        db.commit()
+    except (ProgrammingError, IntegrityError) as e:
+        raise _schema_failure(db, "admin_update_order_status", e)
+    note_write(current_user_email, response)
     db.refresh(order)
     # Email status update
     try:
@@ -384,6 +429,7 @@ def admin_update_order_status(
 def admin_update_payment_status(
     id: int,
     payload: OrderPaymentStatusUpdate,
+    response: Response,
     db: Session = Depends(get_db),
     current_user_email: str = Depends(get_current_user),
 ):
@@ -399,20 +445,9 @@ def admin_update_payment_status(
     order.updated_at = datetime.utcnow()
     try:
         db.commit()
-    except IntegrityError:
-        db.rollback()
-        try:
-            with engine.begin() as conn:
-                conn.execute(text("UPDATE orders SET payment_status = UPPER(payment_status) WHERE payment_status IS NOT NULL"))
-                conn.execute(text("ALTER TABLE IF EXISTS orders DROP CONSTRAINT IF EXISTS orders_payment_status_check"))
-                conn.execute(text("ALTER TABLE IF EXISTS orders DROP CONSTRAINT IF EXISTS order_payment_status_check"))
-                conn.execute(text(
-                    "ALTER TABLE IF EXISTS orders "
-                    "ADD CONSTRAINT orders_payment_status_check CHECK (UPPER(payment_status) IN ('PENDING','PAID','REFUNDED'))"
-                ))
-        except Exception:
-            pass
-        db.commit()
+    except (ProgrammingError, IntegrityError) as e:
+        raise _schema_failure(db, "admin_update_payment_status", e)
+    note_write(current_user_email, response)
     db.refresh(order)
     # Email payment status update
     try:
@@ -1,6 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Request
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from app.models.product import Product
 from urllib.parse import urlparse, parse_qs
 
@@ -37,17 +37,21 @@ def _normalize_video_embed(url: Optional[str]) -> Optional[str]:
         return u
     except Exception:
         return url
-from sqlalchemy import func, or_
+from sqlalchemy import func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.user import get_db
-from app.schemas.product import ProductOut
+from app.models.replica import get_async_read_db
+from app.schemas.product import ProductCard, ProductOut
 from app.utils.security import get_current_user, is_admin_email
+from app.utils.fast_json import model_response
+from app.utils.media_variants import variants_for
 from app.utils.storage import (
     save_upload_file,
     save_multiple_upload_files,
     save_from_path_or_url,
     save_multiple_from_paths_or_urls,
-    delete_media_file,
-    delete_media_files,
+    release_media,
+    purge_unreferenced,
 )
 
 router = APIRouter()
@@ -58,6 +62,7 @@ def parse_images(images_json: Optional[List[str]]) -> List[str]:
     return images_json or []
 
 def to_product_out(p: Product) -> ProductOut:
+    images = parse_images(p.images)
     return ProductOut(
         id=p.id,
         title=p.title,
@@ -68,71 +73,168 @@ def to_product_out(p: Product) -> ProductOut:
         rating=p.rating,
         discount=p.discount,
         main_image=p.main_image,
+        main_image_variants=variants_for(p.main_image),
         video=_normalize_video_embed(p.video_url),
-        images=parse_images(p.images),
+        images=images,
+        image_variants=[variants_for(u) for u in images],
         sizes_stock=p.sizes_stock or None,
         free_shipping=bool(getattr(p, 'free_shipping', False)),
     )
 
+def _category_filter(category: Optional[str]):
+    """Build the OR-condition for a comma-separated category filter (None when empty)."""
+    # Support comma-separated categories for inclusive filter (e.g. "kids,girls,boys")
+    cats = [c.strip().lower() for c in (category or '').split(',') if c.strip()]
+    if not cats:
+        return None
+    partial_stems = {"kid", "girl", "boy", "child"}
+    conditions = []
+    for c in cats:
+        if c in partial_stems:
+            # Allow exact, plural, and categories that start with the stem (avoids 'men' matching 'women')
+            conditions.append(func.lower(Product.category) == c)
+            conditions.append(func.lower(Product.category) == f"{c}s")
+            conditions.append(Product.category.ilike(f"{c}%"))
+        else:
+            # Exact, case-insensitive match for non-stem categories like 'men'/'women'
+            conditions.append(func.lower(Product.category) == c)
+    return or_(*conditions)
+
+
+def _listing_filters(stmt, category: Optional[str], search: Optional[str]):
+    cat_cond = _category_filter(category)
+    if cat_cond is not None:
+        stmt = stmt.where(cat_cond)
+    if search:
+        stmt = stmt.where(Product.title.ilike(f"%{search}%"))
+    return stmt
+
+
+# Output field -> column for sparse fieldsets (?fields=id,title,price)
+PRODUCT_FIELD_COLUMNS = {
+    "id": Product.id,
+    "title": Product.title,
+    "description": Product.description,
+    "price": Product.price,
+    "category": Product.category,
+    "stock": Product.stock,
+    "rating": Product.rating,
+    "discount": Product.discount,
+    "main_image": Product.main_image,
+    "images": Product.images,
+    "sizes_stock": Product.sizes_stock,
+    "video": Product.video_url,
+    "free_shipping": Product.free_shipping,
+}
+
+
+def _parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    if not fields:
+        return None
+    names = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    if not names:
+        raise HTTPException(status_code=400, detail="fields must name at least one field")
+    unknown = [f for f in names if f not in PRODUCT_FIELD_COLUMNS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(PRODUCT_FIELD_COLUMNS)}",
+        )
+    return names
+
+
+def _sparse_row(names: List[str], row) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for name, value in zip(names, row):
+        if name == "price" and value is not None:
+            value = float(value)
+        elif name == "video":
+            value = _normalize_video_embed(value)
+        elif name == "images":
+            value = parse_images(value)
+        elif name == "sizes_stock":
+            value = value or None
+        elif name == "free_shipping":
+            value = bool(value)
+        out[name] = value
+    return out
+
+
 # 6. Get All Products (with filters)
 @router.get("/", response_model=List[ProductOut])
-def get_all_products(
+async def get_all_products(
+    request: Request,
     page: int = Query(0, ge=0),
     size: int = Query(20, ge=1),
     category: Optional[str] = None,
     search: Optional[str] = None,
-    db: Session = Depends(get_db)
+    fields: Optional[str] = Query(None, description="Comma-separated subset of product fields, e.g. id,title,price"),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    """List products with optional case-insensitive category and title search."""
-    query = db.query(Product)
-    if category:
-        # Support comma-separated categories for inclusive filter (e.g. "kids,girls,boys")
-        cats = [c.strip().lower() for c in category.split(',') if c.strip()]
-        if cats:
-            partial_stems = {"kid", "girl", "boy", "child"}
-            conditions = []
-            for c in cats:
-                if c in partial_stems:
-                    # Allow exact, plural, and categories that start with the stem (avoids 'men' matching 'women')
-                    conditions.append(func.lower(Product.category) == c)
-                    conditions.append(func.lower(Product.category) == f"{c}s")
-                    conditions.append(Product.category.ilike(f"{c}%"))
-                else:
-                    # Exact, case-insensitive match for non-stem categories like 'men'/'women'
-                    conditions.append(func.lower(Product.category) == c)
-            query = query.filter(or_(*conditions))
-    if search:
-        query = query.filter(Product.title.ilike(f"%{search}%"))
-    products = query.offset(page * size).limit(size).all()
-    return [to_product_out(p) for p in products]
+    """List products with optional case-insensitive category and title search.
+
+    With `fields`, only those columns are selected and each item contains only those keys.
+    """
+    names = _parse_fields(fields)
+    if names is not None:
+        stmt = _listing_filters(select(*(PRODUCT_FIELD_COLUMNS[n] for n in names)), category, search)
+        rows = (await db.execute(stmt.offset(page * size).limit(size))).all()
+        return model_response(request, [_sparse_row(names, r) for r in rows], List[Dict[str, Any]])
+    stmt = _listing_filters(select(Product), category, search)
+    products = (await db.execute(stmt.offset(page * size).limit(size))).scalars().all()
+    return model_response(request, [to_product_out(p) for p in products], List[ProductOut])
+
+
+@router.get("/cards", response_model=List[ProductCard])
+async def get_product_cards(
+    request: Request,
+    page: int = Query(0, ge=0),
+    size: int = Query(20, ge=1),
+    category: Optional[str] = None,
+    search: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """Same filters as the product list, returning the compact card projection for listing pages."""
+    stmt = select(Product.id, Product.title, Product.price, Product.discount, Product.main_image, Product.rating)
+    stmt = _listing_filters(stmt, category, search)
+    rows = (await db.execute(stmt.offset(page * size).limit(size))).all()
+    cards = [
+        ProductCard(
+            id=r.id, title=r.title, price=r.price, discount=r.discount, main_image=r.main_image,
+            main_image_variants=variants_for(r.main_image), rating=r.rating,
+        )
+        for r in rows
+    ]
+    return model_response(request, cards, List[ProductCard])
 
 
 @router.get("/categories", response_model=List[str])
-def list_categories(db: Session = Depends(get_db)):
+async def list_categories(db: AsyncSession = Depends(get_async_read_db)):
     """Return distinct product categories (lowercased, sorted)."""
-    rows = db.query(func.lower(Product.category)).filter(Product.category.isnot(None)).distinct().all()
+    stmt = select(func.lower(Product.category)).where(Product.category.isnot(None)).distinct()
+    rows = (await db.execute(stmt)).all()
     cats = sorted({r[0] for r in rows if r and r[0]})
     return cats
 
 
 @router.get("/category-counts")
-def category_counts(db: Session = Depends(get_db)):
+async def category_counts(db: AsyncSession = Depends(get_async_read_db)):
     """Return counts of products grouped by category (lowercased)."""
-    rows = (
-        db.query(func.lower(Product.category).label("category"), func.count().label("count"))
-        .filter(Product.category.isnot(None))
+    stmt = (
+        select(func.lower(Product.category).label("category"), func.count().label("count"))
+        .where(Product.category.isnot(None))
         .group_by(func.lower(Product.category))
-        .all()
     )
+    rows = (await db.execute(stmt)).all()
     return [{"category": r.category, "count": int(r.count)} for r in rows]
 
 # 7. Get Product by ID
 @router.get("/{id}", response_model=ProductOut)
-def get_product_by_id(id: int, db: Session = Depends(get_db)):
-    product = db.query(Product).filter(Product.id == id).first()
+async def get_product_by_id(id: int, request: Request, db: AsyncSession = Depends(get_async_read_db)):
+    product = await db.get(Product, id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    return to_product_out(product)
+    return model_response(request, to_product_out(product), ProductOut)
 
 # 10. Create Product (Admin)
 @router.post("/admin", response_model=ProductOut)
@@ -153,8 +255,8 @@ def create_product(
     current_user: str = Depends(get_current_user)
 ):
     # Save images locally and store URLs in DB
-    main_image_url = save_upload_file(mainImage, subdir="products")
-    image_urls = save_multiple_upload_files(images, subdir="products")
+    main_image_url = save_upload_file(mainImage, subdir="products", db=db)
+    image_urls = save_multiple_upload_files(images, subdir="products", db=db)
     # Parse sizes_stock if provided
     sizes_map = None
     if sizes_stock:
@@ -246,20 +348,28 @@ def update_product(
         except Exception:
             pass
 
-    # Update main image if provided
+    # Update main image if provided; replaced files lose a reference (new ones are counted first,
+    # so re-sending an existing URL keeps its file)
+    replaced: List[str] = []
     if main_image and main_image.filename:
-        product.main_image = save_upload_file(main_image, subdir="products")
+        replaced.append(product.main_image)
+        product.main_image = save_upload_file(main_image, subdir="products", db=db)
     elif main_image_url:
-        product.main_image = save_from_path_or_url(main_image_url, subdir="products")
+        replaced.append(product.main_image)
+        product.main_image = save_from_path_or_url(main_image_url, subdir="products", db=db)
 
     # Update gallery images if provided
     if images and any(f.filename for f in images):
-        product.images = save_multiple_upload_files(images, subdir="products")
+        replaced.extend(product.images if isinstance(product.images, list) else [])
+        product.images = save_multiple_upload_files(images, subdir="products", db=db)
     elif image_urls:
-        product.images = save_multiple_from_paths_or_urls(image_urls, subdir="products")
+        replaced.extend(product.images if isinstance(product.images, list) else [])
+        product.images = save_multiple_from_paths_or_urls(image_urls, subdir="products", db=db)
 
+    released = release_media(db, replaced)
     db.commit()
     db.refresh(product)
+    purge_unreferenced(released)
     return to_product_out(product)
 
 # 12. Delete Product (Admin)
@@ -268,17 +378,11 @@ def delete_product(id: int, db: Session = Depends(get_db), current_user: str = D
     product = db.query(Product).filter(Product.id == id).first()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    # Attempt file cleanup before deleting DB row
-    try:
-        if product.main_image:
-            delete_media_file(product.main_image)
-        if product.images and isinstance(product.images, list):
-            delete_media_files(product.images)
-    except Exception:
-        # Silently ignore file deletion issues to avoid blocking core delete
-        pass
+    # Files are removed after the row is gone, and only when no other product/banner uses them
+    released = release_media(db, [product.main_image] + (product.images if isinstance(product.images, list) else []))
     db.delete(product)
     db.commit()
+    purge_unreferenced(released)
     return {"message": "Product deleted"}
 
 # 13. Get Low Stock Products (Admin)
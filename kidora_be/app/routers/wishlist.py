@@ -9,6 +9,7 @@ from app.models.wishlist import Wishlist, WishlistItem
 from app.models.product import Product
 from app.schemas.wishlist import WishlistOut, WishlistItemOut
 from app.utils.security import get_current_user
+from app.utils.query_stats import query_budget
 
 
 router = APIRouter()
@@ -29,7 +30,7 @@ def _serialize_wishlist(wl: Wishlist) -> WishlistOut:
 
 
 # 24. Get Wishlist
-@router.get("/", response_model=WishlistOut)
+@router.get("/", response_model=WishlistOut, dependencies=[Depends(query_budget(5))])
 def get_wishlist(db: Session = Depends(get_db), current_user_email: str = Depends(get_current_user)):
     user = db.query(User).filter(User.email == current_user_email).first()
     if not user:
@@ -1,10 +1,13 @@
 from pydantic import BaseModel
 from typing import Optional
 
+from app.schemas.media import ImageVariants
+
 
 class HeroBannerOut(BaseModel):
     id: int
     title: Optional[str] = None
     subtitle: Optional[str] = None
     imageUrl: Optional[str] = None
+    imageVariants: Optional[ImageVariants] = None
     linkUrl: Optional[str] = None
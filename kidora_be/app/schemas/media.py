@@ -0,0 +1,17 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+
+class ImageSource(BaseModel):
+    url: str
+    width: int
+    height: int
+    format: str
+
+
+class ImageVariants(BaseModel):
+    """Resized/re-encoded copies of one stored image, for srcset/<picture> selection."""
+    width: int
+    height: int
+    placeholder: Optional[str] = None  # tiny blurred data URI to show while loading
+    sources: List[ImageSource] = []
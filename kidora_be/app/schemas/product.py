@@ -1,6 +1,8 @@
 from pydantic import BaseModel, ConfigDict
 from typing import List, Optional
 
+from app.schemas.media import ImageVariants
+
 class ProductBase(BaseModel):
     title: str
     description: Optional[str] = None
@@ -19,10 +21,24 @@ class ProductCreate(ProductBase):
 class ProductUpdate(ProductBase):
     pass
 
+class ProductCard(BaseModel):
+    """Compact listing projection: just what a product card renders."""
+    id: int
+    title: str
+    price: float
+    discount: Optional[int] = 0
+    main_image: Optional[str] = None
+    main_image_variants: Optional[ImageVariants] = None
+    rating: Optional[float] = 0.0
+
+
 class ProductOut(ProductBase):
     id: int
     main_image: Optional[str] = None
     images: Optional[List[str]] = None
+    # Same order as images; null entries until generated (or for non-image media)
+    main_image_variants: Optional[ImageVariants] = None
+    image_variants: Optional[List[Optional[ImageVariants]]] = None
 
     # Pydantic v2 config
     model_config = ConfigDict(from_attributes=True)
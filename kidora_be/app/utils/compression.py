@@ -0,0 +1,201 @@
+"""gzip/brotli response compression with a cache of precompressed bodies.
+
+Only complete (single-message) responses whose content type is on the allowlist and whose body
+is at least `minimum_size` bytes are compressed; streaming responses (media files, downloads)
+pass through untouched. Brotli is used when the `brotli` package is installed and the client
+accepts it, gzip otherwise.
+
+Public GET responses (no Authorization header, no `Cache-Control: private/no-store`) are cached
+compressed, keyed by a hash of the uncompressed body and the encoding, so a hot catalog payload
+is compressed once per content version rather than on every request.
+"""
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from app.utils.metrics import Counter, Gauge
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional encoding
+    brotli = None
+
+COMPRESSED_RESPONSES = Counter("http_compressed_responses_total", "Responses sent compressed", ["encoding", "cache"])
+COMPRESSION_BYTES_IN = Counter("http_compression_bytes_in_total", "Uncompressed bytes of compressed responses")
+COMPRESSION_BYTES_OUT = Counter("http_compression_bytes_out_total", "Bytes sent after compression")
+COMPRESSION_CACHE_BYTES = Gauge("http_compression_cache_bytes", "Bytes held by the precompressed response cache")
+
+DEFAULT_CONTENT_TYPES = (
+    "application/json",
+    "application/msgpack",
+    "text/",
+    "application/javascript",
+    "image/svg+xml",
+)
+
+
+class PrecompressedCache:
+    """Byte-bounded LRU of compressed bodies keyed by (body digest, encoding)."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[Tuple[bytes, str], bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[bytes, str]) -> Optional[bytes]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key: Tuple[bytes, str], value: bytes) -> None:
+        if len(value) > self.max_bytes // 4:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._data[key] = value
+            self._bytes += len(value)
+            while self._bytes > self.max_bytes and self._data:
+                _, evicted = self._data.popitem(last=False)
+                self._bytes -= len(evicted)
+            COMPRESSION_CACHE_BYTES.set(self._bytes)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+            COMPRESSION_CACHE_BYTES.set(0)
+
+
+def _accepted_encodings(header: str) -> set:
+    accepted = set()
+    for part in header.lower().split(","):
+        token, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if token and q > 0:
+            accepted.add(token)
+    return accepted
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app,
+        minimum_size: int = 1024,
+        content_types: Iterable[str] = DEFAULT_CONTENT_TYPES,
+        gzip_level: int = 6,
+        brotli_quality: int = 5,
+        cache_bytes: int = 32 * 1024 * 1024,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.content_types = tuple(content_types)
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.cache = PrecompressedCache(cache_bytes) if cache_bytes > 0 else None
+
+    def _choose_encoding(self, scope) -> Optional[str]:
+        accepted = _accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        if brotli is not None and "br" in accepted:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    def _compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    def _compressible(self, headers: Headers, status: int) -> bool:
+        if status < 200 or status in (204, 206, 304) or "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+        return any(content_type.startswith(t) for t in self.content_types)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("method") == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        encoding = self._choose_encoding(scope)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        public_get = scope.get("method") == "GET" and "authorization" not in request_headers
+        state = {"start": None, "passthrough": False}
+
+        async def send_compressed(message):
+            if state["passthrough"]:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message.get("headers", []))
+                if not self._compressible(headers, message["status"]):
+                    state["passthrough"] = True
+                    await send(message)
+                    return
+                state["start"] = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            start = state["start"]
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                # Streaming or too small to be worth it: send as is
+                state["passthrough"] = True
+                await send(start)
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=start.setdefault("headers", []))
+            cache_control = headers.get("cache-control", "").lower()
+            cacheable = self.cache is not None and public_get and "private" not in cache_control and "no-store" not in cache_control
+            cache_state = "bypass"
+            compressed = None
+            key = None
+            if cacheable:
+                key = (hashlib.blake2b(body, digest_size=16).digest(), encoding)
+                compressed = self.cache.get(key)
+                cache_state = "hit" if compressed is not None else "miss"
+            if compressed is None:
+                compressed = self._compress(body, encoding)
+                if key is not None:
+                    self.cache.put(key, compressed)
+
+            if len(compressed) >= len(body):
+                state["passthrough"] = True
+                await send(start)
+                await send(message)
+                return
+
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = "W/" + etag
+            COMPRESSED_RESPONSES.labels(encoding=encoding, cache=cache_state).inc()
+            COMPRESSION_BYTES_IN.inc(len(body))
+            COMPRESSION_BYTES_OUT.inc(len(compressed))
+            await send(start)
+            await send({"type": "http.response.body", "body": compressed, "more_body": False})
+
+        await self.app(scope, receive, send_compressed)
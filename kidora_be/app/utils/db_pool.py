@@ -0,0 +1,120 @@
+"""Connection pool configuration and instrumentation for SQLAlchemy engines.
+
+Pool sizing comes from Settings (DB_POOL_*) so workers x (pool_size + max_overflow) can be
+kept under Postgres max_connections. Live pool state is exported through app.utils.metrics.
+"""
+import time
+from typing import Any, Dict, List
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.utils.metrics import Counter, Gauge, Histogram, register_collector
+
+POOL_CHECKOUTS = Counter("db_pool_checkouts_total", "Connections checked out of the pool", ["pool"])
+POOL_CONNECTS = Counter("db_pool_connections_created_total", "New DBAPI connections opened by the pool", ["pool"])
+POOL_TIMEOUTS = Counter("db_pool_timeouts_total", "Checkouts that gave up after DB_POOL_TIMEOUT_SECONDS", ["pool"])
+POOL_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled connection (includes opening overflow connections)",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0, 30.0),
+)
+POOL_SIZE = Gauge("db_pool_size", "Configured persistent pool size", ["pool"])
+POOL_MAX_OVERFLOW = Gauge("db_pool_max_overflow", "Configured overflow limit", ["pool"])
+POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently checked out", ["pool"])
+POOL_CHECKED_IN = Gauge("db_pool_checked_in", "Idle connections held by the pool", ["pool"])
+POOL_OVERFLOW = Gauge("db_pool_overflow", "Current overflow (negative while the pool is still filling)", ["pool"])
+
+_pools: Dict[str, Any] = {}
+
+
+class _CheckoutTimingMixin:
+    """Records how long callers wait in QueuePool._do_get for a connection."""
+
+    metrics_name = "default"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()  # type: ignore[misc]
+        except PoolTimeoutError:
+            POOL_TIMEOUTS.labels(pool=self.metrics_name).inc()
+            raise
+        finally:
+            POOL_WAIT.labels(pool=self.metrics_name).observe(time.perf_counter() - started)
+
+
+class InstrumentedQueuePool(_CheckoutTimingMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_CheckoutTimingMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options(settings) -> Dict[str, Any]:
+    """Keyword arguments for create_engine() derived from Settings (defaults if settings is None)."""
+    opts: Dict[str, Any] = {
+        "pool_pre_ping": True,
+        "pool_size": int(getattr(settings, "DB_POOL_SIZE", 5)),
+        "max_overflow": int(getattr(settings, "DB_MAX_OVERFLOW", 10)),
+        "pool_recycle": int(getattr(settings, "DB_POOL_RECYCLE_SECONDS", 1800)),
+        "pool_timeout": float(getattr(settings, "DB_POOL_TIMEOUT_SECONDS", 10)),
+    }
+    statement_timeout_ms = int(getattr(settings, "DB_STATEMENT_TIMEOUT_MS", 0) or 0)
+    if statement_timeout_ms > 0:
+        # Server-side guard: Postgres cancels any statement running longer than this
+        opts["connect_args"] = {"options": f"-c statement_timeout={statement_timeout_ms}"}
+    return opts
+
+
+def instrument_pool(engine: Engine, name: str) -> None:
+    """Attach checkout/connect counters and register live gauges for `engine`'s pool."""
+    pool = engine.pool
+    if isinstance(pool, _CheckoutTimingMixin):
+        pool.metrics_name = name
+    _pools[name] = pool
+
+    @event.listens_for(pool, "checkout")
+    def _on_checkout(dbapi_conn, conn_record, conn_proxy):
+        POOL_CHECKOUTS.labels(pool=name).inc()
+
+    @event.listens_for(pool, "connect")
+    def _on_connect(dbapi_conn, conn_record):
+        POOL_CONNECTS.labels(pool=name).inc()
+
+
+def pool_status() -> List[Dict[str, Any]]:
+    """Point-in-time view of every instrumented pool."""
+    out = []
+    for name, pool in _pools.items():
+        row: Dict[str, Any] = {"pool": name, "status": pool.status()}
+        if isinstance(pool, QueuePool):
+            row.update(
+                size=pool.size(),
+                maxOverflow=pool._max_overflow,
+                timeout=pool.timeout(),
+                checkedOut=pool.checkedout(),
+                checkedIn=pool.checkedin(),
+                overflow=pool.overflow(),
+            )
+        out.append(row)
+    return out
+
+
+def _collect_pool_gauges() -> None:
+    for row in pool_status():
+        if "size" not in row:
+            continue
+        name = row["pool"]
+        POOL_SIZE.labels(pool=name).set(row["size"])
+        POOL_MAX_OVERFLOW.labels(pool=name).set(row["maxOverflow"])
+        POOL_CHECKED_OUT.labels(pool=name).set(row["checkedOut"])
+        POOL_CHECKED_IN.labels(pool=name).set(row["checkedIn"])
+        POOL_OVERFLOW.labels(pool=name).set(row["overflow"])
+
+
+register_collector(_collect_pool_gauges)
@@ -0,0 +1,71 @@
+"""Fast response serialization.
+
+FastJSONResponse renders with orjson when it is installed (compact stdlib json otherwise) and is
+the app's default response class. For hot list/detail endpoints, `model_response()` serializes
+models the handler has already built and validated straight to bytes with pydantic-core; the
+endpoint returns a Response, so FastAPI skips its second response_model validation and
+jsonable_encoder pass. Clients sending `Accept: application/msgpack` (the mobile app) get
+MessagePack instead when msgpack is installed.
+"""
+import json
+from typing import Any, Dict
+
+from pydantic import TypeAdapter
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional content type
+    msgpack = None
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class MsgPackResponse(Response):
+    media_type = "application/msgpack"
+
+    def render(self, content: Any) -> bytes:
+        return msgpack.packb(content, use_bin_type=True)
+
+
+def wants_msgpack(request: Request) -> bool:
+    if msgpack is None:
+        return False
+    accept = request.headers.get("accept", "")
+    return any(t in accept for t in MSGPACK_MEDIA_TYPES)
+
+
+_adapters: Dict[Any, TypeAdapter] = {}
+
+
+def _adapter(tp: Any) -> TypeAdapter:
+    adapter = _adapters.get(tp)
+    if adapter is None:
+        adapter = _adapters[tp] = TypeAdapter(tp)
+    return adapter
+
+
+def model_response(request: Request, data: Any, tp: Any, status_code: int = 200) -> Response:
+    """Serialize already-validated model(s) `data` of type `tp` (e.g. List[ProductOut]) once.
+
+    Keep the route's response_model for the OpenAPI schema; it is not re-applied because the
+    endpoint returns a Response.
+    """
+    adapter = _adapter(tp)
+    headers = {"Vary": "Accept"} if msgpack is not None else None
+    if wants_msgpack(request):
+        return MsgPackResponse(adapter.dump_python(data, mode="json"), status_code=status_code, headers=headers)
+    return Response(adapter.dump_json(data), status_code=status_code, media_type="application/json", headers=headers)
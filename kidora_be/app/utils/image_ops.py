@@ -0,0 +1,154 @@
+"""Pillow image operations run in worker processes (see app.utils.media_variants).
+
+Everything here works on absolute file paths and plain values so it can be pickled to a
+process pool. Pillow is optional: without it AVAILABLE is False and callers skip processing.
+"""
+import base64
+import io
+import math
+import os
+import tempfile
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - optional image processing
+    Image = ImageOps = None
+
+AVAILABLE = Image is not None
+
+# Encoder settings per output format: (Pillow format name, save options)
+_ENCODERS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "avif": ("AVIF", {"quality": 60, "speed": 6}),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+    "png": ("PNG", {"optimize": True}),
+}
+CONTENT_TYPES = {"webp": "image/webp", "avif": "image/avif", "jpeg": "image/jpeg", "png": "image/png"}
+EXTENSIONS = {"webp": ".webp", "avif": ".avif", "jpeg": ".jpg", "png": ".png"}
+PLACEHOLDER_WIDTH = 16
+
+
+def supported_formats() -> List[str]:
+    """Output formats this Pillow build can encode (AVIF needs Pillow >= 11.3 or pillow-avif-plugin)."""
+    if not AVAILABLE:
+        return []
+    Image.init()
+    return [name for name, (pil_format, _) in _ENCODERS.items() if pil_format in Image.SAVE]
+
+
+def _upright_size(opened) -> Tuple[int, int]:
+    """(width, height) of an opened image as displayed, i.e. after its EXIF orientation."""
+    width, height = opened.size
+    if opened.getexif().get(0x0112) in (5, 6, 7, 8):  # EXIF orientation with a 90 degree turn
+        width, height = height, width
+    return width, height
+
+
+def _open(opened, scale: Optional[float] = None):
+    """Upright RGB/RGBA copy of an opened image. When the caller needs at most `scale` of the
+    full size (the same factor on both axes, so orientation does not matter), big JPEGs are
+    decoded at a reduced scale that still covers it. Returns (image, full-size upright (w, h))."""
+    size = _upright_size(opened)
+    if scale and scale <= 0.5 and opened.format == "JPEG":
+        opened.draft("RGB", (max(1, math.ceil(opened.width * scale)), max(1, math.ceil(opened.height * scale))))
+    image = ImageOps.exif_transpose(opened)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+    return image, size
+
+
+def _save(image, path: str, fmt: str) -> int:
+    """Encode to a temp file next to `path` and rename it into place; returns the size."""
+    pil_format, options = _ENCODERS[fmt]
+    if fmt == "jpeg" and image.mode != "RGB":
+        image = image.convert("RGB")
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".variant-", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            image.save(out, pil_format, **options)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    return os.path.getsize(path)
+
+
+def _resized(image, width: int):
+    if width >= image.width:
+        return image
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+
+
+def placeholder(image) -> str:
+    """A tiny WebP data URI (~150 bytes) that clients upscale with a CSS blur while loading."""
+    small = _resized(image, PLACEHOLDER_WIDTH)
+    buf = io.BytesIO()
+    small.save(buf, "WEBP", quality=30)
+    return "data:image/webp;base64," + base64.b64encode(buf.getvalue()).decode("ascii")
+
+
+def step_widths(source_width: int, widths: Iterable[int]) -> List[int]:
+    """The configured widths narrower than the source, plus the source width when it is under the largest step."""
+    widths = sorted(set(widths))
+    steps = [w for w in widths if w < source_width]
+    if widths and source_width <= widths[-1]:
+        steps.append(source_width)
+    return steps
+
+
+def render_variants(src: str, stem: str, widths: Iterable[int], formats: Iterable[str],
+                    out_dir: Optional[str] = None) -> Dict[str, Any]:
+    """Write `<stem>.w<width>.<ext>` for each step width and format into `out_dir` (default: next to `src`).
+
+    Returns the manifest: source dimensions, blur placeholder and one entry per file written
+    (file names only, relative to the directory the original is served from).
+    """
+    directory = out_dir or os.path.dirname(src)
+    widths, formats = list(widths), list(formats)
+    with Image.open(src) as opened:
+        image, (width, height) = _open(opened, max(widths) / _upright_size(opened)[0] if widths else None)
+    sources: List[Dict[str, Any]] = []
+    # Largest first so each step is resized from the closest larger one (faster, same quality)
+    current = image
+    for step in sorted(step_widths(width, widths), reverse=True):
+        resized = _resized(current, step)
+        if resized.width != step:
+            continue  # decoded narrower than the step; never publish a file under the wrong width
+        current = resized
+        for fmt in formats:
+            name = f"{stem}.w{step}{EXTENSIONS[fmt]}"
+            size = _save(current, os.path.join(directory, name), fmt)
+            sources.append({"file": name, "width": current.width, "height": current.height, "format": fmt, "bytes": size})
+    return {
+        "width": width,
+        "height": height,
+        "placeholder": placeholder(current),
+        "sources": sorted(sources, key=lambda s: (s["format"], s["width"])),
+    }
+
+
+def render_one(src: str, dst: str, width: Optional[int], height: Optional[int], fmt: str) -> int:
+    """Write one resized copy of `src` to `dst` in `fmt`; returns its size in bytes.
+
+    With both sides the image is scaled to cover the box and center-cropped; with one side
+    the other follows the aspect ratio. Never upscales.
+    """
+    with Image.open(src) as opened:
+        full_width, full_height = _upright_size(opened)
+        # Smallest share of the source the result needs: covering the box when cropping
+        scale = max((width or 0) / full_width, (height or 0) / full_height)
+        image, _ = _open(opened, scale or None)
+    if width and height:
+        scale = min(1.0, max(width / image.width, height / image.height))
+        box = (min(width, round(image.width * scale)), min(height, round(image.height * scale)))
+        image = ImageOps.fit(image, box, Image.LANCZOS)
+    elif width:
+        image = _resized(image, width)
+    elif height and height < image.height:
+        image = _resized(image, max(1, round(image.width * height / image.height)))
+    return _save(image, dst, fmt)
@@ -0,0 +1,272 @@
+"""On-demand resized copies of stored images: /media/<subdir>/<file>?w=320&h=320&fmt=webp.
+
+- `w` and `h` must be in MEDIA_RESIZE_SIZES (anything else is a 400, so clients cannot make
+  the server render and store unbounded variants); with both the image is center-cropped to
+  the box, with one the other side follows the aspect ratio. Images are never upscaled.
+- `fmt` is webp, avif, jpeg or png (default: the source's own format).
+- Results are cached on disk under MEDIA_RESIZE_CACHE_DIR, outside the public media tree.
+  Sources are content-addressed, so a cached result is valid forever; the cache is kept under
+  MEDIA_RESIZE_CACHE_MB by evicting the least recently used files (a hit refreshes the file's
+  mtime; eviction scans the directory, so it is correct across workers sharing it).
+- Concurrent misses for the same result in a worker share one render job on the media
+  process pool (single-flight, X-Cache: COALESCED); if the leading request is cancelled the
+  others render it themselves. Renders and file-system calls never run on the event loop.
+- Results are sent like any other media file (app.utils.media_server: immutable caching,
+  strong ETag, ranges).
+
+Requests without resize parameters go straight to the wrapped media app (MediaFiles).
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import QueryParams
+from starlette.responses import JSONResponse, Response
+
+from app.utils import image_ops, media_variants
+from app.utils.media_server import send_file
+from app.utils.metrics import Counter, Gauge
+from app.utils.storage import media_key
+from app.utils.storage_backends import get_backend
+
+logger = logging.getLogger(__name__)
+
+RESIZE_REQUESTS = Counter("media_resize_requests_total", "On-demand resize requests by result", ["result"])
+RESIZE_CACHE_BYTES = Gauge("media_resize_cache_bytes", "Bytes in the resize cache at the last eviction scan")
+
+_PARAMS = ("w", "h", "fmt")
+_SOURCE_FORMATS = {".jpg": "jpeg", ".jpeg": "jpeg", ".png": "png", ".webp": "webp", ".avif": "avif", ".bmp": "png"}
+# Evict down to this share of the budget so eviction does not run on every miss
+_EVICT_TO = 0.9
+
+
+class ResizeCache:
+    """Size-bounded LRU directory of rendered files (last use = mtime)."""
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._bytes: Optional[int] = None  # this worker's running estimate; None until first scan
+        self._lock = threading.Lock()
+
+    def path_for(self, key: str, fmt: str) -> Path:
+        return self.root / key[:2] / f"{key}{image_ops.EXTENSIONS[fmt]}"
+
+    @staticmethod
+    def touch(path: Path) -> bool:
+        try:
+            os.utime(path)
+            return True
+        except OSError:
+            return False
+
+    def added(self, size: int) -> None:
+        """Account for a new file; evicts (blocking, call from a thread) when over budget."""
+        with self._lock:
+            if self._bytes is not None:
+                self._bytes += size
+            if self._bytes is not None and self._bytes <= self.max_bytes:
+                return
+        self.evict()
+
+    def evict(self) -> int:
+        with self._lock:
+            files = []
+            total = 0
+            for dirpath, _, names in os.walk(self.root):
+                for name in names:
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    files.append((st.st_mtime, st.st_size, path))
+                    total += st.st_size
+            removed = 0
+            if total > self.max_bytes:
+                target = self.max_bytes * _EVICT_TO
+                for _, size, path in sorted(files):
+                    if total <= target:
+                        break
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        continue
+                    total -= size
+                    removed += 1
+            self._bytes = total
+            RESIZE_CACHE_BYTES.set(total)
+            return removed
+
+
+def _render(source_key: str, target: str, width: Optional[int], height: Optional[int], fmt: str) -> int:
+    """Runs in the media process pool; fetches the source first when it is not a local file."""
+    backend = get_backend()
+    src = backend.local_path(source_key)
+    if src is not None:
+        return image_ops.render_one(str(src), target, width, height, fmt)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), prefix=".source-", suffix=".part")
+    os.close(fd)
+    try:
+        backend.download(source_key, tmp)
+        return image_ops.render_one(tmp, target, width, height, fmt)
+    finally:
+        os.unlink(tmp)
+
+
+def _failure(exc: BaseException) -> JSONResponse:
+    if isinstance(exc, BrokenProcessPool):
+        return _error(503, "Image processing is temporarily unavailable")
+    return _error(422, "Could not process image")
+
+
+def _error(status: int, detail: str) -> JSONResponse:
+    RESIZE_REQUESTS.labels(result="rejected").inc()
+    return JSONResponse({"detail": detail}, status_code=status)
+
+
+class MediaResizeApp:
+    """Wraps the /media static app and answers requests that carry w/h/fmt."""
+
+    def __init__(self, app, cache_dir: Path, max_bytes: int, sizes: Sequence[int], enabled: bool = True):
+        self.app = app
+        self.enabled = enabled and image_ops.AVAILABLE
+        self.sizes = frozenset(sizes)
+        self.formats = frozenset(image_ops.supported_formats())
+        self.cache = ResizeCache(Path(cache_dir), max_bytes)
+        self._inflight: Dict[str, "asyncio.Future[None]"] = {}
+
+    def _parse(self, params: QueryParams, source: Path) -> Tuple[Optional[int], Optional[int], str]:
+        sides = []
+        for name in ("w", "h"):
+            raw = params.get(name)
+            if raw is None or raw == "":
+                sides.append(None)
+                continue
+            if not raw.isdigit() or int(raw) not in self.sizes:
+                raise ValueError(f"{name} must be one of {', '.join(map(str, sorted(self.sizes)))}")
+            sides.append(int(raw))
+        fmt = (params.get("fmt") or _SOURCE_FORMATS.get(source.suffix.lower(), "")).lower()
+        if fmt not in self.formats:
+            raise ValueError(f"fmt must be one of {', '.join(sorted(self.formats))}")
+        return sides[0], sides[1], fmt
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("method") not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+        params = QueryParams(scope.get("query_string", b""))
+        if not any(p in params for p in _PARAMS):
+            await self.app(scope, receive, send)
+            return
+        result = await self._resize(scope["path"], params)
+        if isinstance(result, Response):
+            await result(scope, receive, send)
+            return
+        path, fmt, cache_state, st = result
+        RESIZE_REQUESTS.labels(result=cache_state.lower()).inc()
+        await send_file(scope, receive, send, path, st, image_ops.CONTENT_TYPES[fmt], headers={"X-Cache": cache_state})
+
+    @staticmethod
+    def _cached(target: Path) -> Optional[os.stat_result]:
+        """Stat of a cached result, marking it recently used; None when it is not (or no longer) there."""
+        try:
+            os.utime(target)
+            return os.stat(target)
+        except OSError:
+            return None
+
+    @staticmethod
+    async def _run_render(source_key: str, target: Path, width: Optional[int], height: Optional[int], fmt: str) -> int:
+        """Render on the media process pool. A pool whose worker died (e.g. OOM-killed while
+        decoding) stays broken, so it is replaced and the render retried once."""
+        async def attempt() -> int:
+            pool = media_variants.get_pool()
+            try:
+                return await asyncio.wrap_future(pool.submit(_render, source_key, str(target), width, height, fmt))
+            except BrokenProcessPool:
+                media_variants.shutdown_pool(pool)
+                raise
+
+        try:
+            return await attempt()
+        except BrokenProcessPool:
+            logger.warning("Media process pool broke while resizing %s; restarting it", source_key)
+            return await attempt()
+
+    async def _resize(self, url: str, params: QueryParams):
+        """(path, fmt, cache state, stat) of the result, or an error response."""
+        if not self.enabled:
+            return _error(501, "Image resizing is not available")
+        source_key = media_key(url)
+        if source_key is None:
+            return _error(404, "Not Found")
+        source_name = Path(source_key)
+        if not media_variants.processable(source_name.name):
+            return _error(400, "Only images can be resized")
+        try:
+            width, height, fmt = self._parse(params, source_name)
+        except ValueError as exc:
+            return _error(400, str(exc))
+        backend = get_backend()
+        # Local sources are checked up front (a cheap stat, so results of purged files stop being
+        # served); with object storage only misses pay for the round trip
+        if backend.is_local and not await run_in_threadpool(backend.exists, source_key):
+            return _error(404, "Not Found")
+
+        key = hashlib.sha1(f"{url}|{width}|{height}|{fmt}".encode()).hexdigest()
+        target = self.cache.path_for(key, fmt)
+        # Another worker may evict a file between any two checks, so every path that ends in
+        # sending a cached file stats it here and falls back to rendering it again
+        for _ in range(2):
+            st = await run_in_threadpool(self._cached, target)
+            if st is not None:
+                return target, fmt, "HIT", st
+
+            leader = self._inflight.get(key)
+            if leader is not None:
+                try:
+                    await asyncio.shield(leader)
+                except asyncio.CancelledError:
+                    if not leader.cancelled():
+                        raise  # this request itself is being cancelled
+                    continue  # the leader's request went away; render it here instead
+                except Exception as exc:
+                    return _failure(exc)
+                st = await run_in_threadpool(self._cached, target)
+                if st is not None:
+                    return target, fmt, "COALESCED", st
+                continue
+            break
+
+        if not backend.is_local and not await run_in_threadpool(backend.exists, source_key):
+            return _error(404, "Not Found")
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            await run_in_threadpool(target.parent.mkdir, parents=True, exist_ok=True)
+            size = await self._run_render(source_key, target, width, height, fmt)
+            st = await run_in_threadpool(os.stat, target)
+        except Exception as exc:
+            logger.warning("Resize failed for %s (w=%s h=%s fmt=%s): %s", url, width, height, fmt, exc)
+            future.set_exception(exc)
+            future.exception()  # followers get it; don't warn when there are none
+            return _failure(exc)
+        except BaseException:
+            # Cancelled (client gone, shutdown): release the followers, they retry on their own
+            future.cancel()
+            raise
+        else:
+            future.set_result(None)
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        await run_in_threadpool(self.cache.added, size)
+        return target, fmt, "MISS", st
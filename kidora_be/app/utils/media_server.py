@@ -0,0 +1,284 @@
+"""Serving /media: long-lived caching, strong validators, ranges and zero-copy where available.
+
+Stored files never change under their URL (content-addressed or random names), so:
+
+- every file is sent with `Cache-Control: public, max-age=31536000, immutable`; repeat visits
+  use the browser/proxy copy without revalidating (variant manifests, which a re-render can
+  rewrite, get a short max-age instead);
+- the ETag is strong: the SHA-256 in the file name for content-addressed originals, otherwise
+  a hash of the bytes (computed once per file version and cached); If-None-Match and
+  If-Modified-Since get a 304;
+- byte ranges (video seeking, resumed downloads) and If-Range are honoured;
+- when the client accepts it and a `<file>.br` / `<file>.gz` sibling exists for a compressible
+  type, that precompressed representation is sent (Vary: Accept-Encoding);
+- bodies go out via the ASGI pathsend extension when the server offers it (sendfile), or,
+  with MEDIA_ACCEL_REDIRECT_PREFIX set, as an `X-Accel-Redirect` so nginx sends the file:
+
+      location /_media/ { internal; alias /srv/kidora_be/media/; sendfile on; etag off;
+                          add_header ETag $upstream_http_etag; }
+
+Dot-files (in-progress uploads) are never served. With the S3 backend
+(app.utils.storage_backends) objects are redirected to MEDIA_S3_PUBLIC_URL when set, otherwise
+streamed with the same headers, passing single byte ranges through to the bucket.
+"""
+import hashlib
+import os
+import re
+import stat
+import threading
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from mimetypes import guess_type
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import quote
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, PlainTextResponse, Response
+
+from app.utils.compression import _accepted_encodings
+from app.utils.metrics import Counter
+from app.utils.storage_backends import ObjectInfo, StorageBackend
+
+MEDIA_RESPONSES = Counter("media_responses_total", "Responses from the media server, by status", ["status"])
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+_MUTABLE = "public, max-age=300"
+_CONTENT_ADDRESSED = re.compile(r"^([0-9a-f]{64})\.[A-Za-z0-9]+$")
+# Types worth sending precompressed; images and video are already compressed
+_COMPRESSIBLE_TYPES = ("application/json", "image/svg+xml", "text/")
+_PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+_ETAG_CACHE_SIZE = 8192
+
+
+class _ETagCache:
+    """Content hashes keyed by (path, mtime, size), so a rewritten file gets a new tag."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str, st: os.stat_result) -> str:
+        key = (path, st.st_mtime_ns, st.st_size)
+        with self._lock:
+            tag = self._entries.get(key)
+            if tag is not None:
+                self._entries.move_to_end(key)
+                return tag
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        tag = digest.hexdigest()[:32]
+        with self._lock:
+            self._entries[key] = tag
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return tag
+
+
+_etags = _ETagCache(_ETAG_CACHE_SIZE)
+
+
+async def strong_etag(path: Path, st: os.stat_result, encoding: Optional[str] = None) -> str:
+    match = _CONTENT_ADDRESSED.match(path.name)
+    if match is not None and encoding is None:
+        tag = match.group(1)
+    else:
+        tag = await anyio.to_thread.run_sync(_etags.get, str(path), st)
+    return f'"{tag}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # Weak comparison, as If-None-Match requires (W/"x" matches "x")
+    candidates = [t.strip() for t in header.split(",")]
+    return any(c == etag or c == f"W/{etag}" for c in candidates)
+
+
+def not_modified(request_headers: Headers, etag: str, st: os.stat_result) -> bool:
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(st.st_mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+async def _stat(path: Path) -> Optional[os.stat_result]:
+    try:
+        st = await anyio.to_thread.run_sync(os.stat, path)
+    except OSError:
+        return None
+    return st if stat.S_ISREG(st.st_mode) else None
+
+
+async def send_file(scope, receive, send, path: Path, st: os.stat_result, media_type: str,
+                    cache_control: str = IMMUTABLE, headers: Optional[Dict[str, str]] = None,
+                    accel_path: Optional[str] = None, encoding: Optional[str] = None) -> None:
+    """Send `path` with the caching/conditional/range behaviour described in the module doc."""
+    request_headers = Headers(scope=scope)
+    etag = await strong_etag(path, st, encoding)
+    response_headers = {
+        "Cache-Control": cache_control,
+        "ETag": etag,
+        "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+        **(headers or {}),
+    }
+    if encoding is not None:
+        response_headers["Content-Encoding"] = encoding
+    if not_modified(request_headers, etag, st):
+        MEDIA_RESPONSES.labels(status="304").inc()
+        response_headers.pop("Last-Modified")
+        await Response(status_code=304, headers=response_headers)(scope, receive, send)
+        return
+    if accel_path is not None and scope.get("method") == "GET":
+        # nginx serves the body (sendfile, ranges) from its internal location
+        MEDIA_RESPONSES.labels(status="accel").inc()
+        response_headers.update({"X-Accel-Redirect": accel_path, "Accept-Ranges": "bytes"})
+        await Response(status_code=200, headers=response_headers, media_type=media_type)(scope, receive, send)
+        return
+    status = "206" if "range" in request_headers else "200"
+    MEDIA_RESPONSES.labels(status=status).inc()
+    await FileResponse(path, headers=response_headers, media_type=media_type, stat_result=st)(scope, receive, send)
+
+
+def _compressible(media_type: str) -> bool:
+    return media_type.startswith(_COMPRESSIBLE_TYPES)
+
+
+async def _send_object(scope, receive, send, backend: StorageBackend, key: str, info: ObjectInfo,
+                       media_type: str, cache_control: str, headers: Dict[str, str],
+                       encoding: Optional[str]) -> None:
+    """Stream an object from a remote backend, passing a single byte range through."""
+    request_headers = Headers(scope=scope)
+    name = key.rpartition("/")[2]
+    match = _CONTENT_ADDRESSED.match(name)
+    etag = f'"{match.group(1)}"' if match is not None and encoding is None else (info.etag or "")
+    st = os.stat_result((0, 0, 0, 0, 0, 0, info.size, 0, int(info.mtime), 0))
+    response_headers = {
+        "Cache-Control": cache_control,
+        "Last-Modified": formatdate(info.mtime, usegmt=True),
+        "Accept-Ranges": "bytes",
+        **headers,
+    }
+    if etag:
+        response_headers["ETag"] = etag
+    if encoding is not None:
+        response_headers["Content-Encoding"] = encoding
+    if etag and not_modified(request_headers, etag, st):
+        MEDIA_RESPONSES.labels(status="304").inc()
+        response_headers.pop("Last-Modified")
+        await Response(status_code=304, headers=response_headers)(scope, receive, send)
+        return
+    if scope.get("method") == "HEAD":
+        MEDIA_RESPONSES.labels(status="200").inc()
+        response_headers["Content-Length"] = str(info.size)
+        await Response(status_code=200, headers=response_headers, media_type=media_type)(scope, receive, send)
+        return
+    byte_range = request_headers.get("range")
+    if_range = request_headers.get("if-range")
+    if byte_range and ("," in byte_range or (if_range and if_range.strip() != etag)):
+        byte_range = None  # multipart ranges and stale If-Range get the whole object
+    try:
+        chunks, length, content_range = await anyio.to_thread.run_sync(backend.open_range, key, byte_range)
+    except ValueError:
+        MEDIA_RESPONSES.labels(status="416").inc()
+        await Response(status_code=416, headers={"Content-Range": f"bytes */{info.size}"})(scope, receive, send)
+        return
+    status = 206 if content_range else 200
+    MEDIA_RESPONSES.labels(status=str(status)).inc()
+    response_headers["Content-Length"] = str(length)
+    if content_range:
+        response_headers["Content-Range"] = content_range
+    response = Response(status_code=status, headers=response_headers, media_type=media_type)
+    await send({"type": "http.response.start", "status": status, "headers": response.raw_headers})
+    iterator = iter(chunks)
+    try:
+        while True:
+            chunk = await anyio.to_thread.run_sync(next, iterator, None)
+            if chunk is None:
+                break
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            await anyio.to_thread.run_sync(close)
+    await send({"type": "http.response.body", "body": b""})
+
+
+class MediaFiles:
+    """ASGI app for the /media mount (replaces StaticFiles).
+
+    Local backends are served from disk as described above. Remote (S3) objects are redirected
+    to the backend's public URL when one is configured, and streamed through otherwise.
+    """
+
+    def __init__(self, backend: StorageBackend, accel_prefix: Optional[str] = None):
+        self.backend = backend
+        self.accel_prefix = accel_prefix.rstrip("/") + "/" if accel_prefix else None
+
+    @staticmethod
+    def _key(url_path: str) -> Optional[str]:
+        rel = url_path.split("/media/", 1)[-1] if url_path.startswith("/media/") else url_path.lstrip("/")
+        parts = [p for p in rel.split("/") if p]
+        if not parts or any(p.startswith(".") for p in parts):
+            return None
+        return "/".join(parts)
+
+    async def _stat(self, key: str):
+        path = self.backend.local_path(key)
+        if path is not None:
+            return await _stat(path)
+        try:
+            return await anyio.to_thread.run_sync(self.backend.stat, key)
+        except Exception:
+            return None
+
+    async def __call__(self, scope, receive, send):
+        assert scope["type"] == "http"
+        if scope.get("method") not in ("GET", "HEAD"):
+            await PlainTextResponse("Method Not Allowed", status_code=405, headers={"Allow": "GET, HEAD"})(scope, receive, send)
+            return
+        key = self._key(scope["path"])
+        if key is not None and not self.backend.is_local:
+            public = self.backend.public_url(key)
+            if public is not None:
+                # The bucket/CDN serves the bytes (and its own ranges and validators)
+                MEDIA_RESPONSES.labels(status="302").inc()
+                await Response(status_code=302, headers={"Location": public, "Cache-Control": IMMUTABLE})(scope, receive, send)
+                return
+        st = await self._stat(key) if key is not None else None
+        if st is None:
+            MEDIA_RESPONSES.labels(status="404").inc()
+            await PlainTextResponse("Not Found", status_code=404)(scope, receive, send)
+            return
+        name = key.rpartition("/")[2]
+        media_type = guess_type(name)[0] or "application/octet-stream"
+        cache_control = _MUTABLE if name.endswith(".variants.json") else IMMUTABLE
+
+        headers: Dict[str, str] = {}
+        encoding = None
+        if _compressible(media_type):
+            headers["Vary"] = "Accept-Encoding"
+            accepted = _accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+            for coding, suffix in _PRECOMPRESSED:
+                if coding in accepted:
+                    candidate_st = await self._stat(key + suffix)
+                    if candidate_st is not None:
+                        key, st, encoding = key + suffix, candidate_st, coding
+                        break
+
+        path = self.backend.local_path(key)
+        if path is None:
+            await _send_object(scope, receive, send, self.backend, key, st, media_type, cache_control, headers, encoding)
+            return
+        accel_path = self.accel_prefix + quote(key) if self.accel_prefix else None
+        await send_file(scope, receive, send, path, st, media_type, cache_control, headers, accel_path, encoding)
@@ -0,0 +1,261 @@
+"""Responsive variants of stored images: width steps, modern formats and a blur placeholder.
+
+When storage places an image (upload, import or re-use of an existing /media URL), a job is
+queued on a small process pool, so encoding never runs on the request path or holds the GIL
+of the API worker. The job stores, next to the original `<stem><ext>` in the storage backend:
+
+- `<stem>.w<width>.<fmt>` for each MEDIA_VARIANT_WIDTHS step narrower than the original
+  (plus the original width when it is below the largest step), in each MEDIA_VARIANT_FORMATS
+  format the installed Pillow can encode;
+- `<stem>.variants.json`, the manifest, written last: its presence means the set is complete
+  (with `.gz`/`.br` copies for the media server).
+
+variants_for() turns a manifest into the `*_variants` fields of ProductOut, ProductCard and
+HeroBannerOut. Until the job finishes (or without Pillow) those fields are null and clients
+use the original URL. Existing media can be processed with `python -m scripts.media_variants`.
+"""
+import gzip
+import json
+import logging
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from app.config import get_settings
+from app.utils.compression import brotli
+from app.utils import image_ops
+from app.utils.metrics import Counter
+from app.utils.storage_backends import get_backend
+
+logger = logging.getLogger(__name__)
+
+VARIANT_JOBS = Counter("media_variant_jobs_total", "Image variant jobs finished, by outcome", ["outcome"])
+
+try:
+    settings = get_settings()
+except Exception:
+    settings = None
+
+ENABLED = bool(getattr(settings, "MEDIA_VARIANTS_ENABLED", True)) and image_ops.AVAILABLE
+WIDTHS: Tuple[int, ...] = tuple(sorted({
+    int(w) for w in str(getattr(settings, "MEDIA_VARIANT_WIDTHS", "320,640,960,1280,1920")).split(",") if w.strip()
+}))
+WORKERS = max(1, int(getattr(settings, "MEDIA_VARIANT_WORKERS", 2)))
+_REQUESTED_FORMATS = [
+    f.strip().lower() for f in str(getattr(settings, "MEDIA_VARIANT_FORMATS", "webp,avif")).split(",") if f.strip()
+]
+FORMATS: Tuple[str, ...] = tuple(f for f in _REQUESTED_FORMATS if f in image_ops.supported_formats())
+
+# Source types Pillow decodes reliably; GIFs (often animated), HEIC and video are served as uploaded
+PROCESSABLE_TYPES = {"image/jpeg", "image/png", "image/webp", "image/bmp", "image/avif"}
+_PROCESSABLE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".avif"}
+
+MANIFEST_SUFFIX = ".variants.json"
+# Missing manifests are re-checked after this long (jobs usually finish within seconds)
+_MISSING_TTL_SECONDS = 10.0
+_CACHE_SIZE = 4096
+
+_lock = threading.Lock()
+_pool: Optional[ProcessPoolExecutor] = None
+_pending: Dict[str, Future] = {}
+_manifests: "OrderedDict[str, Tuple[float, Optional[Dict[str, Any]]]]" = OrderedDict()
+# Manifest reads, kept off the request path
+_reader = ThreadPoolExecutor(max_workers=2, thread_name_prefix="media-manifests")
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _lock:
+        if _pool is None:
+            # forkserver: never fork the threaded API worker itself; job processes fork from a
+            # single-threaded server that imported this module (and so the app) once
+            ctx = multiprocessing.get_context("forkserver")
+            ctx.set_forkserver_preload([__name__])
+            _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=ctx)
+        return _pool
+
+
+def shutdown_pool(broken: Optional[ProcessPoolExecutor] = None) -> None:
+    """Tear the pool down; the next get_pool() starts a fresh one. With `broken`, only when
+    that is still the current pool (so concurrent callers don't discard its replacement)."""
+    global _pool
+    with _lock:
+        if broken is not None and _pool is not broken:
+            return
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _keys(url: Optional[str]) -> Optional[Tuple[str, str, str]]:
+    """(backend key, directory key, stem) of a stored /media URL, or None for anything else."""
+    from app.utils.storage import media_key
+
+    key = media_key(url)
+    if key is None:
+        return None
+    directory, _, name = key.rpartition("/")
+    if "." not in name:
+        return None
+    return key, directory, name.split(".", 1)[0]
+
+
+def processable(url: str, content_type: Optional[str] = None) -> bool:
+    if content_type is not None:
+        return content_type in PROCESSABLE_TYPES
+    return Path(url).suffix.lower() in _PROCESSABLE_SUFFIXES
+
+
+# ---- jobs --------------------------------------------------------------------------------
+
+def _job(key: str, stem: str, widths: Tuple[int, ...], formats: Tuple[str, ...]) -> None:
+    """Runs in the pool: render the variants, then store the manifest that publishes them."""
+    import os
+    import shutil
+    import tempfile
+
+    from app.utils.storage_backends import get_backend
+
+    backend = get_backend()
+    directory = key.rpartition("/")[0]
+    work = tempfile.mkdtemp(dir=backend.staging_dir(directory), prefix=".variants-")
+    try:
+        src = backend.local_path(key)
+        if src is None:
+            src = os.path.join(work, ".source")
+            backend.download(key, src)
+        manifest = image_ops.render_variants(str(src), stem, widths, formats, out_dir=work)
+        for source in manifest["sources"]:
+            backend.put_file(f"{directory}/{source['file']}", os.path.join(work, source["file"]),
+                             image_ops.CONTENT_TYPES[source["format"]])
+        body = json.dumps(manifest, separators=(",", ":")).encode()
+        # Precompressed copies first (served by app.utils.media_server), the manifest itself last
+        outputs = [(MANIFEST_SUFFIX + ".gz", gzip.compress(body, 9))]
+        if brotli is not None:
+            outputs.append((MANIFEST_SUFFIX + ".br", brotli.compress(body)))
+        outputs.append((MANIFEST_SUFFIX, body))
+        for suffix, data in outputs:
+            path = os.path.join(work, stem + suffix)
+            with open(path, "wb") as out:
+                out.write(data)
+            backend.put_file(f"{directory}/{stem}{suffix}", path, "application/json")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+def _done(url: str, future: Future) -> None:
+    with _lock:
+        _pending.pop(url, None)
+        _manifests.pop(url, None)
+    if future.cancelled():
+        return
+    error = future.exception()
+    if error is None:
+        VARIANT_JOBS.labels(outcome="ok").inc()
+    else:
+        VARIANT_JOBS.labels(outcome="error").inc()
+        logger.warning("Image variants failed for %s: %s", url, error)
+
+
+def schedule(url: str, content_type: Optional[str] = None) -> Optional[Future]:
+    """Queue variant generation for a stored image unless it is done, queued or not an image."""
+    if not ENABLED or not (WIDTHS and FORMATS) or not processable(url, content_type):
+        return None
+    keys = _keys(url)
+    if keys is None:
+        return None
+    key, directory, stem = keys
+    with _lock:
+        if url in _pending:
+            return _pending[url]
+    if get_backend().exists(f"{directory}/{stem}{MANIFEST_SUFFIX}"):
+        return None
+    pool = get_pool()
+    try:
+        future = pool.submit(_job, key, stem, WIDTHS, FORMATS)
+    except Exception:
+        # A broken pool (e.g. a worker was OOM-killed) is replaced on the next call
+        logger.warning("Could not queue image variants for %s", url, exc_info=True)
+        shutdown_pool(pool)
+        return None
+    with _lock:
+        _pending[url] = future
+    future.add_done_callback(lambda f: _done(url, f))
+    return future
+
+
+# ---- reading -----------------------------------------------------------------------------
+
+def _read_manifest(url: str) -> Optional[Dict[str, Any]]:
+    keys = _keys(url)
+    if keys is None:
+        return None
+    _, directory, stem = keys
+    try:
+        body = get_backend().read_bytes(f"{directory}/{stem}{MANIFEST_SUFFIX}")
+        manifest = json.loads(body) if body is not None else None
+    except Exception:
+        logger.debug("Could not read the variant manifest of %s", url, exc_info=True)
+        return None
+    if manifest is None:
+        return None
+    base = url.rsplit("/", 1)[0]
+    return {
+        "width": manifest["width"],
+        "height": manifest["height"],
+        "placeholder": manifest.get("placeholder"),
+        "sources": [
+            {"url": f"{base}/{s['file']}", "width": s["width"], "height": s["height"], "format": s["format"]}
+            for s in manifest["sources"]
+        ],
+    }
+
+
+def _refresh(url: str) -> Optional[Dict[str, Any]]:
+    manifest = _read_manifest(url)
+    with _lock:
+        _manifests[url] = (time.monotonic() + _MISSING_TTL_SECONDS, manifest)
+        while len(_manifests) > _CACHE_SIZE:
+            _manifests.popitem(last=False)
+    return manifest
+
+
+def variants_for(url: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Variant set of a stored image, or None while it is not generated (or not applicable).
+
+    Manifests are immutable (URLs are content-addressed), so found ones are cached for good;
+    missing ones are re-checked after a few seconds. Reads (disk or object storage) happen on a
+    background thread and this call only returns what is cached, so it never blocks the
+    (async) request handlers that call it: an image seen for the first time gets its
+    variants from the next response on.
+    """
+    if not ENABLED or not url or not processable(url):
+        return None
+    now = time.monotonic()
+    with _lock:
+        hit = _manifests.get(url)
+        if hit is not None and (hit[1] is not None or hit[0] > now):
+            _manifests.move_to_end(url)
+            return hit[1]
+        # Hold the slot until the read completes, so each URL is read once per TTL
+        _manifests[url] = (now + _MISSING_TTL_SECONDS, None)
+    _reader.submit(_refresh, url)
+    return None
+
+
+def delete_variants(url: str) -> int:
+    """Remove the variant files and manifests of `url`; returns objects removed."""
+    keys = _keys(url)
+    if keys is None:
+        return 0
+    key, directory, stem = keys
+    backend = get_backend()
+    derived = [k for k in backend.list(f"{directory}/{stem}.") if k != key]
+    removed = backend.delete_many(derived) if derived else 0
+    with _lock:
+        _manifests.pop(url, None)
+    return removed
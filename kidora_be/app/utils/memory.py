@@ -0,0 +1,222 @@
+"""Memory diagnostics for long-running workers.
+
+- Process gauges (RSS, traced bytes) on /metrics; RSS, GC and tracemalloc state on the admin endpoint.
+- tracemalloc can be started at boot (MEMORY_TRACEMALLOC_FRAMES > 0) or on demand by an admin;
+  named snapshots are kept per worker and diffed to find the allocators that keep growing.
+- While tracing, MemorySamplingMiddleware measures the allocation peak of a sampled share of
+  requests (MEMORY_ROUTE_SAMPLE_RATE) per route template. tracemalloc's peak is process-wide,
+  so only one request is measured at a time and concurrent requests still add noise: treat
+  the numbers as "this route can push the heap up by about N", not as exact per-request cost.
+
+Admin endpoints live under /api/admin/diagnostics/memory.
+"""
+import gc
+import itertools
+import os
+import random
+import threading
+import tracemalloc
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from app.utils.metrics import Gauge, Histogram, register_collector, route_label
+
+PROCESS_RSS = Gauge("process_resident_memory_bytes", "Resident set size of this worker")
+TRACED_CURRENT = Gauge("tracemalloc_traced_bytes", "Bytes currently traced by tracemalloc (0 when off)")
+REQUEST_PEAK = Histogram(
+    "http_request_peak_alloc_bytes",
+    "Sampled allocation peak above the request's starting heap, by route template",
+    ["route"],
+    buckets=(64e3, 256e3, 1e6, 4e6, 16e6, 64e6, 256e6),
+)
+
+_MAX_SNAPSHOTS = 10
+_snapshots: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+_snapshot_ids = itertools.count(1)
+_lock = threading.Lock()
+_route_peaks: Dict[str, Dict[str, float]] = {}
+
+
+def rss_bytes() -> int:
+    """Current RSS from /proc (Linux); falls back to the peak from getrusage elsewhere."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _collect() -> None:
+    PROCESS_RSS.set(rss_bytes())
+    TRACED_CURRENT.set(tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0)
+
+
+register_collector(_collect)
+
+
+def tracemalloc_status() -> Dict[str, Any]:
+    tracing = tracemalloc.is_tracing()
+    current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+    return {
+        "tracing": tracing,
+        "frames": tracemalloc.get_traceback_limit() if tracing else 0,
+        "tracedBytes": current,
+        "peakBytes": peak,
+        "overheadBytes": tracemalloc.get_tracemalloc_memory() if tracing else 0,
+    }
+
+
+def memory_status() -> Dict[str, Any]:
+    return {
+        "rssBytes": rss_bytes(),
+        "gc": {"counts": gc.get_count(), "thresholds": gc.get_threshold(), "tracked": len(gc.get_objects())},
+        "tracemalloc": tracemalloc_status(),
+        "snapshots": list_snapshots(),
+    }
+
+
+def start_tracing(frames: int = 1) -> None:
+    # tracemalloc slows allocation-heavy code noticeably; deeper tracebacks cost more
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(max(1, frames))
+
+
+def stop_tracing() -> None:
+    """Stop tracing and drop snapshots (they are useless without the traces they index)."""
+    tracemalloc.stop()
+    with _lock:
+        _snapshots.clear()
+
+
+# ---- snapshots ---------------------------------------------------------------------------
+
+_IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def take_snapshot(label: Optional[str] = None) -> Dict[str, Any]:
+    if not tracemalloc.is_tracing():
+        raise RuntimeError("tracemalloc is not tracing; start it first")
+    gc.collect()
+    snap = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+    meta = {
+        "id": next(_snapshot_ids),
+        "label": label,
+        "takenAt": datetime.now(timezone.utc).isoformat(),
+        "rssBytes": rss_bytes(),
+        "tracedBytes": tracemalloc.get_traced_memory()[0],
+    }
+    with _lock:
+        _snapshots[meta["id"]] = {"meta": meta, "snapshot": snap}
+        while len(_snapshots) > _MAX_SNAPSHOTS:
+            _snapshots.popitem(last=False)
+    return meta
+
+
+def list_snapshots() -> List[Dict[str, Any]]:
+    with _lock:
+        return [s["meta"] for s in _snapshots.values()]
+
+
+def clear_snapshots() -> int:
+    with _lock:
+        n = len(_snapshots)
+        _snapshots.clear()
+    return n
+
+
+def _stat_out(stat, key_type: str) -> Dict[str, Any]:
+    frames = [f"{f.filename}:{f.lineno}" for f in stat.traceback]
+    out = {"location": frames[0] if key_type != "traceback" else frames, "sizeBytes": stat.size, "count": stat.count}
+    if hasattr(stat, "size_diff"):
+        out["sizeDiffBytes"] = stat.size_diff
+        out["countDiff"] = stat.count_diff
+    return out
+
+
+def top_allocators(snapshot_id: int, key_type: str = "lineno", limit: int = 25) -> List[Dict[str, Any]]:
+    with _lock:
+        entry = _snapshots.get(snapshot_id)
+    if entry is None:
+        raise KeyError(snapshot_id)
+    stats = entry["snapshot"].statistics(key_type)
+    return [_stat_out(s, key_type) for s in stats[:limit]]
+
+
+def diff_snapshots(base_id: int, target_id: Optional[int] = None, key_type: str = "lineno", limit: int = 25) -> Dict[str, Any]:
+    """Allocators sorted by growth from `base_id` to `target_id` (a fresh snapshot when omitted)."""
+    if target_id is None:
+        target_id = take_snapshot("diff target")["id"]
+    with _lock:
+        base, target = _snapshots.get(base_id), _snapshots.get(target_id)
+    if base is None or target is None:
+        raise KeyError(base_id if base is None else target_id)
+    stats = target["snapshot"].compare_to(base["snapshot"], key_type)
+    return {
+        "base": base["meta"],
+        "target": target["meta"],
+        "rssDiffBytes": target["meta"]["rssBytes"] - base["meta"]["rssBytes"],
+        "tracedDiffBytes": target["meta"]["tracedBytes"] - base["meta"]["tracedBytes"],
+        "top": [_stat_out(s, key_type) for s in stats[:limit]],
+    }
+
+
+# ---- per-route peaks ---------------------------------------------------------------------
+
+def route_peaks() -> List[Dict[str, Any]]:
+    with _lock:
+        rows = [dict(route=route, **values) for route, values in _route_peaks.items()]
+    for row in rows:
+        row["meanPeakBytes"] = int(row.pop("totalPeak") / row["samples"]) if row["samples"] else 0
+        row["meanRetainedBytes"] = int(row.pop("totalRetained") / row["samples"]) if row["samples"] else 0
+    return sorted(rows, key=lambda r: r["maxPeakBytes"], reverse=True)
+
+
+def clear_route_peaks() -> None:
+    with _lock:
+        _route_peaks.clear()
+
+
+def _record_peak(route: str, peak: int, retained: int) -> None:
+    REQUEST_PEAK.labels(route=route).observe(peak)
+    with _lock:
+        row = _route_peaks.setdefault(route, {"samples": 0, "maxPeakBytes": 0, "totalPeak": 0, "totalRetained": 0})
+        row["samples"] += 1
+        row["maxPeakBytes"] = max(row["maxPeakBytes"], peak)
+        row["totalPeak"] += peak
+        row["totalRetained"] += retained
+
+
+class MemorySamplingMiddleware:
+    """Measures the tracemalloc peak of sampled requests, one at a time, while tracing is on."""
+
+    def __init__(self, app, sample_rate: float = 0.01):
+        self.app = app
+        self.sample_rate = sample_rate
+        self._busy = threading.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or self.sample_rate <= 0
+            or not tracemalloc.is_tracing()
+            or random.random() >= self.sample_rate
+            or not self._busy.acquire(blocking=False)
+        ):
+            await self.app(scope, receive, send)
+            return
+        try:
+            tracemalloc.reset_peak()
+            start = tracemalloc.get_traced_memory()[0]
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                current, peak = tracemalloc.get_traced_memory()
+                _record_peak(route_label(scope), max(peak - start, 0), current - start)
+        finally:
+            self._busy.release()
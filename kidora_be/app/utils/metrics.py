@@ -0,0 +1,214 @@
+"""Minimal in-process metrics registry (counters, gauges, histograms).
+
+Rendered in the Prometheus text exposition format so it can be scraped without pulling in
+prometheus_client. Each process keeps its own values; label sets should stay bounded
+(route templates, operation names) and never include raw paths or user input.
+"""
+import bisect
+import math
+from abc import ABC, abstractmethod
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry: Dict[str, "_Metric"] = {}
+_collectors: List[Callable[[], None]] = []
+_registry_lock = threading.Lock()
+
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    if float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_str(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric(ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[LabelValues, Any] = {}
+        with _registry_lock:
+            if name in _registry:
+                raise ValueError(f"Metric {name} already registered")
+            _registry[name] = self
+
+    def _key(self, labels: Dict[str, object]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def labels(self, **labels) -> "_Bound":
+        return _Bound(self, self._key(labels))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    @abstractmethod
+    def samples(self) -> List[Tuple[str, LabelValues, Optional[Tuple[str, str]], float]]:
+        """(series name suffix, label values, extra label, value) for every exported series."""
+
+
+class _Bound:
+    __slots__ = ("_metric", "_key")
+
+    def __init__(self, metric: _Metric, key: LabelValues):
+        self._metric = metric
+        self._key = key
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._metric._inc(self._key, amount)  # type: ignore[attr-defined]
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._metric._inc(self._key, -amount)  # type: ignore[attr-defined]
+
+    def set(self, value: float) -> None:
+        self._metric._set(self._key, value)  # type: ignore[attr-defined]
+
+    def observe(self, value: float) -> None:
+        self._metric._observe(self._key, value)  # type: ignore[attr-defined]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _inc(self, key: LabelValues, amount: float) -> None:
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._inc((), amount)
+
+    def value(self, **labels) -> float:
+        return float(self._values.get(self._key(labels), 0.0))
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, k, None, float(v)) for k, v in self._values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def _set(self, key: LabelValues, value: float) -> None:
+        with self._lock:
+            self._values[key] = float(value)
+
+    def set(self, value: float) -> None:
+        self._set((), value)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._inc((), -amount)
+
+
+class _HistogramState:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self, n: int):
+        self.counts = [0] * n
+        self.total = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def _observe(self, key: LabelValues, value: float) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = _HistogramState(len(self.buckets))
+            state.counts[i] += 1
+            state.total += value
+            state.count += 1
+
+    def observe(self, value: float) -> None:
+        self._observe((), value)
+
+    def samples(self):
+        out = []
+        with self._lock:
+            items = [(k, list(v.counts), v.total, v.count) for k, v in self._values.items()]
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                out.append((f"{self.name}_bucket", key, ("le", _fmt(bound)), float(cumulative)))
+            out.append((f"{self.name}_sum", key, None, float(total)))
+            out.append((f"{self.name}_count", key, None, float(count)))
+        return out
+
+
+def route_label(scope) -> str:
+    """Bounded route label for an ASGI scope: the matched route template (e.g. /api/products/{id}),
+    the mount point for mounted apps such as /media, or "unmatched"."""
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    if path:
+        return path
+    if scope.get("app_root_path") is not None and scope.get("root_path"):
+        return scope["root_path"]
+    return "unmatched"
+
+
+def register_collector(fn: Callable[[], None]) -> None:
+    """Register a callback run right before rendering (e.g. to refresh gauges from live state)."""
+    _collectors.append(fn)
+
+
+def _collect() -> List[_Metric]:
+    for fn in list(_collectors):
+        try:
+            fn()
+        except Exception:
+            pass
+    with _registry_lock:
+        return list(_registry.values())
+
+
+def render_prometheus() -> str:
+    lines: List[str] = []
+    for m in _collect():
+        lines.append(f"# HELP {m.name} {m.documentation}")
+        lines.append(f"# TYPE {m.name} {m.kind}")
+        for sample_name, key, extra, value in m.samples():
+            lines.append(f"{sample_name}{_label_str(m.labelnames, key, extra)} {_fmt(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def snapshot(prefix: str = "") -> Dict[str, List[Dict[str, object]]]:
+    """JSON-friendly view of current values, optionally limited to metric names with `prefix`."""
+    out: Dict[str, List[Dict[str, object]]] = {}
+    for m in _collect():
+        if not m.name.startswith(prefix):
+            continue
+        out[m.name] = [
+            {"sample": sample_name, "labels": dict(zip(m.labelnames, key), **({extra[0]: extra[1]} if extra else {})), "value": value}
+            for sample_name, key, extra, value in m.samples()
+        ]
+    return out
@@ -0,0 +1,245 @@
+"""Full-response microcache for anonymous catalog GETs.
+
+Requests without an Authorization header to the cacheable endpoints (product list/cards/detail,
+categories, hero banners, public payment config) are served from a per-worker in-memory cache
+keyed by path + normalized query string + negotiated representation (JSON or msgpack).
+
+- Fresh entries are served directly (X-Cache: HIT).
+- Within the stale window an entry is served immediately while one background task refreshes
+  it (stale-while-revalidate, X-Cache: STALE).
+- On a miss only one request per key runs the endpoint; concurrent requests for the same key
+  wait for its result (single-flight, X-Cache: COALESCED).
+
+Successful admin writes under the catalog prefixes clear this worker's cache; other workers
+converge within the TTL. Only complete 200 responses without Set-Cookie or
+Cache-Control private/no-store are stored.
+"""
+import asyncio
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Pattern, Sequence, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from starlette.datastructures import Headers
+
+from app.utils.metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+MICROCACHE_REQUESTS = Counter("http_microcache_requests_total", "Microcache lookups by result", ["result"])
+MICROCACHE_ENTRIES = Gauge("http_microcache_entries", "Responses held in the microcache")
+
+# How long a single-flight follower waits for the leader before computing on its own
+_FOLLOWER_TIMEOUT_SECONDS = 10.0
+
+# Headers that describe one specific transfer rather than the cached representation
+_DROP_HEADERS = {b"date", b"server-timing", b"x-cache", b"age"}
+
+
+class _Entry:
+    __slots__ = ("status", "headers", "body", "route", "stored_at", "fresh_until", "stale_until")
+
+    def __init__(self, status: int, headers: List[Tuple[bytes, bytes]], body: bytes, ttl: float, stale: float, route=None):
+        now = time.monotonic()
+        self.route = route
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.stored_at = now
+        self.fresh_until = now + ttl
+        self.stale_until = now + ttl + stale
+
+
+def default_rules(listing_ttl: float, static_ttl: float) -> List[Tuple[Pattern, float]]:
+    return [
+        (re.compile(r"^/api/products/?$"), listing_ttl),
+        (re.compile(r"^/api/products/cards/?$"), listing_ttl),
+        (re.compile(r"^/api/products/\d+/?$"), listing_ttl),
+        (re.compile(r"^/api/products/(categories|category-counts)/?$"), static_ttl),
+        (re.compile(r"^/api/hero-banners/?$"), static_ttl),
+        (re.compile(r"^/api/payments/config/?$"), static_ttl),
+    ]
+
+
+DEFAULT_INVALIDATE_PREFIXES = ("/api/products", "/api/hero-banners", "/api/admin/payments/config")
+
+
+class MicrocacheMiddleware:
+    def __init__(
+        self,
+        app,
+        rules: Sequence[Tuple[Pattern, float]] = (),
+        stale_seconds: float = 30.0,
+        max_entries: int = 1000,
+        invalidate_prefixes: Sequence[str] = DEFAULT_INVALIDATE_PREFIXES,
+    ):
+        self.app = app
+        self.rules = list(rules) or default_rules(5.0, 30.0)
+        self.stale_seconds = stale_seconds
+        self.max_entries = max_entries
+        self.invalidate_prefixes = tuple(invalidate_prefixes)
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._refresh_tasks: set = set()
+        # Bumped by clear(); results computed before an invalidation are never stored
+        self._generation = 0
+
+    # ---- cache bookkeeping -------------------------------------------------------------
+
+    def _ttl_for(self, path: str) -> Optional[float]:
+        for pattern, ttl in self.rules:
+            if pattern.match(path):
+                return ttl if ttl > 0 else None
+        return None
+
+    @staticmethod
+    def _key(scope, headers: Headers) -> str:
+        query = scope.get("query_string", b"").decode("latin-1")
+        normalized = urlencode(sorted(parse_qsl(query, keep_blank_values=True)))
+        path = scope["path"].rstrip("/") or "/"
+        accept = headers.get("accept", "")
+        variant = "msgpack" if "msgpack" in accept else "json"
+        return f"{path}?{normalized}#{variant}"
+
+    def _store(self, key: str, entry: _Entry) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        MICROCACHE_ENTRIES.set(len(self._entries))
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._entries.clear()
+        MICROCACHE_ENTRIES.set(0)
+
+    @staticmethod
+    def _storable(status: int, headers: List[Tuple[bytes, bytes]]) -> bool:
+        if status != 200:
+            return False
+        h = Headers(raw=headers)
+        cache_control = h.get("cache-control", "").lower()
+        return "set-cookie" not in h and "private" not in cache_control and "no-store" not in cache_control
+
+    # ---- running the endpoint ----------------------------------------------------------
+
+    async def _compute(self, scope, receive) -> Tuple[int, List[Tuple[bytes, bytes]], bytes]:
+        """Run the app and capture the whole response (cacheable endpoints are small JSON)."""
+        captured = {"status": 500, "headers": [], "chunks": []}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                captured["status"] = message["status"]
+                captured["headers"] = [
+                    (k, v) for k, v in message.get("headers", []) if k.lower() not in _DROP_HEADERS
+                ]
+            elif message["type"] == "http.response.body":
+                captured["chunks"].append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+        return captured["status"], captured["headers"], b"".join(captured["chunks"])
+
+    async def _refresh(self, scope, key: str, ttl: float) -> None:
+        async def empty_receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        generation = self._generation
+        try:
+            result = await self._compute(dict(scope), empty_receive)
+            if generation == self._generation and self._storable(result[0], result[1]):
+                self._store(key, _Entry(result[0], result[1], result[2], ttl, self.stale_seconds, scope.get("route")))
+            future.set_result(result)
+        except Exception as e:
+            logger.warning("Microcache refresh failed for %s: %s", key, e)
+            future.set_result(None)
+        finally:
+            self._inflight.pop(key, None)
+
+    @staticmethod
+    async def _send(send, status: int, headers: List[Tuple[bytes, bytes]], body: bytes, cache_state: str, age: float = 0.0) -> None:
+        out = list(headers) + [(b"x-cache", cache_state.encode()), (b"age", str(int(age)).encode())]
+        await send({"type": "http.response.start", "status": status, "headers": out})
+        await send({"type": "http.response.body", "body": body, "more_body": False})
+
+    # ---- ASGI entry point --------------------------------------------------------------
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope.get("method")
+        if method not in ("GET", "HEAD"):
+            await self._passthrough_with_invalidation(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        ttl = self._ttl_for(scope["path"])
+        if ttl is None or "authorization" in headers or method == "HEAD" or "no-cache" in headers.get("cache-control", ""):
+            await self.app(scope, receive, send)
+            return
+
+        key = self._key(scope, headers)
+        base_scope = dict(scope)
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry.route is not None:
+            # Let outer middleware (request metrics) label cache hits by route template
+            scope["route"] = entry.route
+        if entry is not None and now < entry.fresh_until:
+            MICROCACHE_REQUESTS.labels(result="hit").inc()
+            self._entries.move_to_end(key)
+            await self._send(send, entry.status, entry.headers, entry.body, "HIT", now - entry.stored_at)
+            return
+        if entry is not None and now < entry.stale_until:
+            MICROCACHE_REQUESTS.labels(result="stale").inc()
+            if key not in self._inflight:
+                task = asyncio.create_task(self._refresh(base_scope, key, ttl))
+                self._refresh_tasks.add(task)
+                task.add_done_callback(self._refresh_tasks.discard)
+            await self._send(send, entry.status, entry.headers, entry.body, "STALE", now - entry.stored_at)
+            return
+
+        leader = self._inflight.get(key)
+        if leader is not None:
+            try:
+                result = await asyncio.wait_for(asyncio.shield(leader), _FOLLOWER_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                result = None
+            if result is not None:
+                MICROCACHE_REQUESTS.labels(result="coalesced").inc()
+                await self._send(send, result[0], result[1], result[2], "COALESCED")
+                return
+
+        MICROCACHE_REQUESTS.labels(result="miss").inc()
+        future = asyncio.get_running_loop().create_future()
+        self._inflight.setdefault(key, future)
+        generation = self._generation
+        result = None
+        try:
+            result = await self._compute(scope, receive)
+        finally:
+            if self._inflight.get(key) is future:
+                self._inflight.pop(key, None)
+            if not future.done():
+                # Followers fall back to computing themselves when the leader failed (None)
+                future.set_result(result)
+        status, response_headers, body = result
+        if generation == self._generation and self._storable(status, response_headers):
+            self._store(key, _Entry(status, response_headers, body, ttl, self.stale_seconds, scope.get("route")))
+        await self._send(send, status, response_headers, body, "MISS")
+
+    async def _passthrough_with_invalidation(self, scope, receive, send):
+        path = scope["path"]
+        if not path.startswith(self.invalidate_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        async def watch(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                self.clear()
+            await send(message)
+
+        await self.app(scope, receive, watch)
@@ -0,0 +1,359 @@
+"""On-demand statistical profiling of single requests.
+
+A request is profiled when an admin sends the `X-Profile: 1` header (HTTP Basic credentials
+of an ADMIN_EMAILS account) or when it is picked by PROFILING_SAMPLE_RATE. While it runs, one
+background thread samples the stacks of the threads doing its work every PROFILING_INTERVAL_MS:
+
+- the event loop thread while the request's task is running; while the task is suspended, the
+  chain of coroutines it is awaiting (so time waiting on async SQL or other awaits is wall time
+  in the profile too);
+- threadpool threads from the request's first SQL statement on that thread until the request
+  ends (sync endpoints and dependencies run there; a worker that is handed someone else's
+  work mid-request can leak a few foreign samples into the profile).
+
+Every sample is classified by its innermost recognised frame as `sql` (DBAPI execute),
+`io` (SMTP, HTTP clients, sockets, urlopen), `wait` (suspended on some other await) or `python`
+and stored as folded stacks ("[sql];frame;frame;... count"), which flamegraph.pl, speedscope and
+inferno read directly. Profiles stay in a per-worker ring buffer; header-triggered responses
+carry `X-Profile-Id`, and admins fetch them under /api/admin/diagnostics/profiles.
+"""
+import asyncio
+import base64
+import contextvars
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter as _Tally
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+
+from app.utils.metrics import Counter, route_label
+
+logger = logging.getLogger(__name__)
+
+PROFILED_REQUESTS = Counter("http_profiled_requests_total", "Requests run under the sampling profiler", ["trigger"])
+
+_SQL_FILES = ("/psycopg/", "/psycopg2/", "/asyncpg/")
+_SQL_FUNCTIONS = {"do_execute", "do_executemany", "do_execute_no_params"}
+_IO_FILES = (
+    "/smtplib.py", "/ssl.py", "/socket.py", "/http/client.py", "/urllib/request.py",
+    "/httpx/", "/httpcore/", "/h11/", "/botocore/", "/boto3/",
+)
+_THREADPOOL_FILES = ("/anyio/to_thread.py", "/anyio/_backends/_asyncio.py", "/starlette/concurrency.py")
+_MAX_DEPTH = 128
+
+_active: contextvars.ContextVar[Optional["ProfileSession"]] = contextvars.ContextVar("profile_session", default=None)
+
+
+# ---- stack helpers -----------------------------------------------------------------------
+
+_PATH_PREFIXES = sorted({p for p in sys.path if p and os.path.isdir(p)} | {os.getcwd()}, key=len, reverse=True)
+
+
+def _short_path(filename: str) -> str:
+    for prefix in _PATH_PREFIXES:
+        if filename.startswith(prefix):
+            return filename[len(prefix):].lstrip("/\\")
+    return filename
+
+
+def _label(code) -> str:
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({_short_path(code.co_filename)})"
+
+
+def _thread_stack(frame) -> List[Any]:
+    """Code objects from the outermost to the innermost frame."""
+    codes = []
+    while frame is not None and len(codes) < _MAX_DEPTH:
+        codes.append(frame.f_code)
+        frame = frame.f_back
+    codes.reverse()
+    return codes
+
+
+def _strip_loop_frames(codes: List[Any]) -> List[Any]:
+    # Drop the server/event-loop frames beneath the callback the loop is running (Handle._run)
+    for i, code in enumerate(codes):
+        if code.co_name == "_run" and code.co_filename.endswith("events.py"):
+            return codes[i + 1:]
+    return codes
+
+
+def _await_stack(coro) -> List[Any]:
+    """Code objects of a suspended task's await chain (outermost coroutine first)."""
+    codes = []
+    while coro is not None and len(codes) < _MAX_DEPTH:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None) or getattr(coro, "ag_frame", None)
+        if frame is None:
+            break
+        codes.append(frame.f_code)
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None) or getattr(coro, "ag_await", None)
+    return codes
+
+
+def _classify(codes: List[Any], suspended: bool) -> str:
+    for code in reversed(codes):
+        filename = code.co_filename
+        if code.co_name in _SQL_FUNCTIONS or any(p in filename for p in _SQL_FILES):
+            return "sql"
+        if any(p in filename for p in _IO_FILES):
+            return "io"
+    return "wait" if suspended else "python"
+
+
+def _idle_worker(codes: List[Any]) -> bool:
+    # An anyio worker thread between jobs blocks in queue.get()
+    return bool(codes) and codes[-1].co_filename.endswith(("queue.py", "threading.py"))
+
+
+# ---- sessions ----------------------------------------------------------------------------
+
+class ProfileSession:
+    def __init__(self, scope, trigger: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.scope = scope
+        self.trigger = trigger
+        self.loop = asyncio.get_running_loop()
+        self.task = asyncio.current_task()
+        self.loop_thread = threading.get_ident()
+        self.threads: set = set()
+        self.stacks: _Tally = _Tally()
+        self.categories: _Tally = _Tally()
+        self.ticks = 0
+        self.started = time.perf_counter()
+        self.started_at = datetime.now(timezone.utc)
+
+    def register_thread(self) -> None:
+        ident = threading.get_ident()
+        if ident != self.loop_thread:
+            self.threads.add(ident)
+
+    def _add(self, codes: List[Any], suspended: bool = False) -> None:
+        if not codes:
+            return
+        category = _classify(codes, suspended)
+        self.categories[category] += 1
+        self.stacks[";".join([f"[{category}]"] + [_label(c) for c in codes])] += 1
+
+    def sample(self, frames: Dict[int, Any]) -> None:
+        """One tick of the sampler thread (holds the sampler lock)."""
+        self.ticks += 1
+        worker_busy = False
+        for ident in list(self.threads):
+            frame = frames.get(ident)
+            if frame is None:
+                continue
+            codes = _thread_stack(frame)
+            if _idle_worker(codes):
+                continue
+            worker_busy = True
+            self._add(codes)
+        task = self.task
+        if task is None or task.done():
+            return
+        if asyncio.current_task(self.loop) is task:
+            self._add(_strip_loop_frames(_thread_stack(frames.get(self.loop_thread))))
+            return
+        codes = _await_stack(task.get_coro())
+        if worker_busy and codes and any(p in codes[-1].co_filename for p in _THREADPOOL_FILES):
+            # Awaiting the threadpool call already sampled above
+            return
+        self._add(codes, suspended=True)
+
+    def result(self, status_code: int) -> Dict[str, Any]:
+        duration = time.perf_counter() - self.started
+        samples = sum(self.categories.values())
+        interval_ms = duration * 1000 / self.ticks if self.ticks else 0.0
+        return {
+            "id": self.id,
+            "trigger": self.trigger,
+            "method": self.scope.get("method"),
+            "path": self.scope.get("path"),
+            "route": route_label(self.scope),
+            "status": status_code,
+            "startedAt": self.started_at.isoformat(),
+            "durationMs": round(duration * 1000, 2),
+            "samples": samples,
+            "intervalMs": round(interval_ms, 3),
+            # Estimated wall time per category (samples x mean interval)
+            "categoriesMs": {k: round(v * interval_ms, 1) for k, v in self.categories.most_common()},
+            "folded": "\n".join(f"{stack} {n}" for stack, n in self.stacks.most_common()),
+        }
+
+
+class _Sampler:
+    """One daemon thread sampling every active session; sleeps while none is active."""
+
+    def __init__(self):
+        self.interval = 0.005
+        self._sessions: set = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, session: ProfileSession) -> None:
+        with self._lock:
+            self._sessions.add(session)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def remove(self, session: ProfileSession) -> None:
+        # Taking the lock guarantees no tick is still reading the session afterwards
+        with self._lock:
+            self._sessions.discard(session)
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._sessions:
+                    self._wake.clear()
+                    sessions = None
+                else:
+                    frames = sys._current_frames()
+                    for session in self._sessions:
+                        try:
+                            session.sample(frames)
+                        except Exception:
+                            logger.debug("Profiler tick failed", exc_info=True)
+                    sessions = True
+                    del frames
+            if sessions is None:
+                self._wake.wait()
+            else:
+                time.sleep(self.interval)
+
+
+_sampler = _Sampler()
+_profiles: "deque[Dict[str, Any]]" = deque(maxlen=50)
+_profiles_lock = threading.Lock()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _register_sql_thread(conn, cursor, statement, parameters, context, executemany):
+    session = _active.get()
+    if session is not None:
+        session.register_thread()
+
+
+# ---- public API --------------------------------------------------------------------------
+
+def recent_profiles(limit: int = 50) -> List[Dict[str, Any]]:
+    """Newest first, without the folded stacks."""
+    with _profiles_lock:
+        items = list(_profiles)[-limit:]
+    return [{k: v for k, v in p.items() if k != "folded"} for p in reversed(items)]
+
+
+def get_profile(profile_id: str) -> Optional[Dict[str, Any]]:
+    with _profiles_lock:
+        for profile in _profiles:
+            if profile["id"] == profile_id:
+                return profile
+    return None
+
+
+def clear_profiles() -> int:
+    with _profiles_lock:
+        n = len(_profiles)
+        _profiles.clear()
+    return n
+
+
+def _store(profile: Dict[str, Any]) -> None:
+    with _profiles_lock:
+        _profiles.append(profile)
+
+
+def _basic_credentials(headers: Headers) -> Optional[tuple]:
+    scheme, _, value = headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "basic" or not value:
+        return None
+    try:
+        email, _, password = base64.b64decode(value).decode("utf-8").partition(":")
+    except Exception:
+        return None
+    return email, password
+
+
+def _is_admin(email: str, password: str) -> bool:
+    from app.models.user import SessionLocal, User
+    from app.utils.security import is_admin_email
+
+    if not is_admin_email(email):
+        return False
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.email == email).first()
+        return user is not None and user.password == password
+    finally:
+        db.close()
+
+
+class ProfilingMiddleware:
+    def __init__(self, app, sample_rate: float = 0.0, interval_ms: float = 5.0, buffer_size: int = 50, header: str = "x-profile"):
+        global _profiles
+        self.app = app
+        self.sample_rate = sample_rate
+        self.header = header.lower()
+        _sampler.interval = max(interval_ms, 1.0) / 1000.0
+        if _profiles.maxlen != buffer_size:
+            with _profiles_lock:
+                _profiles = deque(_profiles, maxlen=max(buffer_size, 1))
+
+    async def _trigger(self, scope) -> Optional[str]:
+        headers = Headers(scope=scope)
+        if headers.get(self.header, "").strip().lower() in ("1", "true", "yes"):
+            creds = _basic_credentials(headers)
+            if creds and await run_in_threadpool(_is_admin, *creds):
+                return "header"
+            return None
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trigger = await self._trigger(scope)
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        session = ProfileSession(scope, trigger)
+        status = {"code": 500}
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if trigger == "header":
+                    message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", session.id.encode())]
+            await send(message)
+
+        PROFILED_REQUESTS.labels(trigger=trigger).inc()
+        token = _active.set(session)
+        _sampler.add(session)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _sampler.remove(session)
+            _active.reset(token)
+            profile = session.result(status["code"])
+            _store(profile)
+            logger.info(
+                "request_profiled id=%s route=%s duration_ms=%.1f samples=%d categories=%s",
+                profile["id"], profile["route"], profile["durationMs"], profile["samples"], profile["categoriesMs"],
+            )
@@ -0,0 +1,163 @@
+"""Per-request SQL accounting.
+
+Engine-level cursor events (registered once for every Engine, including the sync side of the
+async engines) count statements and DB time into the stats object of the current request,
+carried in a contextvar that follows the request into threadpool workers and async greenlets.
+QueryStatsMiddleware reports the totals as a Server-Timing header plus one log line, flags
+likely N+1 patterns (the same statement repeated many times) and enforces query budgets.
+"""
+import contextvars
+import logging
+import time
+from collections import Counter as _Tally
+from typing import Callable, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.utils.metrics import route_label
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised (when SQL_QUERY_BUDGET_STRICT=1) if a request runs more queries than its budget."""
+
+
+class RequestQueryStats:
+    __slots__ = ("count", "duration", "statements", "budget", "started", "scope")
+
+    def __init__(self, budget: Optional[int] = None, scope: Optional[dict] = None):
+        self.scope = scope
+        self.count = 0
+        self.duration = 0.0
+        self.statements: _Tally = _Tally()
+        self.budget = budget
+        self.started = time.perf_counter()
+
+    @property
+    def route(self) -> str:
+        return route_label(self.scope or {})
+
+    def repeated(self, threshold: int) -> List[tuple]:
+        return [(stmt, n) for stmt, n in self.statements.most_common(3) if n >= threshold]
+
+
+_current: contextvars.ContextVar[Optional[RequestQueryStats]] = contextvars.ContextVar("request_query_stats", default=None)
+
+# Callbacks(statement, parameters, elapsed_seconds, conn) run after every cursor execution
+_observers: List[Callable] = []
+
+
+def current_stats() -> Optional[RequestQueryStats]:
+    return _current.get()
+
+
+def current_route() -> Optional[str]:
+    """Route template of the request running the current statement, if any."""
+    stats = _current.get()
+    return stats.route if stats is not None else None
+
+
+def add_query_observer(fn: Callable) -> None:
+    _observers.append(fn)
+
+
+def query_budget(limit: int):
+    """Dependency factory: cap the number of SQL statements the route may run.
+
+    Usage: `@router.get(..., dependencies=[Depends(query_budget(3))])`.
+    """
+    def _set_budget():
+        stats = _current.get()
+        if stats is not None:
+            stats.budget = limit
+    return _set_budget
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    if context is not None and context.execution_options.get("skip_query_stats"):
+        # Diagnostics' own statements (e.g. EXPLAIN captures) are not request work
+        return
+    stats = _current.get()
+    if stats is not None:
+        stats.count += 1
+        stats.duration += elapsed
+        stats.statements[statement] += 1
+    for fn in _observers:
+        try:
+            fn(statement, parameters, elapsed, conn)
+        except Exception:
+            logger.debug("Query observer failed", exc_info=True)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    # Keep the per-connection start stack balanced when a statement fails
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_start"):
+        conn.info["query_start"].pop()
+
+
+class QueryStatsMiddleware:
+    """ASGI middleware attaching SQL counts/time to every HTTP response."""
+
+    def __init__(self, app, default_budget: int = 0, strict: bool = False, n_plus_one_threshold: int = 5, log_requests: bool = True):
+        self.app = app
+        self.default_budget = default_budget or None
+        self.strict = strict
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.log_requests = log_requests
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestQueryStats(self.default_budget, scope)
+        token = _current.set(stats)
+        status = {"code": 500}
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                total_ms = (time.perf_counter() - stats.started) * 1000
+                header = f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries", app;dur={total_ms:.1f}'
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"server-timing", header.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            self._report(scope, stats, status["code"])
+
+    def _report(self, scope, stats: RequestQueryStats, status_code: int) -> None:
+        route = stats.route
+        total_ms = (time.perf_counter() - stats.started) * 1000
+        if self.log_requests and stats.count:
+            logger.info(
+                "sql_stats method=%s route=%s status=%s queries=%d db_ms=%.1f total_ms=%.1f",
+                scope.get("method"), route, status_code, stats.count, stats.duration * 1000, total_ms,
+            )
+        for statement, n in stats.repeated(self.n_plus_one_threshold):
+            logger.warning(
+                "possible_n_plus_one route=%s repeats=%d statement=%s",
+                route, n, " ".join(statement.split())[:300],
+            )
+        if stats.budget is not None and stats.count > stats.budget:
+            msg = f"{scope.get('method')} {route} ran {stats.count} queries (budget {stats.budget})"
+            if self.strict:
+                raise QueryBudgetExceeded(msg)
+            logger.warning("query_budget_exceeded %s", msg)
@@ -0,0 +1,67 @@
+"""HTTP request metrics: latency by route template, status counts, in-flight requests and
+threadpool saturation. Exposed with everything else in app.utils.metrics at GET /metrics.
+"""
+import time
+
+import anyio.to_thread
+
+from app.utils.metrics import Counter, Gauge, Histogram, register_collector, route_label
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Request latency until the response body is complete, by route template",
+    ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+REQUESTS = Counter("http_requests_total", "Completed requests by route template and status code", ["method", "route", "status"])
+IN_FLIGHT = Gauge("http_requests_in_flight", "Requests currently being handled")
+THREADPOOL_TOKENS = Gauge("threadpool_tokens_total", "Worker threads available to sync endpoints/dependencies")
+THREADPOOL_IN_USE = Gauge("threadpool_tokens_in_use", "Worker threads currently busy")
+THREADPOOL_WAITING = Gauge("threadpool_tasks_waiting", "Sync calls queued for a free worker thread")
+
+_KNOWN_METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+
+class RequestMetricsMiddleware:
+    """Outermost ASGI middleware; labels come from the route template, never the raw path."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            IN_FLIGHT.dec()
+            method = scope.get("method", "GET")
+            method = method if method in _KNOWN_METHODS else "OTHER"
+            route = route_label(scope)
+            REQUEST_DURATION.labels(method=method, route=route).observe(time.perf_counter() - started)
+            REQUESTS.labels(method=method, route=route, status=str(status["code"])).inc()
+
+
+def _collect_threadpool() -> None:
+    # The default limiter lives on the running event loop; skip when rendered off-loop
+    try:
+        limiter = anyio.to_thread.current_default_thread_limiter()
+        stats = limiter.statistics()
+    except Exception:
+        return
+    THREADPOOL_TOKENS.set(limiter.total_tokens)
+    THREADPOOL_IN_USE.set(stats.borrowed_tokens)
+    THREADPOOL_WAITING.set(stats.tasks_waiting)
+
+
+register_collector(_collect_threadpool)
@@ -0,0 +1,43 @@
+import asyncio
+import logging
+from typing import Callable, Dict, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+_tasks: Dict[str, asyncio.Task] = {}
+
+
+def schedule_periodic(name: str, interval_seconds: float, func: Callable[[], object], initial_delay: Optional[float] = None) -> None:
+    """Run a blocking callable every `interval_seconds` on the threadpool until shutdown.
+
+    Must be called from the event loop (e.g. an async startup handler). Failures are logged
+    and the job keeps running; a non-positive interval disables the job.
+    """
+    if interval_seconds <= 0 or name in _tasks:
+        return
+
+    async def _runner():
+        await asyncio.sleep(interval_seconds if initial_delay is None else initial_delay)
+        while True:
+            try:
+                result = await run_in_threadpool(func)
+                logger.debug("Periodic job %s finished: %s", name, result)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Periodic job %s failed", name)
+            await asyncio.sleep(interval_seconds)
+
+    _tasks[name] = asyncio.get_running_loop().create_task(_runner(), name=f"periodic:{name}")
+
+
+async def stop_all() -> None:
+    """Cancel every scheduled job and wait for them to unwind."""
+    tasks = list(_tasks.values())
+    _tasks.clear()
+    for t in tasks:
+        t.cancel()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -5,11 +5,25 @@ from fastapi.security import HTTPBasic, HTTPBasicCredentials, HTTPBearer, HTTPAu
 import smtplib
 from email.mime.text import MIMEText
 import logging
+import time
 import uuid
 
 from jose import jwt, JWTError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.user import get_db
+from app.models.async_db import get_async_db
+from app.utils.metrics import Counter, Histogram
 
 logger = logging.getLogger(__name__)
+
+EMAIL_SEND_DURATION = Histogram(
+    "email_send_duration_seconds", "Time spent sending one email, by backend", ["backend"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0),
+)
+EMAIL_SEND_FAILURES = Counter("email_send_failures_total", "Emails that could not be sent, by backend", ["backend"])
 try:
     from app.config import get_settings
     settings = get_settings()
@@ -43,16 +57,23 @@ except Exception:
 http_basic = HTTPBasic()
 http_bearer = HTTPBearer(auto_error=False)
 
-def get_current_user(credentials: HTTPBasicCredentials = Depends(http_basic)):
-    from app.models.user import SessionLocal, User
-    db = SessionLocal()
-    try:
-        user = db.query(User).filter(User.email == credentials.username).first()
-        if not user or user.password != credentials.password:
-            raise HTTPException(status_code=401, detail="Invalid credentials")
-        return user.email
-    finally:
-        db.close()
+def get_current_user(credentials: HTTPBasicCredentials = Depends(http_basic), db: Session = Depends(get_db)):
+    # Reuses the request's get_db session (FastAPI caches it per request) instead of
+    # checking out a second pooled connection just for authentication
+    from app.models.user import User
+    user = db.query(User).filter(User.email == credentials.username).first()
+    if not user or user.password != credentials.password:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    return user.email
+
+
+async def get_current_user_async(credentials: HTTPBasicCredentials = Depends(http_basic), db: AsyncSession = Depends(get_async_db)) -> str:
+    """Async twin of get_current_user for `async def` endpoints (shares their AsyncSession)."""
+    from app.models.user import User
+    row = (await db.execute(select(User.email, User.password).where(User.email == credentials.username))).first()
+    if not row or row.password != credentials.password:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    return row.email
 
 
 # ===== JWT helpers =====
@@ -65,33 +86,57 @@ def create_access_token(subject: str, expires_delta: Optional[timedelta] = None)
     return token
 
 
-def is_token_blacklisted(jti: str) -> bool:
+def is_token_blacklisted(jti: str, db: Optional[Session] = None) -> bool:
     from app.models.user import SessionLocal, TokenBlacklist
-    db = SessionLocal()
+    own = db is None
+    db = db or SessionLocal()
     try:
-        return db.query(TokenBlacklist).filter(TokenBlacklist.jti == jti).first() is not None
+        return db.query(TokenBlacklist.id).filter(TokenBlacklist.jti == jti).first() is not None
     finally:
-        db.close()
+        if own:
+            db.close()
 
 
-def blacklist_token(jti: str) -> None:
+def blacklist_token(jti: str, db: Optional[Session] = None) -> None:
     from app.models.user import SessionLocal, TokenBlacklist
-    db = SessionLocal()
+    own = db is None
+    db = db or SessionLocal()
     try:
-        if not db.query(TokenBlacklist).filter(TokenBlacklist.jti == jti).first():
+        if not db.query(TokenBlacklist.id).filter(TokenBlacklist.jti == jti).first():
             db.add(TokenBlacklist(jti=jti))
             db.commit()
+    finally:
+        if own:
+            db.close()
+
+
+def purge_stale_otps() -> int:
+    """Delete used and expired password reset codes. Returns the number of rows removed.
+
+    Runs periodically from the app scheduler so the otps table only ever holds live codes.
+    """
+    from sqlalchemy import or_
+    from app.models.user import SessionLocal, OTP
+    db = SessionLocal()
+    try:
+        removed = (
+            db.query(OTP)
+            .filter(or_(OTP.used == True, OTP.expires_at < datetime.utcnow()))  # type: ignore
+            .delete(synchronize_session=False)
+        )
+        db.commit()
+        return removed
     finally:
         db.close()
 
 
-def get_current_user_email(token: HTTPAuthorizationCredentials = Depends(http_bearer)) -> str:
+def get_current_user_email(token: HTTPAuthorizationCredentials = Depends(http_bearer), db: Session = Depends(get_db)) -> str:
     if not token or not token.credentials:
         raise HTTPException(status_code=401, detail="Not authenticated")
     try:
         payload = jwt.decode(token.credentials, SECRET_KEY, algorithms=[ALGORITHM])
         jti = payload.get("jti")
-        if not jti or is_token_blacklisted(jti):
+        if not jti or is_token_blacklisted(jti, db):
             raise HTTPException(status_code=401, detail="Token revoked")
         email = payload.get("sub")
         if not email:
@@ -125,6 +170,7 @@ def send_email(to_email: str, subject: str, body: str):
         _send_email_console(to_email, subject, body)
         return True
 
+    started = time.perf_counter()
     try:
         msg = MIMEText(body)
         msg["Subject"] = subject
@@ -140,9 +186,12 @@ def send_email(to_email: str, subject: str, body: str):
         return True
     except Exception as e:
         # Do not break API flow on email failure
+        EMAIL_SEND_FAILURES.labels(backend="smtp").inc()
         logger.error("Failed to send email via SMTP: %s", e, exc_info=True)
         _send_email_console(to_email, subject, body)
         return False
+    finally:
+        EMAIL_SEND_DURATION.labels(backend="smtp").observe(time.perf_counter() - started)
 
 
 def is_admin_email(email: str) -> bool:
@@ -159,12 +208,12 @@ def is_admin_email(email: str) -> bool:
     return e in ADMIN_EMAIL_SET
 
 
-def get_current_admin_user(credentials: HTTPBasicCredentials = Depends(http_basic)) -> str:
+def get_current_admin_user(credentials: HTTPBasicCredentials = Depends(http_basic), db: Session = Depends(get_db)) -> str:
     """Authenticate via HTTP Basic and enforce admin email membership.
 
     Raises 401 if credentials invalid, 403 if not an admin.
     """
-    email = get_current_user(credentials)  # returns email or raises 401
+    email = get_current_user(credentials, db)  # returns email or raises 401
     if not is_admin_email(email):
         raise HTTPException(status_code=403, detail="Admin access required")
     return email
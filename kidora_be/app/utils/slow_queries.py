@@ -0,0 +1,172 @@
+"""Slow-query recorder.
+
+Statements slower than SLOW_QUERY_MS (measured by the query_stats cursor events) are logged and
+kept in a per-worker ring buffer together with redacted parameters and the calling route. A
+sample of slow SELECTs (SLOW_QUERY_EXPLAIN_SAMPLE_RATE) is re-run under
+EXPLAIN (ANALYZE, BUFFERS) on a separate connection in a background thread, inside a read-only
+transaction, and the JSON plan is attached to the entry. Admins read the buffer through
+/api/admin/diagnostics/slow-queries.
+"""
+import itertools
+import logging
+import random
+import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+from app.config import get_settings
+from app.utils.metrics import Counter
+from app.utils.query_stats import add_query_observer, current_route
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERIES = Counter("db_slow_queries_total", "Statements slower than SLOW_QUERY_MS, by route template", ["route"])
+
+try:
+    settings = get_settings()
+except Exception:
+    settings = None
+
+THRESHOLD_SECONDS = float(getattr(settings, "SLOW_QUERY_MS", 500)) / 1000.0
+EXPLAIN_SAMPLE_RATE = float(getattr(settings, "SLOW_QUERY_EXPLAIN_SAMPLE_RATE", 0.05))
+BUFFER_SIZE = int(getattr(settings, "SLOW_QUERY_BUFFER_SIZE", 200))
+# EXPLAIN ANALYZE re-executes the statement; never let a capture run away
+EXPLAIN_TIMEOUT_MS = 5000
+_MAX_PENDING_EXPLAINS = 2
+_MAX_STATEMENT_CHARS = 4000
+
+_SENSITIVE_PARAM = re.compile(r"pass|code|token|secret|jti|otp|email|phone|number|transaction", re.I)
+# EXPLAIN ANALYZE runs the statement for real: only plain reads without locks or side effects
+_EXPLAINABLE = re.compile(r"^\s*(SELECT|WITH)\b", re.I)
+_NOT_EXPLAINABLE = re.compile(r"\bFOR\s+(UPDATE|SHARE|NO\s+KEY|KEY)\b|\bpg_advisory|\bnextval\s*\(|\bset_config\s*\(", re.I)
+
+_entries: "deque[Dict[str, Any]]" = deque(maxlen=max(BUFFER_SIZE, 1))
+_lock = threading.Lock()
+_ids = itertools.count(1)
+_explain_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-explain")
+_pending_explains = 0
+
+
+def _redact_value(key: Optional[str], value: Any) -> Any:
+    if key is not None and _SENSITIVE_PARAM.search(str(key)):
+        return "[REDACTED]"
+    if value is None or isinstance(value, (bool, int, float, Decimal)):
+        return value if not isinstance(value, Decimal) else str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, str):
+        # Search patterns (ilike '%term%') are the interesting part; long text never is
+        return value if len(value) <= 64 else f"{value[:64]}...({len(value)} chars)"
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"<{len(value)} bytes>"
+    if isinstance(value, (list, tuple)):
+        return [_redact_value(key, v) for v in value[:20]]
+    return f"<{type(value).__name__}>"
+
+
+def redact_parameters(parameters: Any) -> Any:
+    """JSON-safe copy of DBAPI parameters with secrets masked and long values truncated."""
+    if isinstance(parameters, dict):
+        return {k: _redact_value(k, v) for k, v in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            # executemany: the first row is representative
+            return {"rows": len(parameters), "first": redact_parameters(parameters[0])}
+        # Positional parameters carry no names to judge by: mask every string
+        return ["[REDACTED]" if isinstance(v, str) else _redact_value(None, v) for v in parameters]
+    return None
+
+
+def _explain_engine(conn):
+    # Async engines can't be driven from a plain thread; fall back to the sync primary
+    engine = conn.engine
+    if getattr(engine.dialect, "is_async", False):
+        from app.models.user import engine as primary_engine
+        return primary_engine
+    return engine
+
+
+def _capture_plan(entry: Dict[str, Any], engine, statement: str, parameters: Any) -> None:
+    global _pending_explains
+    try:
+        with engine.connect() as conn:
+            conn = conn.execution_options(skip_query_stats=True)
+            conn.exec_driver_sql("SET TRANSACTION READ ONLY")
+            conn.exec_driver_sql(f"SET LOCAL statement_timeout = {EXPLAIN_TIMEOUT_MS}")
+            plan = conn.exec_driver_sql(
+                "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement, parameters
+            ).scalar()
+            conn.rollback()
+        entry["plan"] = plan
+    except Exception as e:
+        entry["planError"] = str(e).splitlines()[0][:300]
+    finally:
+        with _lock:
+            _pending_explains -= 1
+
+
+def _maybe_schedule_explain(entry: Dict[str, Any], conn, statement: str, parameters: Any) -> None:
+    global _pending_explains
+    if EXPLAIN_SAMPLE_RATE <= 0 or random.random() >= EXPLAIN_SAMPLE_RATE:
+        return
+    if conn.dialect.name != "postgresql" or not isinstance(parameters, (dict, tuple)):
+        return
+    if not _EXPLAINABLE.match(statement) or _NOT_EXPLAINABLE.search(statement):
+        return
+    with _lock:
+        if _pending_explains >= _MAX_PENDING_EXPLAINS:
+            return
+        _pending_explains += 1
+    entry["plan"] = "pending"
+    _explain_pool.submit(_capture_plan, entry, _explain_engine(conn), statement, parameters)
+
+
+def record_query(statement: str, parameters: Any, elapsed: float, conn) -> None:
+    """query_stats observer: keep statements slower than the threshold."""
+    if THRESHOLD_SECONDS <= 0 or elapsed < THRESHOLD_SECONDS:
+        return
+    route = current_route() or "background"
+    entry: Dict[str, Any] = {
+        "id": next(_ids),
+        "at": datetime.utcnow().isoformat() + "Z",
+        "durationMs": round(elapsed * 1000, 1),
+        "route": route,
+        "database": conn.engine.url.database,
+        "statement": " ".join(statement.split())[:_MAX_STATEMENT_CHARS],
+        "parameters": redact_parameters(parameters),
+        "plan": None,
+    }
+    SLOW_QUERIES.labels(route=route).inc()
+    logger.warning("slow_query route=%s duration_ms=%.1f statement=%s", route, elapsed * 1000, entry["statement"][:300])
+    with _lock:
+        _entries.append(entry)
+    _maybe_schedule_explain(entry, conn, statement, parameters)
+
+
+def recent_slow_queries(limit: int = 50) -> List[Dict[str, Any]]:
+    """Newest first."""
+    with _lock:
+        items = list(_entries)
+    return [dict(e) for e in reversed(items[-limit:])] if limit > 0 else []
+
+
+def clear_slow_queries() -> int:
+    with _lock:
+        n = len(_entries)
+        _entries.clear()
+    return n
+
+
+def slow_query_config() -> Dict[str, Any]:
+    return {
+        "thresholdMs": THRESHOLD_SECONDS * 1000,
+        "explainSampleRate": EXPLAIN_SAMPLE_RATE,
+        "bufferSize": _entries.maxlen,
+    }
+
+
+add_query_observer(record_query)
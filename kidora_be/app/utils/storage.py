@@ -1,127 +1,454 @@
 from pathlib import Path
+import hashlib
+import logging
 import os
-import uuid
-import shutil
-from typing import List, Optional
-from fastapi import UploadFile
+import tempfile
+import threading
+from collections import Counter as _Tally
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from fastapi import HTTPException, UploadFile
+from sqlalchemy import func, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
 from urllib.parse import urlparse
-from urllib.request import urlopen
+
+import httpx
+
+from app.config import get_settings
+from app.models.media import MediaObject
+from app.utils import media_variants
+from app.utils.storage_backends import get_backend
+from app.utils.metrics import Counter
+
+MEDIA_BYTES = Counter("media_upload_bytes_total", "Bytes written to media storage, by subdir and source", ["subdir", "source"])
+MEDIA_FILES = Counter("media_uploads_total", "Files written to media storage, by subdir and source", ["subdir", "source"])
+MEDIA_REJECTED = Counter("media_uploads_rejected_total", "Uploads refused before storing, by reason", ["reason"])
+MEDIA_DEDUPED = Counter("media_uploads_deduplicated_total", "Stored files whose content was already on disk", ["subdir"])
+MEDIA_PURGED = Counter("media_files_purged_total", "Files removed after their last reference was released")
+
+logger = logging.getLogger(__name__)
 
 BASE_DIR = Path(__file__).resolve().parents[2]
 MEDIA_ROOT = BASE_DIR / "media"
 
-def _ensure_dir(path: Path) -> None:
-    path.mkdir(parents=True, exist_ok=True)
+try:
+    settings = get_settings()
+except Exception:
+    settings = None
 
-def save_upload_file(upload_file: UploadFile, subdir: str = "products") -> str:
-    """Save a single UploadFile to media/subdir and return its URL path (/media/subdir/filename)."""
+# Uploads are copied in chunks of this size: memory stays flat however large the file is
+CHUNK_SIZE = 1024 * 1024
+# Remote image imports: per-request timeout and downloads in flight per worker
+FETCH_TIMEOUT_SECONDS = float(getattr(settings, "MEDIA_FETCH_TIMEOUT_SECONDS", 15))
+FETCH_CONCURRENCY = max(1, int(getattr(settings, "MEDIA_FETCH_CONCURRENCY", 8)))
+# Per-kind caps; anything larger is refused as soon as the limit is crossed (or up front when the size is declared)
+SIZE_LIMITS = {
+    "image": int(float(getattr(settings, "MEDIA_MAX_IMAGE_MB", 20)) * 1024 * 1024),
+    "video": int(float(getattr(settings, "MEDIA_MAX_VIDEO_MB", 200)) * 1024 * 1024),
+}
+_SNIFF_BYTES = 32
+
+
+class StoredMedia(NamedTuple):
+    url: str
+    sha256: str
+    size: int
+    content_type: str
+
+
+def media_key(rel_url: Optional[str]) -> Optional[str]:
+    """Backend key ("<subdir>/<file>") of a stored /media URL; None for anything else."""
+    if not rel_url or not isinstance(rel_url, str) or not rel_url.startswith('/media/'):
+        return None
+    parts = rel_url.strip('/').split('/')  # [media, subdir, filename]
+    if len(parts) < 3 or any(p in ('', '.', '..') for p in parts):
+        return None
+    return '/'.join(parts[1:])
+
+
+def sniff_content_type(head: bytes) -> Optional[Tuple[str, str]]:
+    """(content type, extension) from the file's magic bytes; None for anything we don't store.
+
+    The client's filename and Content-Type are never trusted for this.
+    """
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg", ".jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png", ".png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif", ".gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp", ".webp"
+    if head.startswith(b"BM"):
+        return "image/bmp", ".bmp"
+    if head[4:8] == b"ftyp":
+        brand = head[8:12]
+        if brand in (b"avif", b"avis"):
+            return "image/avif", ".avif"
+        if brand in (b"heic", b"heix", b"mif1", b"msf1"):
+            return "image/heic", ".heic"
+        if brand == b"qt  ":
+            return "video/quicktime", ".mov"
+        return "video/mp4", ".mp4"
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        return "video/webm", ".webm"
+    return None
+
+
+def size_limit(content_type: str) -> int:
+    return SIZE_LIMITS.get(content_type.split("/")[0], SIZE_LIMITS["image"])
+
+
+def _too_large(limit: int) -> HTTPException:
+    MEDIA_REJECTED.labels(reason="too_large").inc()
+    return HTTPException(status_code=413, detail=f"File too large (max {limit / (1024 * 1024):g} MB)")
+
+
+def _file_chunks(fileobj) -> Iterator[bytes]:
+    return iter(lambda: fileobj.read(CHUNK_SIZE), b"")
+
+
+def _with_head(head: bytes, rest: Iterator[bytes]) -> Iterator[bytes]:
+    if head:
+        yield head
+    for chunk in rest:
+        if chunk:
+            yield chunk
+
+
+# ---- reference counts -------------------------------------------------------------------
+
+def acquire_media(db: Session, url: str, sha256: Optional[str] = None, size: Optional[int] = None,
+                  content_type: Optional[str] = None) -> None:
+    """Count one more reference to `url` in the caller's transaction (creating its row if needed)."""
+    now = datetime.utcnow()
+    stmt = insert(MediaObject).values(
+        url=url, sha256=sha256, size=size, content_type=content_type, ref_count=1, created_at=now, updated_at=now,
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[MediaObject.url],
+        set_={
+            "ref_count": MediaObject.ref_count + 1,
+            "sha256": func.coalesce(MediaObject.sha256, stmt.excluded.sha256),
+            "updated_at": now,
+        },
+    ))
+
+
+def release_media(db: Session, urls: Iterable[Optional[str]]) -> List[str]:
+    """Drop one reference per occurrence in `urls` (caller's transaction); returns the URLs touched.
+
+    Files are not removed here: call purge_unreferenced() with the result after committing.
+    """
+    tally = _Tally(u for u in urls if isinstance(u, str) and u.startswith("/media/"))
+    for url, n in tally.items():
+        db.execute(
+            update(MediaObject)
+            .where(MediaObject.url == url)
+            .values(ref_count=func.greatest(MediaObject.ref_count - n, 0), updated_at=datetime.utcnow())
+        )
+    return list(tally)
+
+
+def purge_unreferenced(urls: Iterable[str]) -> int:
+    """Delete the rows and files among `urls` that no longer have any reference; returns files removed.
+
+    Runs in its own transaction. The row lock taken by the DELETE makes a concurrent
+    acquire_media() of the same URL wait until the file is gone, so it recreates the file
+    instead of pointing at one that is about to disappear. URLs without a row (never
+    tracked) are left alone. Rows are only deleted once their files are: if the backend fails
+    the transaction rolls back, and rows left at zero are retried the next time their URL is
+    released. Failures are logged, not raised: the caller's change is already committed.
+    """
+    from app.models.user import SessionLocal
+
+    urls = list(urls)
+    if not urls:
+        return 0
+    db = SessionLocal()
+    try:
+        gone = db.execute(
+            MediaObject.__table__.delete()
+            .where(MediaObject.url.in_(urls), MediaObject.ref_count <= 0)
+            .returning(MediaObject.url)
+        ).scalars().all()
+        removed = delete_media_files(gone)
+        for url in gone:
+            media_variants.delete_variants(url)
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.warning("Media purge failed for %d url(s)", len(urls), exc_info=True)
+        return 0
+    finally:
+        db.close()
+    MEDIA_PURGED.inc(removed)
+    return removed
+
+
+# ---- writing -----------------------------------------------------------------------------
+
+class _Staged(NamedTuple):
+    """A fully written and hashed temp file, not yet visible under its final name."""
+    tmp_name: str
+    subdir: str
+    source: str
+    media: StoredMedia
+
+
+def _discard(staged: _Staged) -> None:
+    try:
+        os.unlink(staged.tmp_name)
+    except OSError:
+        pass
+
+
+def _stage_stream(chunks: Iterable[bytes], subdir: str, source: str, declared_size: Optional[int] = None) -> _Staged:
+    dst_dir = get_backend().staging_dir(subdir)
+    chunks = iter(chunks)
+    head = b""
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= _SNIFF_BYTES:
+            break
+    sniffed = sniff_content_type(head)
+    if sniffed is None:
+        MEDIA_REJECTED.labels(reason="unsupported_type").inc()
+        raise HTTPException(status_code=415, detail="Unsupported media type")
+    content_type, ext = sniffed
+    limit = size_limit(content_type)
+    if declared_size is not None and declared_size > limit:
+        raise _too_large(limit)
+
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_name = tempfile.mkstemp(dir=dst_dir, prefix=".incoming-", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for chunk in _with_head(head, chunks):
+                size += len(chunk)
+                if size > limit:
+                    raise _too_large(limit)
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+        raise
+    sha256 = digest.hexdigest()
+    url = f"/media/{subdir}/{sha256}{ext}"
+    return _Staged(tmp_name, subdir, source, StoredMedia(url, sha256, size, content_type))
+
+
+def _place(staged: _Staged, db: Optional[Session] = None) -> StoredMedia:
+    media = staged.media
+    try:
+        if db is not None:
+            # Count the reference first: it waits out a purge of the same URL in progress
+            acquire_media(db, media.url, media.sha256, media.size, media.content_type)
+        backend = get_backend()
+        key = media_key(media.url)
+        if backend.exists(key):
+            os.unlink(staged.tmp_name)
+            MEDIA_DEDUPED.labels(subdir=staged.subdir).inc()
+        else:
+            backend.put_file(key, staged.tmp_name, media.content_type)
+            MEDIA_FILES.labels(subdir=staged.subdir, source=staged.source).inc()
+            MEDIA_BYTES.labels(subdir=staged.subdir, source=staged.source).inc(media.size)
+    except BaseException:
+        _discard(staged)
+        raise
+    media_variants.schedule(media.url, media.content_type)
+    return media
+
+
+def store_stream(chunks: Iterable[bytes], subdir: str, source: str, declared_size: Optional[int] = None,
+                 db: Optional[Session] = None) -> StoredMedia:
+    """Stream chunks into media/subdir: sniff the type, enforce its size cap and hash while writing.
+
+    Data goes to a temp file in the destination directory and is renamed into place only when
+    complete, so readers never see a partial file. Raises 415 for unrecognised content and 413
+    as soon as the stream (or `declared_size`) exceeds the cap for its type.
+
+    Files are named by content (<sha256><ext>), so the same bytes stored twice in a subdir
+    share one file and one URL. With `db`, the reference is counted in the caller's transaction.
+    """
+    return _place(_stage_stream(chunks, subdir, source, declared_size), db)
+
+
+def store_upload_file(upload_file: UploadFile, subdir: str = "products", db: Optional[Session] = None) -> StoredMedia:
     if not upload_file or not upload_file.filename:
         raise ValueError("No file provided")
-    ext = os.path.splitext(upload_file.filename)[1].lower()
-    filename = f"{uuid.uuid4().hex}{ext}"
-    dst_dir = MEDIA_ROOT / subdir
-    _ensure_dir(dst_dir)
-    file_path = dst_dir / filename
-    with file_path.open("wb") as buffer:
-        shutil.copyfileobj(upload_file.file, buffer)
-    return f"/media/{subdir}/{filename}"
-
-def save_multiple_upload_files(files: List[UploadFile], subdir: str = "products") -> List[str]:
+    declared = getattr(upload_file, "size", None)
+    if declared is not None and declared > max(SIZE_LIMITS.values()):
+        # Refuse before touching the body at all
+        raise _too_large(max(SIZE_LIMITS.values()))
+    upload_file.file.seek(0)
+    return store_stream(_file_chunks(upload_file.file), subdir, "upload", declared, db=db)
+
+
+def save_upload_file(upload_file: UploadFile, subdir: str = "products", db: Optional[Session] = None) -> str:
+    """Save a single UploadFile to media/subdir and return its URL path (/media/subdir/filename)."""
+    return store_upload_file(upload_file, subdir, db=db).url
+
+def save_multiple_upload_files(files: List[UploadFile], subdir: str = "products", db: Optional[Session] = None) -> List[str]:
     """Save multiple UploadFiles and return a list of URL paths."""
     urls: List[str] = []
     for f in files or []:
         if f and f.filename:
-            urls.append(save_upload_file(f, subdir=subdir))
+            urls.append(save_upload_file(f, subdir=subdir, db=db))
     return urls
 
-# New: save from local path or URL
+# ---- remote fetching ---------------------------------------------------------------------
+
+_fetch_lock = threading.Lock()
+_fetch_client: Optional[httpx.Client] = None
+_fetch_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _fetcher() -> Tuple[httpx.Client, ThreadPoolExecutor]:
+    """Process-wide pooled HTTP client and download pool, created on first use.
+
+    The pool bounds concurrent downloads across all requests of this worker, and the client's
+    connection limit matches it, so keep-alive connections to the same host are reused.
+    """
+    global _fetch_client, _fetch_pool
+    with _fetch_lock:
+        if _fetch_client is None:
+            _fetch_client = httpx.Client(
+                timeout=httpx.Timeout(FETCH_TIMEOUT_SECONDS, connect=min(FETCH_TIMEOUT_SECONDS, 5.0)),
+                limits=httpx.Limits(max_connections=FETCH_CONCURRENCY, max_keepalive_connections=FETCH_CONCURRENCY),
+                follow_redirects=True,
+                headers={"User-Agent": "kidora-media-fetcher"},
+            )
+            _fetch_pool = ThreadPoolExecutor(max_workers=FETCH_CONCURRENCY, thread_name_prefix="media-fetch")
+        return _fetch_client, _fetch_pool
+
+
+def _stage_remote(src: str, subdir: str) -> _Staged:
+    client, _ = _fetcher()
+    try:
+        with client.stream("GET", src) as resp:
+            resp.raise_for_status()
+            length = resp.headers.get("Content-Length")
+            declared = int(length) if length and length.isdigit() else None
+            return _stage_stream(resp.iter_bytes(CHUNK_SIZE), subdir, "remote", declared)
+    except httpx.HTTPStatusError as exc:
+        MEDIA_REJECTED.labels(reason="fetch_failed").inc()
+        raise HTTPException(status_code=400, detail=f"Could not fetch {src} (HTTP {exc.response.status_code})") from exc
+    except httpx.HTTPError as exc:
+        MEDIA_REJECTED.labels(reason="fetch_failed").inc()
+        raise HTTPException(status_code=400, detail=f"Could not fetch {src} ({type(exc).__name__})") from exc
+
+
+def _stage_source(src: str, subdir: str):
+    """A _Staged temp file for `src`, or the URL itself when it is already stored media."""
+    parsed = urlparse(src)
+    if parsed.scheme in ("http", "https"):
+        return _stage_remote(src, subdir)
+
+    if not parsed.scheme and src.startswith('/media/'):
+        key = media_key(src)
+        if key is not None and get_backend().exists(key):
+            return src
 
-def _pick_ext_from_content_type(ct: Optional[str]) -> str:
-    mapping = {
-        "image/jpeg": ".jpg",
-        "image/png": ".png",
-        "image/gif": ".gif",
-        "image/webp": ".webp",
-        "image/bmp": ".bmp",
-    }
-    return mapping.get((ct or "").split(";")[0].strip(), ".bin")
+    # file:// URL or a local filesystem path (Windows paths supported)
+    local_path = Path(parsed.path) if parsed.scheme == "file" else Path(src)
+    if not local_path.exists():
+        raise FileNotFoundError(f"Source not found: {src}")
+    with local_path.open("rb") as f:
+        return _stage_stream(_file_chunks(f), subdir, "local", local_path.stat().st_size)
 
-def save_from_path_or_url(src: str, subdir: str = "products") -> str:
-    """Copy a file from a local path or download from HTTP(S)/file URL, save under media/subdir, return /media URL."""
+
+def _finish(staged, db: Optional[Session]) -> str:
+    if isinstance(staged, str):
+        if db is not None:
+            acquire_media(db, staged)
+        media_variants.schedule(staged)
+        return staged
+    return _place(staged, db).url
+
+
+def save_from_path_or_url(src: str, subdir: str = "products", db: Optional[Session] = None) -> str:
+    """Copy a file from a local path or download from HTTP(S)/file URL, save under media/subdir, return /media URL.
+
+    A /media URL that is already stored is kept as is (one more reference with `db`), not copied.
+    """
     if not src:
         raise ValueError("Empty source")
+    return _finish(_stage_source(src, subdir), db)
 
-    parsed = urlparse(src)
-    dst_dir = MEDIA_ROOT / subdir
-    _ensure_dir(dst_dir)
 
-    # Determine extension
-    ext = os.path.splitext(parsed.path if parsed.path else src)[1]
+def save_multiple_from_paths_or_urls(sources: List[str], subdir: str = "products", db: Optional[Session] = None) -> List[str]:
+    """Like save_from_path_or_url for each source, with remote downloads running concurrently.
 
-    filename = f"{uuid.uuid4().hex}{ext or ''}"
-    file_path = dst_dir / filename
+    Downloads go through the shared fetch pool and are staged as temp files; the files are
+    moved into place and referenced (in the caller's thread, which owns `db`) only after
+    every source succeeded, in input order. On any failure all staged files are discarded
+    and the first error is raised.
+    """
+    sources = [s for s in (sources or []) if s]
+    remote = [s for s in sources if urlparse(s).scheme in ("http", "https")]
+    futures = {}
+    if len(remote) > 1:
+        _, pool = _fetcher()
+        futures = {i: pool.submit(_stage_source, s, subdir) for i, s in enumerate(sources) if s in remote}
 
-    if parsed.scheme in ("http", "https"):
-        with urlopen(src) as resp, file_path.open("wb") as out:
-            data = resp.read()
-            out.write(data)
-        # If no extension, try to use content-type header
-        if not ext:
-            ct = resp.headers.get("Content-Type") if 'resp' in locals() else None
-            if ct:
-                new_path = file_path.with_suffix(_pick_ext_from_content_type(ct))
-                file_path.rename(new_path)
-                file_path = new_path
-    elif parsed.scheme == "file":
-        local_path = Path(parsed.path)
-        shutil.copyfile(local_path, file_path)
-    else:
-        # Treat as local filesystem path (Windows paths supported)
-        local_path = Path(src)
-        if not local_path.exists():
-            raise FileNotFoundError(f"Source not found: {src}")
-        shutil.copyfile(local_path, file_path)
-
-    rel_url = f"/media/{subdir}/{file_path.name}"
-    return rel_url
-
-
-def save_multiple_from_paths_or_urls(sources: List[str], subdir: str = "products") -> List[str]:
-    return [save_from_path_or_url(s, subdir=subdir) for s in (sources or []) if s]
+    staged: List[Any] = []
+    error: Optional[BaseException] = None
+    for i, src in enumerate(sources):
+        try:
+            staged.append(futures[i].result() if i in futures else _stage_source(src, subdir))
+        except BaseException as exc:
+            error = error or exc
+            if not futures:
+                break
+    if error is not None:
+        for item in staged:
+            if isinstance(item, _Staged):
+                _discard(item)
+        raise error
+
+    urls: List[str] = []
+    try:
+        for item in staged:
+            urls.append(_finish(item, db))
+    except BaseException:
+        for item in staged[len(urls) + 1:]:
+            if isinstance(item, _Staged):
+                _discard(item)
+        raise
+    return urls
 
 
 def delete_media_file(rel_url: Optional[str]) -> bool:
     """Delete a single media file by its stored relative URL (e.g. /media/products/<file>). Returns True if removed.
 
     Safety rules:
-    - Only operates inside MEDIA_ROOT
+    - Only operates on keys of the media backend (no path traversal)
     - Ignores None/empty or non /media/ prefixed inputs
     - Silently ignores if file missing
     """
-    if not rel_url or not isinstance(rel_url, str):
-        return False
-    if not rel_url.startswith('/media/'):
+    key = media_key(rel_url)
+    if key is None:
         return False
     try:
-        # rel_url: /media/<subdir>/<filename>
-        parts = rel_url.strip('/').split('/')  # [media, subdir, filename]
-        if len(parts) < 3:
-            return False
-        target_path = MEDIA_ROOT / '/'.join(parts[1:])  # skip leading 'media'
-        if target_path.is_file():
-            target_path.unlink()
-            return True
+        return get_backend().delete(key)
     except Exception:
         return False
-    return False
 
 
 def delete_media_files(urls: Optional[List[str]]) -> int:
-    """Delete multiple media files; returns count of successfully removed files."""
-    if not urls:
+    """Delete multiple media files (one batch call on S3); returns count of removed files.
+
+    Missing files are skipped; raises when the backend could not delete some of them, so a
+    caller tracking references can keep its rows and retry.
+    """
+    keys = [k for k in (media_key(u) for u in urls or []) if k is not None]
+    if not keys:
         return 0
-    removed = 0
-    for u in urls:
-        if delete_media_file(u):
-            removed += 1
-    return removed
+    return get_backend().delete_many(keys)
@@ -0,0 +1,384 @@
+"""Where media bytes live: the local media/ directory or an S3-compatible bucket.
+
+Objects are addressed by key, the part of the /media URL after "/media/" (for example
+"products/<sha256>.jpg"), so stored URLs, reference counts and the /media routes stay the same
+whichever backend is in use. MEDIA_STORAGE_BACKEND picks one:
+
+- local (default): files under MEDIA_ROOT. Uploads are staged in the destination directory
+  and renamed into place.
+- s3: MEDIA_S3_BUCKET on AWS or any S3-compatible server (MEDIA_S3_ENDPOINT_URL), via boto3;
+  credentials come from the usual AWS_* variables or instance profile. Staged uploads are sent
+  from disk in MEDIA_S3_PART_MB parts (multipart above one part, never read into memory), and
+  batch deletes use DeleteObjects, 1000 keys per call. With MEDIA_S3_PUBLIC_URL (a CDN or
+  public bucket URL) /media requests redirect there; otherwise the API streams objects.
+
+For development and tests, MinIO is a drop-in S3 stand-in:
+
+    docker run -d -p 9000:9000 -e MINIO_ROOT_USER=minio -e MINIO_ROOT_PASSWORD=minio123 \\
+        minio/minio server /data
+    MEDIA_STORAGE_BACKEND=s3 MEDIA_S3_ENDPOINT_URL=http://localhost:9000 MEDIA_S3_BUCKET=kidora-media \\
+        AWS_ACCESS_KEY_ID=minio AWS_SECRET_ACCESS_KEY=minio123 uvicorn app.main:app
+
+(the bucket is created on first use when MEDIA_S3_CREATE_BUCKET=1). `python -m scripts.s3_smoke`
+checks a bucket end to end (MinIO via the same variables, or `--moto` for an in-process
+stand-in without a server).
+"""
+import os
+import shutil
+import stat
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.config import Config as BotoConfig
+    from botocore.exceptions import ClientError
+except ImportError:  # pragma: no cover - optional backend
+    boto3 = None
+
+from app.config import get_settings
+
+try:
+    settings = get_settings()
+except Exception:
+    settings = None
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+_DELETE_BATCH = 1000
+
+
+class StorageError(RuntimeError):
+    """A backend operation failed for some of its keys."""
+
+
+class ObjectInfo(NamedTuple):
+    size: int
+    mtime: float
+    etag: Optional[str]  # quoted, as sent by the backend (None for local files)
+
+
+def _chunks(body, size: int = 64 * 1024) -> Iterator[bytes]:
+    """Iterate a botocore body; closing the generator releases the connection."""
+    try:
+        yield from body.iter_chunks(size)
+    finally:
+        body.close()
+
+
+class StorageBackend(ABC):
+    """Operations storage, the variant pipeline and the media server need from a backend."""
+
+    name = "base"
+    is_local = False
+
+    def local_path(self, key: str) -> Optional[Path]:
+        """Filesystem path of the object when the backend is a local directory."""
+        return None
+
+    @abstractmethod
+    def staging_dir(self, subdir: str) -> Path:
+        """Directory for temp files that put_file() will consume."""
+
+    @abstractmethod
+    def put_file(self, key: str, path: str, content_type: Optional[str] = None) -> None:
+        """Store the complete file at `path` under `key`; the file is consumed (moved or removed)."""
+
+    @abstractmethod
+    def stat(self, key: str) -> Optional[ObjectInfo]:
+        """Size, mtime and ETag of the object; None when missing."""
+
+    def exists(self, key: str) -> bool:
+        return self.stat(key) is not None
+
+    @abstractmethod
+    def read_bytes(self, key: str) -> Optional[bytes]:
+        """Whole object (small ones only, e.g. manifests); None when missing."""
+
+    @abstractmethod
+    def download(self, key: str, dst: str) -> None:
+        """Copy the object to the local file `dst`."""
+
+    @abstractmethod
+    def open_range(self, key: str, byte_range: Optional[str] = None) -> Tuple[Iterator[bytes], int, Optional[str]]:
+        """(chunks, content length, Content-Range or None) for a streamed read of the object or
+        of one `bytes=start-end` range; raises ValueError when the range is unsatisfiable."""
+
+    @abstractmethod
+    def list(self, prefix: str) -> List[str]:
+        """Keys starting with `prefix`."""
+
+    def delete(self, key: str) -> bool:
+        return self.delete_many([key]) == 1
+
+    @abstractmethod
+    def delete_many(self, keys: Iterable[str]) -> int:
+        """Delete `keys` (missing ones are not an error); raises StorageError if any could not be deleted."""
+
+    def public_url(self, key: str) -> Optional[str]:
+        """Absolute URL clients may fetch directly instead of going through /media."""
+        return None
+
+
+def _byte_range(header: str, size: int) -> Tuple[int, int]:
+    """(first, last) byte of a single `bytes=` range against an object of `size` bytes."""
+    unit, _, spec = header.partition("=")
+    start, sep, end = spec.strip().partition("-")
+    if unit.strip().lower() != "bytes" or not sep or "," in spec:
+        raise ValueError(f"Unsupported range {header!r}")
+    if start:
+        first, last = int(start), (int(end) if end else size - 1)
+    else:
+        first, last = size - int(end), size - 1  # suffix range: the last N bytes
+    first, last = max(0, first), min(last, size - 1)
+    if first > last:
+        raise ValueError(f"Unsatisfiable range {header!r} for {size} bytes")
+    return first, last
+
+
+def _read_file(path: Path, first: int, length: int, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(first)
+        while length > 0:
+            chunk = f.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+class LocalBackend(StorageBackend):
+    name = "local"
+    is_local = True
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def local_path(self, key: str) -> Optional[Path]:
+        return self.root / key
+
+    def staging_dir(self, subdir: str) -> Path:
+        # Same filesystem as the destination, so put_file() is an atomic rename
+        path = self.root / subdir
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def put_file(self, key: str, path: str, content_type: Optional[str] = None) -> None:
+        target = self.root / key
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(path, target)
+
+    def stat(self, key: str) -> Optional[ObjectInfo]:
+        try:
+            st = (self.root / key).stat()
+        except OSError:
+            return None
+        return ObjectInfo(st.st_size, st.st_mtime, None) if stat.S_ISREG(st.st_mode) else None
+
+    def exists(self, key: str) -> bool:
+        return (self.root / key).is_file()
+
+    def read_bytes(self, key: str) -> Optional[bytes]:
+        try:
+            return (self.root / key).read_bytes()
+        except OSError:
+            return None
+
+    def download(self, key: str, dst: str) -> None:
+        shutil.copyfile(self.root / key, dst)
+
+    def open_range(self, key: str, byte_range: Optional[str] = None):
+        # The media server sends local files itself (FileResponse, sendfile); this serves scripts
+        path = self.root / key
+        size = path.stat().st_size
+        if not byte_range:
+            return _read_file(path, 0, size), size, None
+        first, last = _byte_range(byte_range, size)
+        return _read_file(path, first, last - first + 1), last - first + 1, f"bytes {first}-{last}/{size}"
+
+    def list(self, prefix: str) -> List[str]:
+        directory, _, name_prefix = prefix.rpartition("/")
+        base = self.root / directory
+        if not base.is_dir():
+            return []
+        return sorted(
+            f"{directory}/{entry.name}" if directory else entry.name
+            for entry in os.scandir(base)
+            if entry.is_file() and entry.name.startswith(name_prefix)
+        )
+
+    def delete_many(self, keys: Iterable[str]) -> int:
+        removed = 0
+        failed = []
+        for key in keys:
+            try:
+                (self.root / key).unlink()
+                removed += 1
+            except FileNotFoundError:
+                pass
+            except OSError:
+                failed.append(key)
+        if failed:
+            raise StorageError(f"Could not delete {len(failed)} file(s), e.g. {failed[0]}")
+        return removed
+
+
+class S3Backend(StorageBackend):
+    name = "s3"
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None, region: Optional[str] = None,
+                 prefix: str = "", public_url: Optional[str] = None, part_mb: int = 8,
+                 max_connections: int = 16, create_bucket: bool = False):
+        if boto3 is None:
+            raise RuntimeError("MEDIA_STORAGE_BACKEND=s3 needs boto3 (pip install boto3)")
+        if not bucket:
+            raise RuntimeError("MEDIA_STORAGE_BACKEND=s3 needs MEDIA_S3_BUCKET")
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.public_base = public_url.rstrip("/") if public_url else None
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url or None,
+            region_name=region or None,
+            config=BotoConfig(max_pool_connections=max_connections, retries={"mode": "standard", "max_attempts": 5}),
+        )
+        part = max(5, part_mb) * 1024 * 1024  # S3 minimum part size is 5 MiB
+        self.transfer = TransferConfig(multipart_threshold=part, multipart_chunksize=part, max_concurrency=4)
+        self._staging = Path(tempfile.gettempdir()) / "kidora-media-staging"
+        if create_bucket:
+            self._ensure_bucket()
+
+    def _ensure_bucket(self) -> None:
+        try:
+            self.client.head_bucket(Bucket=self.bucket)
+        except ClientError:
+            self.client.create_bucket(Bucket=self.bucket)
+
+    def _key(self, key: str) -> str:
+        return self.prefix + key
+
+    @staticmethod
+    def _missing(exc: "ClientError") -> bool:
+        return exc.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+
+    def staging_dir(self, subdir: str) -> Path:
+        path = self._staging / subdir
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def put_file(self, key: str, path: str, content_type: Optional[str] = None) -> None:
+        extra = {"CacheControl": IMMUTABLE}
+        if content_type:
+            extra["ContentType"] = content_type
+        try:
+            self.client.upload_file(path, self.bucket, self._key(key), ExtraArgs=extra, Config=self.transfer)
+        finally:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def stat(self, key: str) -> Optional[ObjectInfo]:
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as exc:
+            if self._missing(exc):
+                return None
+            raise
+        return ObjectInfo(head["ContentLength"], head["LastModified"].timestamp(), head.get("ETag"))
+
+    def read_bytes(self, key: str) -> Optional[bytes]:
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self._key(key))["Body"].read()
+        except ClientError as exc:
+            if self._missing(exc):
+                return None
+            raise
+
+    def download(self, key: str, dst: str) -> None:
+        self.client.download_file(self.bucket, self._key(key), dst, Config=self.transfer)
+
+    def open_range(self, key: str, byte_range: Optional[str] = None):
+        kwargs = {"Bucket": self.bucket, "Key": self._key(key)}
+        if byte_range:
+            kwargs["Range"] = byte_range
+        try:
+            obj = self.client.get_object(**kwargs)
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") == "InvalidRange":
+                raise ValueError(f"Unsatisfiable range {byte_range!r}") from exc
+            raise
+        return _chunks(obj["Body"]), obj["ContentLength"], obj.get("ContentRange")
+
+    def list(self, prefix: str) -> List[str]:
+        keys = []
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key(prefix)):
+            keys.extend(item["Key"][len(self.prefix):] for item in page.get("Contents", []))
+        return keys
+
+    def delete_many(self, keys: Iterable[str]) -> int:
+        keys = list(dict.fromkeys(keys))
+        removed = 0
+        errors = []
+        for i in range(0, len(keys), _DELETE_BATCH):
+            batch = keys[i:i + _DELETE_BATCH]
+            result = self.client.delete_objects(
+                Bucket=self.bucket,
+                Delete={"Objects": [{"Key": self._key(k)} for k in batch], "Quiet": True},
+            )
+            # DeleteObjects answers 200 even when individual keys fail
+            errors.extend(result.get("Errors", []))
+            removed += len(batch) - len(result.get("Errors", []))
+        if errors:
+            first = errors[0]
+            raise StorageError(
+                f"Could not delete {len(errors)} object(s), e.g. {first.get('Key')}: {first.get('Code')} {first.get('Message')}"
+            )
+        return removed
+
+    def public_url(self, key: str) -> Optional[str]:
+        return f"{self.public_base}/{self._key(key)}" if self.public_base else None
+
+
+_backend: Optional[StorageBackend] = None
+_backend_lock = threading.Lock()
+
+
+def create_backend(media_root: Path) -> StorageBackend:
+    kind = str(getattr(settings, "MEDIA_STORAGE_BACKEND", "local") or "local").lower()
+    if kind == "local":
+        return LocalBackend(media_root)
+    if kind == "s3":
+        return S3Backend(
+            bucket=getattr(settings, "MEDIA_S3_BUCKET", ""),
+            endpoint_url=getattr(settings, "MEDIA_S3_ENDPOINT_URL", "") or None,
+            region=getattr(settings, "MEDIA_S3_REGION", "") or None,
+            prefix=getattr(settings, "MEDIA_S3_PREFIX", ""),
+            public_url=getattr(settings, "MEDIA_S3_PUBLIC_URL", "") or None,
+            part_mb=int(getattr(settings, "MEDIA_S3_PART_MB", 8)),
+            create_bucket=bool(getattr(settings, "MEDIA_S3_CREATE_BUCKET", False)),
+        )
+    raise RuntimeError(f"Unknown MEDIA_STORAGE_BACKEND {kind!r} (expected local or s3)")
+
+
+def get_backend() -> StorageBackend:
+    """The configured backend, created on first use (per process)."""
+    global _backend
+    if _backend is None:
+        from app.utils.storage import MEDIA_ROOT
+
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend(MEDIA_ROOT)
+    return _backend
+
+
+def set_backend(backend: Optional[StorageBackend]) -> None:
+    """Replace the process-wide backend (scripts, tests); None re-reads the settings."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
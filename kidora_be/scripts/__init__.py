@@ -0,0 +1 @@
+# Benchmark and maintenance scripts (run from kidora_be/, e.g. `python -m scripts.bench_indexes`)
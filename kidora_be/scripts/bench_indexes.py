@@ -0,0 +1,302 @@
+"""Before/after benchmark for the access-path indexes (migration 0003).
+
+Seeds a dedicated Postgres database with a realistic volume, then for every affected endpoint
+runs its SQL under EXPLAIN (ANALYZE, BUFFERS) twice: once with the relevant indexes dropped
+inside a transaction that is rolled back afterwards ("before"), once with them in place
+("after"). Nothing is dropped permanently, but the DROP holds an exclusive lock while a case
+runs, so never point this at a live database.
+
+    python -m scripts.bench_indexes --database-url postgresql://localhost/kidora_bench --seed
+    python -m scripts.bench_indexes --database-url ... --runs 20 --json bench_indexes.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Connection, Engine
+
+SEED_MARKER = "bench%@example.test"
+
+# Base volumes for --scale 1; every table scales linearly
+VOLUMES = {
+    "users": 20_000,
+    "products": 20_000,
+    "orders": 500_000,
+    "carts": 5_000,
+    "return_rate": 0.03,
+    "hero_banners": 20,
+}
+
+CATEGORIES = ["kids", "boys", "girls", "baby", "toys", "shoes", "accessories", "school", "winter", "summer"]
+
+
+def seed(conn: Connection, scale: float) -> None:
+    n_users = int(VOLUMES["users"] * scale)
+    n_products = int(VOLUMES["products"] * scale)
+    n_orders = int(VOLUMES["orders"] * scale)
+    n_carts = min(int(VOLUMES["carts"] * scale), n_users)
+    categories = "ARRAY[" + ",".join(f"'{c}'" for c in CATEGORIES) + "]"
+
+    def step(label: str, sql: str, **params: Any) -> None:
+        t0 = time.perf_counter()
+        rows = conn.execute(text(sql), params).rowcount
+        conn.commit()
+        print(f"  {label:<16} {rows:>10,} rows  {time.perf_counter() - t0:6.1f}s")
+
+    print(f"Seeding (scale {scale}) ...")
+    step("users", """
+        INSERT INTO users (first_name, last_name, email, phone, password, role)
+        SELECT 'Bench', 'User ' || g, 'bench' || g || '@example.test', '0170' || lpad(g::text, 7, '0'), 'bench', 'USER'
+        FROM generate_series(1, :n) g
+        ON CONFLICT (email) DO NOTHING
+    """, n=n_users)
+    # Category skew: low indexes (kids, boys, ...) are far more common
+    step("products", f"""
+        INSERT INTO products (title, description, price, category, stock, rating, discount, main_image, images, sizes_stock, free_shipping)
+        SELECT 'Bench product ' || g,
+               repeat('Soft cotton, machine washable. ', 1 + (g % 20)),
+               round((100 + random() * 4900)::numeric, 2),
+               ({categories})[1 + floor(power(random(), 2) * {len(CATEGORIES)})::int],
+               floor(random() * 200)::int,
+               round((random() * 5)::numeric, 1),
+               (ARRAY[0, 0, 0, 5, 10, 15, 20])[1 + floor(random() * 7)::int],
+               '/media/products/bench-' || g || '.jpg',
+               jsonb_build_array('/media/products/bench-' || g || '-1.jpg', '/media/products/bench-' || g || '-2.jpg'),
+               jsonb_build_object('S', floor(random() * 20)::int, 'M', floor(random() * 20)::int, 'L', floor(random() * 20)::int),
+               random() < 0.2
+        FROM generate_series(1, :n) g
+    """, n=n_products)
+
+    bounds = conn.execute(text(
+        "SELECT (SELECT min(id) FROM users WHERE email LIKE :m), (SELECT count(*) FROM users WHERE email LIKE :m), "
+        "(SELECT min(id) FROM products WHERE title LIKE 'Bench product %'), (SELECT count(*) FROM products WHERE title LIKE 'Bench product %')"
+    ), {"m": SEED_MARKER}).one()
+    u0, nu, p0, np_ = (int(v or 0) for v in bounds)
+
+    # A few heavy buyers (power-law over users), one year of history
+    step("orders", """
+        INSERT INTO orders (user_id, shipping_name, shipping_phone, shipping_street, shipping_city, shipping_state,
+                            shipping_zip_code, shipping_country, payment_method, total_amount, status, payment_status,
+                            created_at, updated_at)
+        SELECT :u0 + floor(power(random(), 3) * :nu)::int, 'Bench User', '01700000000', '1 Test Road', 'Dhaka', 'Dhaka',
+               '1200', 'Bangladesh', 'COD', round((200 + random() * 8000)::numeric, 2),
+               (ARRAY['PENDING','CONFIRMED','PACKED','SHIPPED','DELIVERED','DELIVERED','DELIVERED','CANCELLED'])[1 + floor(random() * 8)::int],
+               (ARRAY['PENDING','PAID','PAID'])[1 + floor(random() * 3)::int],
+               ts, ts
+        FROM (SELECT now() - random() * interval '365 days' AS ts FROM generate_series(1, :n)) s
+    """, u0=u0, nu=nu, n=n_orders)
+    # 1-4 items per order; product popularity is power-law; the last 10% of products are never ordered
+    step("order_items", """
+        INSERT INTO order_items (order_id, product_id, quantity, selected_size, price)
+        SELECT o.id, :p0 + floor(power(random(), 3) * :np * 0.9)::int, 1 + floor(random() * 3)::int,
+               (ARRAY['S','M','L'])[1 + floor(random() * 3)::int], round((100 + random() * 4900)::numeric, 2)
+        FROM orders o
+        JOIN users u ON u.id = o.user_id AND u.email LIKE :m
+        CROSS JOIN LATERAL generate_series(1, 1 + (o.id % 4)) g
+    """, p0=p0, np=np_, m=SEED_MARKER)
+    step("carts", """
+        INSERT INTO carts (user_id, created_at, updated_at)
+        SELECT id, now(), now() FROM users WHERE email LIKE :m ORDER BY id LIMIT :n
+        ON CONFLICT (user_id) DO NOTHING
+    """, m=SEED_MARKER, n=n_carts)
+    step("cart_items", """
+        INSERT INTO cart_items (cart_id, product_id, selected_size, quantity, created_at, updated_at)
+        SELECT c.id, :p0 + ((c.id * 7919 + g * 104729) % floor(:np * 0.9)::int), 'M', 1 + (g % 2), now(), now()
+        FROM carts c JOIN users u ON u.id = c.user_id AND u.email LIKE :m
+        CROSS JOIN generate_series(1, 3) g
+        ON CONFLICT ON CONSTRAINT uq_cart_product_size DO NOTHING
+    """, p0=p0, np=np_, m=SEED_MARKER)
+    step("return_requests", """
+        INSERT INTO return_requests (order_id, user_id, reason, status, created_at, updated_at)
+        SELECT o.id, o.user_id, 'Wrong size', 'PENDING', o.created_at + interval '3 days', o.created_at + interval '3 days'
+        FROM orders o JOIN users u ON u.id = o.user_id AND u.email LIKE :m
+        WHERE o.status = 'DELIVERED' AND random() < :rate
+    """, m=SEED_MARKER, rate=VOLUMES["return_rate"])
+    step("hero_banners", """
+        INSERT INTO hero_banners (title, subtitle, image_url, link_url, created_at, updated_at)
+        SELECT 'Bench banner ' || g, 'Season sale', '/media/banners/bench-' || g || '.jpg', '/sale', now() - g * interval '1 day', now()
+        FROM generate_series(1, :n) g
+    """, n=VOLUMES["hero_banners"])
+    conn.execute(text("ANALYZE"))
+    conn.commit()
+
+
+def _scalar(conn: Connection, sql: str, **params: Any) -> Any:
+    return conn.execute(text(sql), params).scalar()
+
+
+def build_cases(conn: Connection) -> List[Dict[str, Any]]:
+    """One entry per affected endpoint: the SQL it runs and the indexes that serve it."""
+    heavy_user = _scalar(conn, "SELECT u.email FROM users u JOIN orders o ON o.user_id = u.id GROUP BY u.email ORDER BY count(*) DESC LIMIT 1")
+    popular_product = _scalar(conn, "SELECT product_id FROM order_items GROUP BY product_id ORDER BY count(*) DESC LIMIT 1")
+    unreferenced_product = _scalar(conn, """
+        SELECT p.id FROM products p
+        WHERE NOT EXISTS (SELECT 1 FROM order_items oi WHERE oi.product_id = p.id)
+          AND NOT EXISTS (SELECT 1 FROM cart_items ci WHERE ci.product_id = p.id)
+          AND NOT EXISTS (SELECT 1 FROM wishlist_items wi WHERE wi.product_id = p.id)
+        ORDER BY p.id DESC LIMIT 1
+    """)
+    return [
+        {
+            "endpoint": "GET /api/admin/orders/?page=0&size=20",
+            "indexes": ["ix_orders_created_at"],
+            "sql": "SELECT * FROM orders ORDER BY created_at DESC LIMIT 20 OFFSET 0",
+            "params": {},
+        },
+        {
+            "endpoint": "GET /api/orders/ (heaviest buyer)",
+            "indexes": ["ix_orders_user_id_created_at"],
+            "sql": "SELECT orders.* FROM orders JOIN users ON users.id = orders.user_id "
+                   "WHERE users.email = :email ORDER BY orders.created_at DESC",
+            "params": {"email": heavy_user},
+        },
+        {
+            "endpoint": "sales analytics: units sold for a product",
+            "indexes": ["ix_order_items_product_id"],
+            "sql": "SELECT COALESCE(SUM(quantity), 0) FROM order_items WHERE product_id = :pid",
+            "params": {"pid": popular_product},
+        },
+        {
+            "endpoint": "DELETE /api/products/{id} (FK checks on order_items/cart_items)",
+            "indexes": ["ix_order_items_product_id", "ix_cart_items_product_id"],
+            "sql": "DELETE FROM products WHERE id = :pid",
+            "params": {"pid": unreferenced_product},
+        },
+        {
+            "endpoint": "cart lines referencing a product",
+            "indexes": ["ix_cart_items_product_id"],
+            "sql": "SELECT count(*) FROM cart_items WHERE product_id = :pid",
+            "params": {"pid": popular_product},
+        },
+        {
+            "endpoint": "GET /api/admin/returns/",
+            "indexes": ["ix_return_requests_created_at"],
+            "sql": "SELECT * FROM return_requests ORDER BY created_at DESC",
+            "params": {},
+        },
+        {
+            "endpoint": "GET /api/hero-banners/",
+            "indexes": ["ix_hero_banners_created_at"],
+            "sql": "SELECT * FROM hero_banners ORDER BY created_at DESC",
+            "params": {},
+        },
+        {
+            "endpoint": "GET /api/products/low-stock?threshold=10",
+            "indexes": ["ix_products_stock"],
+            "sql": "SELECT * FROM products WHERE stock < :threshold",
+            "params": {"threshold": 10},
+        },
+    ]
+
+
+def _plan_nodes(node: Dict[str, Any]) -> List[str]:
+    label = node.get("Node Type", "?")
+    if node.get("Index Name"):
+        label += f" using {node['Index Name']}"
+    if node.get("Relation Name"):
+        label += f" on {node['Relation Name']}"
+    out = [label]
+    for child in node.get("Plans", []):
+        out.extend(_plan_nodes(child))
+    return out
+
+
+def _measure(conn: Connection, case: Dict[str, Any], runs: int) -> Dict[str, Any]:
+    explain = text("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + case["sql"])
+    timings: List[float] = []
+    wall: List[float] = []
+    plan: Optional[Dict[str, Any]] = None
+    for _ in range(runs):
+        # Savepoint per run so DELETE cases measure the same work every time
+        sp = conn.begin_nested()
+        raw = conn.execute(explain, case["params"]).scalar()
+        sp.rollback()
+        doc = (json.loads(raw) if isinstance(raw, str) else raw)[0]
+        trigger_ms = sum(t.get("Time", 0.0) for t in doc.get("Triggers", []))
+        timings.append(doc["Execution Time"] + trigger_ms)
+        plan = doc
+        if not case["sql"].lstrip().upper().startswith("DELETE"):
+            t0 = time.perf_counter()
+            conn.execute(text(case["sql"]), case["params"]).fetchall()
+            wall.append((time.perf_counter() - t0) * 1000)
+    assert plan is not None
+    timings.sort()
+    return {
+        "medianMs": round(statistics.median(timings), 3),
+        "p95Ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        "wallMedianMs": round(statistics.median(wall), 3) if wall else None,
+        "sharedHitBlocks": plan["Plan"].get("Shared Hit Blocks"),
+        "sharedReadBlocks": plan["Plan"].get("Shared Read Blocks"),
+        "plan": _plan_nodes(plan["Plan"]),
+    }
+
+
+def run_case(engine: Engine, case: Dict[str, Any], runs: int) -> Dict[str, Any]:
+    result: Dict[str, Any] = {"endpoint": case["endpoint"], "indexes": case["indexes"]}
+    with engine.connect() as conn:
+        conn.execute(text("SET statement_timeout = 0"))
+        # before: indexes dropped inside this transaction only
+        for name in case["indexes"]:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        result["before"] = _measure(conn, case, runs)
+        conn.rollback()
+        missing = [n for n in case["indexes"] if not _scalar(conn, "SELECT to_regclass(:n)", n=n)]
+        if missing:
+            raise SystemExit(f"Indexes {missing} are missing; run `python -m app.migrations` first")
+        result["after"] = _measure(conn, case, runs)
+        conn.rollback()
+    return result
+
+
+def report(results: List[Dict[str, Any]]) -> None:
+    print()
+    print(f"{'endpoint':<66} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+    for r in results:
+        b, a = r["before"]["medianMs"], r["after"]["medianMs"]
+        speedup = f"{b / a:.1f}x" if a else "-"
+        print(f"{r['endpoint'][:66]:<66} {b:>10.3f} {a:>10.3f} {speedup:>8}")
+        print(f"    before: {' > '.join(r['before']['plan'][:4])}")
+        print(f"    after:  {' > '.join(r['after']['plan'][:4])}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--database-url", required=True, help="Dedicated benchmark database (never production)")
+    parser.add_argument("--seed", action="store_true", help="Insert benchmark rows first (skipped if already seeded)")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier for the seed volumes")
+    parser.add_argument("--runs", type=int, default=10, help="Measurements per case and variant")
+    parser.add_argument("--json", dest="json_path", help="Also write the full results (with plans) here")
+    args = parser.parse_args(argv)
+
+    # Importing the app needs a DATABASE_URL (normally from .env); the benchmark uses its own engine
+    os.environ.setdefault("DATABASE_URL", args.database_url)
+    from app.migrations.runner import run_migrations
+    from app.models.user import normalize_database_url
+
+    engine = create_engine(normalize_database_url(args.database_url), future=True)
+    run_migrations(engine)
+    with engine.connect() as conn:
+        seeded = _scalar(conn, "SELECT count(*) FROM users WHERE email LIKE :m", m=SEED_MARKER)
+        if args.seed and not seeded:
+            conn.execute(text("SET statement_timeout = 0"))
+            seed(conn, args.scale)
+        elif not seeded:
+            print("Database has no benchmark rows; pass --seed", file=sys.stderr)
+            return 1
+        cases = build_cases(conn)
+
+    results = [run_case(engine, case, max(args.runs, 1)) for case in cases]
+    report(results)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, default=str)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
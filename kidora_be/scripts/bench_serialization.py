@@ -0,0 +1,96 @@
+"""Microbenchmark: serializing a 100-item product page.
+
+Compares FastAPI's default response path (response_model re-validation + jsonable_encoder +
+stdlib json) with FastJSONResponse (orjson) and the model_response() fast path used by the
+catalog endpoints. No database needed; products are synthetic but shaped like real rows.
+
+    python -m scripts.bench_serialization --items 100 --repeat 2000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import Callable, List, Optional
+
+# Importing app.* pulls in the app package, which needs a DATABASE_URL; nothing connects here
+os.environ.setdefault("DATABASE_URL", "postgresql://bench@localhost/bench")
+
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_model_field  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+from starlette.responses import JSONResponse  # noqa: E402
+
+from app.schemas.product import ProductOut  # noqa: E402
+from app.utils.fast_json import FastJSONResponse, model_response, msgpack, orjson  # noqa: E402
+
+
+def make_page(n: int) -> List[ProductOut]:
+    return [
+        ProductOut(
+            id=i,
+            title=f"Cotton kids t-shirt {i}",
+            description="Soft cotton, machine washable. " * 25,
+            price=499.0 + i,
+            category="kids",
+            stock=40 + i % 7,
+            rating=4.5,
+            discount=10,
+            main_image=f"/media/products/{i:032x}.jpg",
+            images=[f"/media/products/{i:032x}-{k}.jpg" for k in range(5)],
+            sizes_stock={"XS": 3, "S": 5, "M": 8, "L": 2, "XL": 0},
+            video="https://www.youtube.com/embed/dQw4w9WgXcQ",
+            free_shipping=i % 3 == 0,
+        )
+        for i in range(n)
+    ]
+
+
+def _request(accept: str = "application/json") -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/api/products/", "headers": [(b"accept", accept.encode())]})
+
+
+def bench(label: str, fn: Callable[[], bytes], repeat: int) -> float:
+    fn()  # warm caches (TypeAdapter, field schemas)
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        body = fn()
+    per_call_us = (time.perf_counter() - t0) / repeat * 1e6
+    print(f"  {label:<44} {per_call_us:9.1f} us/page  {len(body):>8,} bytes")
+    return per_call_us
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    page = make_page(args.items)
+    field = create_model_field(name="Response_get_all_products", type_=List[ProductOut], mode="serialization")
+    loop = asyncio.new_event_loop()
+
+    def fastapi_default() -> bytes:
+        content = loop.run_until_complete(serialize_response(field=field, response_content=page))
+        return JSONResponse(content).body
+
+    def fastapi_orjson() -> bytes:
+        content = loop.run_until_complete(serialize_response(field=field, response_content=page))
+        return FastJSONResponse(content).body
+
+    def fast_path() -> bytes:
+        return model_response(_request(), page, List[ProductOut]).body
+
+    print(f"{args.items}-item product page, {args.repeat} iterations (orjson={'yes' if orjson else 'no'}, msgpack={'yes' if msgpack else 'no'})")
+    baseline = bench("response_model + stdlib json (before)", fastapi_default, args.repeat)
+    bench("response_model + orjson", fastapi_orjson, args.repeat)
+    fast = bench("model_response (single serialization)", fast_path, args.repeat)
+    if msgpack is not None:
+        bench("model_response, Accept: application/msgpack", lambda: model_response(_request("application/msgpack"), page, List[ProductOut]).body, args.repeat)
+    print(f"  speedup of the fast path: {baseline / fast:.1f}x")
+    loop.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
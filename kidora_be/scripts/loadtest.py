@@ -0,0 +1,364 @@
+"""HTTP load test against a running API with seeded data, with baseline regression checks.
+
+Seed a dedicated Postgres database once (same generator as scripts.bench_indexes, plus a few
+"hot" products with effectively unlimited stock that every checkout competes for), start the
+API against it, then drive the scenarios one after another:
+
+    python -m scripts.loadtest seed --database-url postgresql://localhost/kidora_bench --scale 0.1
+    DATABASE_URL=... ADMIN_EMAILS=bench1@example.test uvicorn app.main:app --workers 4
+    python -m scripts.loadtest run --base-url http://127.0.0.1:8000 --admin-email bench1@example.test \\
+        --json loadtest.json
+    python -m scripts.loadtest run ... --baseline loadtest_baseline.json   # exit 1 on regression
+
+Scenarios: catalog (list/cards/search/category counts), product_detail, cart (add/update and
+read), checkout (create_order on the hot products under contention), admin_orders and
+dashboard. Each runs for --duration seconds with --concurrency workers after a short warm-up
+and reports throughput, error rate and p50/p95/p99 latency. Admin scenarios are skipped
+without --admin-email; the account must be listed in the server's ADMIN_EMAILS (bench users
+have the password "bench").
+
+Baselines are machine specific: record one with --json on the same host and settings, keep it
+outside the repo, and compare later runs with --baseline. Checkout writes real orders and
+decrements stock, so never point this at a live database.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from sqlalchemy import create_engine, text
+
+from scripts.bench_indexes import SEED_MARKER, seed
+
+HOT_TITLE = "Bench hot product"
+HOT_STOCK = 1_000_000
+BENCH_PASSWORD = "bench"
+SHIPPING_ADDRESS = {
+    "name": "Bench User",
+    "phone": "01700000000",
+    "street": "1 Test Road",
+    "city": "Dhaka",
+    "state": "Dhaka",
+    "zipCode": "1200",
+    "country": "Bangladesh",
+}
+SEARCH_TERMS = ["product 1", "product 2", "product 37", "product 99", "product 512", "zzz-no-match"]
+
+
+# ---- seeding -----------------------------------------------------------------------------
+
+def seed_database(database_url: str, scale: float, hot_products: int, random_seed: float) -> None:
+    # Importing the app needs a DATABASE_URL (normally from .env); seeding uses its own engine
+    os.environ.setdefault("DATABASE_URL", database_url)
+    from app.migrations.runner import run_migrations
+    from app.models.user import normalize_database_url
+
+    engine = create_engine(normalize_database_url(database_url), future=True)
+    run_migrations(engine)
+    with engine.connect() as conn:
+        conn.execute(text("SET statement_timeout = 0"))
+        seeded = conn.execute(text("SELECT count(*) FROM users WHERE email LIKE :m"), {"m": SEED_MARKER}).scalar()
+        if seeded:
+            print(f"Database already has {seeded:,} benchmark users; only resetting hot products")
+        else:
+            # random() in the generator is repeatable within this session
+            conn.execute(text("SELECT setseed(:s)"), {"s": random_seed})
+            seed(conn, scale)
+        # Hot products: stock never runs out and no per-size stock, so checkout contention is
+        # measured as lock/commit latency rather than as a stream of 400 "insufficient stock"
+        conn.execute(text("""
+            UPDATE products p
+            SET title = :hot || ' ' || h.n, stock = :stock, sizes_stock = NULL
+            FROM (
+                SELECT id, row_number() OVER (ORDER BY id) AS n
+                FROM products WHERE title LIKE 'Bench %product %' ORDER BY id LIMIT :k
+            ) h
+            WHERE p.id = h.id
+        """), {"hot": HOT_TITLE, "stock": HOT_STOCK, "k": hot_products})
+        conn.commit()
+    engine.dispose()
+    print(f"Hot products ready: {hot_products} x stock {HOT_STOCK:,}")
+
+
+# ---- load generation ---------------------------------------------------------------------
+
+class Context:
+    """Ids discovered from the API before the run, shared by all scenarios."""
+
+    def __init__(self, product_ids: List[int], hot_ids: List[int], categories: List[str], users: int,
+                 admin_auth: Optional[httpx.BasicAuth], no_cache: bool):
+        self.product_ids = product_ids
+        self.hot_ids = hot_ids
+        self.categories = categories or [None]
+        self.users = users
+        self.admin_auth = admin_auth
+        self.anon_headers = {"Cache-Control": "no-cache"} if no_cache else {}
+
+    def user_auth(self, worker: int) -> httpx.BasicAuth:
+        return httpx.BasicAuth(f"bench{1 + worker % self.users}@example.test", BENCH_PASSWORD)
+
+    def popular_product(self, rng: random.Random) -> int:
+        # Power-law popularity, like the seeded order history
+        return self.product_ids[int(rng.random() ** 3 * len(self.product_ids))]
+
+
+Scenario = Callable[[httpx.AsyncClient, Context, random.Random, int], Awaitable[httpx.Response]]
+
+
+async def catalog(client: httpx.AsyncClient, ctx: Context, rng: random.Random, worker: int) -> httpx.Response:
+    roll = rng.random()
+    params: Dict[str, Any] = {"page": int(rng.random() ** 2 * 20), "size": 20}
+    if roll < 0.4:
+        path = "/api/products/cards"
+        params["category"] = rng.choice(ctx.categories)
+    elif roll < 0.7:
+        path = "/api/products/"
+    elif roll < 0.95:
+        path = "/api/products/cards"
+        params = {"search": rng.choice(SEARCH_TERMS), "size": 20}
+    else:
+        path, params = "/api/products/category-counts", {}
+    params = {k: v for k, v in params.items() if v is not None}
+    return await client.get(path, params=params, headers=ctx.anon_headers)
+
+
+async def product_detail(client: httpx.AsyncClient, ctx: Context, rng: random.Random, worker: int) -> httpx.Response:
+    return await client.get(f"/api/products/{ctx.popular_product(rng)}", headers=ctx.anon_headers)
+
+
+async def cart(client: httpx.AsyncClient, ctx: Context, rng: random.Random, worker: int) -> httpx.Response:
+    auth = ctx.user_auth(worker)
+    if rng.random() < 0.3:
+        return await client.get("/api/cart/", auth=auth)
+    # Adding an item already in the cart bumps its quantity (the update path)
+    body = {"productId": rng.choice(ctx.hot_ids), "quantity": 1, "selectedSize": None}
+    return await client.post("/api/cart/", json=body, auth=auth)
+
+
+async def checkout(client: httpx.AsyncClient, ctx: Context, rng: random.Random, worker: int) -> httpx.Response:
+    # Every worker orders from the same few hot products, so their rows are contended
+    picks = rng.sample(ctx.hot_ids, k=min(len(ctx.hot_ids), rng.randint(1, 2)))
+    body = {
+        "items": [{"productId": pid, "quantity": 1, "selectedSize": None, "price": 0} for pid in picks],
+        "shippingAddress": SHIPPING_ADDRESS,
+        "paymentMethod": "COD",
+        "totalAmount": 0,
+    }
+    return await client.post("/api/orders/", json=body, auth=ctx.user_auth(worker))
+
+
+async def admin_orders(client: httpx.AsyncClient, ctx: Context, rng: random.Random, worker: int) -> httpx.Response:
+    params = {"page": int(rng.random() ** 2 * 10), "size": 20}
+    return await client.get("/api/admin/orders/", params=params, auth=ctx.admin_auth)
+
+
+async def dashboard(client: httpx.AsyncClient, ctx: Context, rng: random.Random, worker: int) -> httpx.Response:
+    return await client.get("/api/admin/dashboard/overview", auth=ctx.admin_auth)
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "catalog": catalog,
+    "product_detail": product_detail,
+    "cart": cart,
+    "checkout": checkout,
+    "admin_orders": admin_orders,
+    "dashboard": dashboard,
+}
+ADMIN_SCENARIOS = {"admin_orders", "dashboard"}
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(name: str, latencies: List[float], statuses: Counter, elapsed: float) -> Dict[str, Any]:
+    values = sorted(latencies)
+    total = len(values)
+    errors = sum(n for code, n in statuses.items() if not (200 <= code < 400))
+    return {
+        "scenario": name,
+        "requests": total,
+        "errors": errors,
+        "errorRate": round(errors / total, 4) if total else 0.0,
+        "rps": round(total / elapsed, 1) if elapsed else 0.0,
+        "p50Ms": round(percentile(values, 50) * 1000, 2),
+        "p95Ms": round(percentile(values, 95) * 1000, 2),
+        "p99Ms": round(percentile(values, 99) * 1000, 2),
+        "maxMs": round(values[-1] * 1000, 2) if values else 0.0,
+        # Status 0 = transport error (timeout, connection reset)
+        "statuses": {str(code): n for code, n in sorted(statuses.items())},
+    }
+
+
+async def run_scenario(client: httpx.AsyncClient, ctx: Context, name: str, concurrency: int,
+                       duration: float, warmup: float, seed_value: int) -> Dict[str, Any]:
+    scenario = SCENARIOS[name]
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    state = {"record": False}
+
+    async def worker(index: int, deadline: float) -> None:
+        rng = random.Random(f"{seed_value}:{name}:{index}")
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            try:
+                response = await scenario(client, ctx, rng, index)
+                code = response.status_code
+            except httpx.HTTPError:
+                code = 0
+            if state["record"]:
+                latencies.append(time.perf_counter() - t0)
+                statuses[code] += 1
+
+    if warmup > 0:
+        deadline = time.perf_counter() + warmup
+        await asyncio.gather(*(worker(i, deadline) for i in range(concurrency)))
+    state["record"] = True
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i, started + duration) for i in range(concurrency)))
+    return summarize(name, latencies, statuses, time.perf_counter() - started)
+
+
+async def discover(client: httpx.AsyncClient, users: int, admin_auth: Optional[httpx.BasicAuth], no_cache: bool) -> Context:
+    cards = (await client.get("/api/products/cards", params={"size": 500})).json()
+    hot = (await client.get("/api/products/cards", params={"search": HOT_TITLE, "size": 100})).json()
+    categories = (await client.get("/api/products/categories")).json()
+    product_ids = sorted(c["id"] for c in cards)
+    hot_ids = sorted(c["id"] for c in hot)
+    if not product_ids or not hot_ids:
+        raise SystemExit("No seeded products found; run `python -m scripts.loadtest seed` first")
+    return Context(product_ids, hot_ids, categories, users, admin_auth, no_cache)
+
+
+async def run_all(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    admin_auth = httpx.BasicAuth(args.admin_email, args.admin_password) if args.admin_email else None
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    timeout = httpx.Timeout(args.timeout)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=timeout) as client:
+        ctx = await discover(client, args.users, admin_auth, args.no_cache)
+        results = []
+        for name in args.scenarios:
+            if name in ADMIN_SCENARIOS and admin_auth is None:
+                print(f"  {name:<16} skipped (no --admin-email)")
+                continue
+            result = await run_scenario(client, ctx, name, args.concurrency, args.duration, args.warmup, args.seed)
+            print(f"  {name:<16} {result['requests']:>8,} req  {result['rps']:>8.1f} rps  "
+                  f"p50 {result['p50Ms']:>8.2f}  p95 {result['p95Ms']:>8.2f}  p99 {result['p99Ms']:>8.2f} ms  "
+                  f"errors {result['errors']}")
+            results.append(result)
+        return results
+
+
+# ---- baseline comparison -----------------------------------------------------------------
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float,
+            min_delta_ms: float) -> List[str]:
+    """Regressions of `results` against `baseline`: slower tails, lower throughput, more errors."""
+    previous = {b["scenario"]: b for b in baseline}
+    regressions = []
+    print()
+    print(f"{'scenario':<16} {'rps':>18} {'p95 ms':>20} {'p99 ms':>20}")
+    for r in results:
+        b = previous.get(r["scenario"])
+        if b is None:
+            continue
+        print(f"{r['scenario']:<16} {b['rps']:>8.1f} -> {r['rps']:<7.1f} {b['p95Ms']:>9.2f} -> {r['p95Ms']:<8.2f}"
+              f" {b['p99Ms']:>9.2f} -> {r['p99Ms']:<8.2f}")
+        if r["rps"] < b["rps"] * (1 - tolerance):
+            regressions.append(f"{r['scenario']}: throughput {b['rps']} -> {r['rps']} rps")
+        for key in ("p95Ms", "p99Ms"):
+            if r[key] > b[key] * (1 + tolerance) and r[key] - b[key] > min_delta_ms:
+                regressions.append(f"{r['scenario']}: {key[:3]} {b[key]} -> {r[key]} ms")
+        if r["errorRate"] > b["errorRate"] + 0.01:
+            regressions.append(f"{r['scenario']}: error rate {b['errorRate']:.2%} -> {r['errorRate']:.2%}")
+    return regressions
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_seed = sub.add_parser("seed", help="Seed a dedicated benchmark database")
+    p_seed.add_argument("--database-url", required=True, help="Dedicated benchmark database (never production)")
+    p_seed.add_argument("--scale", type=float, default=0.1, help="Multiplier for the bench_indexes seed volumes")
+    p_seed.add_argument("--hot-products", type=int, default=5, help="Products every checkout competes for")
+    p_seed.add_argument("--random-seed", type=float, default=0.42, help="Postgres setseed() value (-1..1)")
+
+    p_run = sub.add_parser("run", help="Drive the scenarios against a running API")
+    p_run.add_argument("--base-url", default="http://127.0.0.1:8000")
+    p_run.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    p_run.add_argument("--duration", type=float, default=20.0, help="Measured seconds per scenario")
+    p_run.add_argument("--warmup", type=float, default=3.0, help="Unmeasured seconds before each scenario")
+    p_run.add_argument("--concurrency", type=int, default=16, help="Concurrent workers (and connections)")
+    p_run.add_argument("--users", type=int, default=200, help="Distinct bench users for cart/checkout")
+    p_run.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    p_run.add_argument("--seed", type=int, default=1, help="Seed for request mix and id choices")
+    p_run.add_argument("--no-cache", action="store_true", help="Send Cache-Control: no-cache to bypass the microcache")
+    p_run.add_argument("--admin-email", help="Admin account for admin_orders/dashboard (in ADMIN_EMAILS)")
+    p_run.add_argument("--admin-password", default=BENCH_PASSWORD)
+    p_run.add_argument("--json", dest="json_path", help="Write results here (usable as a later --baseline)")
+    p_run.add_argument("--baseline", help="Compare with a previous --json result; exit 1 on regression")
+    p_run.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative slowdown (0.15 = 15%%)")
+    p_run.add_argument("--min-delta-ms", type=float, default=2.0, help="Ignore latency changes smaller than this")
+    args = parser.parse_args(argv)
+
+    if args.command == "seed":
+        seed_database(args.database_url, args.scale, args.hot_products, args.random_seed)
+        return 0
+
+    print(f"Load test against {args.base_url}: {args.concurrency} workers, {args.duration:g}s per scenario")
+    results = asyncio.run(run_all(args))
+    if args.json_path:
+        document = {
+            "meta": {
+                "baseUrl": args.base_url,
+                "concurrency": args.concurrency,
+                "duration": args.duration,
+                "noCache": args.no_cache,
+                "gitRevision": _git_revision(),
+                "python": platform.python_version(),
+                "recordedAt": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            },
+            "results": results,
+        }
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        meta = baseline.get("meta", {})
+        if meta.get("concurrency") != args.concurrency or meta.get("noCache", False) != args.no_cache:
+            print("Warning: baseline was recorded with different --concurrency/--no-cache settings", file=sys.stderr)
+        regressions = compare(results, baseline.get("results", []), args.tolerance, args.min_delta_ms)
+        if regressions:
+            print("\nRegressions:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\nNo regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
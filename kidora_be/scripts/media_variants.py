@@ -0,0 +1,69 @@
+"""Generate responsive image variants for media stored before the variant pipeline existed.
+
+Walks <subdir> of the storage backend (media/ or the S3 bucket) and runs the same job the API queues after each upload for every image
+without a manifest, on a local process pool. Safe to re-run: finished images are skipped.
+
+    python -m scripts.media_variants                       # products and banners
+    python -m scripts.media_variants --subdir products --workers 4
+    python -m scripts.media_variants --force               # re-render (e.g. after changing widths)
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Optional
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--subdir", action="append", help="Media subdirectory (repeatable; default products and banners)")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--force", action="store_true", help="Regenerate images that already have a manifest")
+    args = parser.parse_args(argv)
+
+    from app.utils import image_ops, media_variants
+    from app.utils.storage_backends import get_backend
+
+    if not image_ops.AVAILABLE:
+        print("Pillow is not installed; nothing to do", file=sys.stderr)
+        return 1
+    print(f"widths {list(media_variants.WIDTHS)}  formats {list(media_variants.FORMATS)}")
+
+    backend = get_backend()
+    jobs = []
+    for subdir in args.subdir or ["products", "banners"]:
+        keys = backend.list(f"{subdir}/")
+        existing = set(keys)
+        for key in keys:
+            name = key.rpartition("/")[2]
+            if name.startswith(".") or name.count(".") != 1:
+                continue  # temp files, manifests and variants (<stem>.w<width>.<ext>)
+            if not media_variants.processable(name):
+                continue
+            stem = name.split(".", 1)[0]
+            if not args.force and f"{subdir}/{stem}{media_variants.MANIFEST_SUFFIX}" in existing:
+                continue
+            jobs.append((key, stem))
+
+    print(f"{len(jobs)} image(s) to process")
+    started = time.perf_counter()
+    failed = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = {
+            pool.submit(media_variants._job, src, stem, media_variants.WIDTHS, media_variants.FORMATS): src
+            for src, stem in jobs
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                future.result()
+            except Exception as exc:
+                failed += 1
+                print(f"  failed {futures[future]}: {exc}", file=sys.stderr)
+            if done % 50 == 0:
+                print(f"  {done}/{len(jobs)}  {time.perf_counter() - started:.0f}s")
+    print(f"done in {time.perf_counter() - started:.1f}s, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""Smoke test of the S3 media backend against a local S3-compatible stand-in.
+
+Exercises every StorageBackend operation the API uses: put_file (single PUT and multipart),
+stat, exists, read_bytes, open_range (whole object, ranges, unsatisfiable range), download,
+list and a batched delete_many. Everything is written under a unique prefix and removed again.
+
+Against MinIO (see app.utils.storage_backends for the docker command):
+
+    MEDIA_S3_ENDPOINT_URL=http://localhost:9000 MEDIA_S3_BUCKET=kidora-media \\
+        AWS_ACCESS_KEY_ID=minio AWS_SECRET_ACCESS_KEY=minio123 python -m scripts.s3_smoke
+
+In-process, without any server (needs `pip install "moto[server]"`):
+
+    python -m scripts.s3_smoke --moto
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+import uuid
+from typing import List, Optional
+
+
+def _moto_endpoint() -> str:
+    try:
+        from moto.server import ThreadedMotoServer
+    except ImportError:
+        raise SystemExit('--moto needs moto: pip install "moto[server]"')
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)  # one line per request otherwise
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    for name, value in (("AWS_ACCESS_KEY_ID", "testing"), ("AWS_SECRET_ACCESS_KEY", "testing"),
+                        ("AWS_DEFAULT_REGION", "us-east-1")):
+        os.environ.setdefault(name, value)
+    return f"http://{host}:{port}"
+
+
+def _file(data: bytes) -> str:
+    fd, path = tempfile.mkstemp(prefix="s3-smoke-")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    return path
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--moto", action="store_true", help="Run against an in-process moto server")
+    parser.add_argument("--bucket", default=os.getenv("MEDIA_S3_BUCKET") or "kidora-media-smoke")
+    parser.add_argument("--endpoint-url", default=os.getenv("MEDIA_S3_ENDPOINT_URL") or None)
+    parser.add_argument("--objects", type=int, default=1200, help="Objects for the batch delete (>1000 spans two calls)")
+    args = parser.parse_args(argv)
+
+    from app.utils.storage_backends import S3Backend
+
+    endpoint = _moto_endpoint() if args.moto else args.endpoint_url
+    prefix = f"smoke-{uuid.uuid4().hex[:8]}"
+    backend = S3Backend(args.bucket, endpoint_url=endpoint, region=os.getenv("MEDIA_S3_REGION") or None,
+                        prefix=prefix, part_mb=5, create_bucket=True)
+    print(f"bucket {args.bucket} at {endpoint or 'AWS'}, prefix {prefix}/")
+
+    failures = 0
+
+    def check(label: str, ok: bool, detail: object = "") -> None:
+        nonlocal failures
+        failures += 0 if ok else 1
+        print(f"  {'ok  ' if ok else 'FAIL'} {label}{f'  ({detail})' if detail else ''}")
+
+    small = os.urandom(100_000)
+    large = os.urandom(12 * 1024 * 1024)  # three 5 MiB parts
+    started = time.perf_counter()
+    backend.put_file("t/small.bin", _file(small), "application/octet-stream")
+    backend.put_file("t/large.bin", _file(large), "application/octet-stream")
+    check("put_file", True, f"{time.perf_counter() - started:.2f}s")
+
+    info = backend.stat("t/large.bin")
+    check("stat size", info is not None and info.size == len(large), info)
+    check("multipart upload", info is not None and (info.etag or "").rstrip('"').endswith("-3"), info and info.etag)
+    check("exists / missing", backend.exists("t/small.bin") and backend.stat("t/missing.bin") is None)
+    check("read_bytes", backend.read_bytes("t/small.bin") == small and backend.read_bytes("t/missing.bin") is None)
+
+    chunks, length, content_range = backend.open_range("t/small.bin")
+    check("open_range whole", b"".join(chunks) == small and length == len(small) and content_range is None)
+    chunks, length, content_range = backend.open_range("t/large.bin", "bytes=100-199")
+    check("open_range bytes=100-199", b"".join(chunks) == large[100:200] and content_range == f"bytes 100-199/{len(large)}",
+          content_range)
+    try:
+        backend.open_range("t/small.bin", f"bytes={len(small) + 10}-")
+        check("open_range unsatisfiable", False, "no error")
+    except ValueError:
+        check("open_range unsatisfiable", True)
+
+    fd, dst = tempfile.mkstemp(prefix="s3-smoke-")
+    os.close(fd)
+    try:
+        backend.download("t/large.bin", dst)
+        with open(dst, "rb") as f:
+            check("download", f.read() == large)
+    finally:
+        os.unlink(dst)
+
+    keys = [f"t/batch/{i:05d}" for i in range(args.objects)]
+    payload = _file(b"x")
+    for key in keys:
+        with open(payload, "rb") as src:
+            backend.client.put_object(Bucket=backend.bucket, Key=backend._key(key), Body=src)
+    os.unlink(payload)
+    check("list", sorted(backend.list("t/batch/")) == keys, f"{len(keys)} keys")
+    started = time.perf_counter()
+    removed = backend.delete_many(keys + ["t/small.bin", "t/large.bin"])
+    check("delete_many", removed == len(keys) + 2 and backend.list("t/") == [],
+          f"{removed} in {time.perf_counter() - started:.2f}s")
+
+    print("all passed" if not failures else f"{failures} check(s) failed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
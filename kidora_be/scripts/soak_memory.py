@@ -0,0 +1,156 @@
+"""Soak test: drive a steady request mix and report worker memory growth per 10k requests.
+
+Run the API with a single worker so every request lands in the measured process, seed it like
+scripts.loadtest, then:
+
+    python -m scripts.soak_memory --base-url http://127.0.0.1:8000 --pid $(pgrep -f "uvicorn app.main") \\
+        --requests 200000
+    python -m scripts.soak_memory --admin-email bench1@example.test --tracemalloc-diff   # RSS via admin API
+
+Memory is read from /proc/<pid>/status (--pid, same host) or from
+/api/admin/diagnostics/memory (--admin-email; also reports traced bytes when tracemalloc is on).
+After --warmup-requests, a checkpoint is taken every --checkpoint requests and the growth rate
+is the least-squares slope of RSS over request count. With --tracemalloc-diff the run takes an
+admin snapshot after warm-up and prints the allocators that grew the most at the end (starts
+tracemalloc on the worker if needed). Exits 1 when growth exceeds --max-growth-mb per 10k.
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from scripts.loadtest import BENCH_PASSWORD, SCENARIOS, discover
+
+PER = 10_000
+
+
+def read_proc_rss(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    raise RuntimeError(f"VmRSS not found for pid {pid}")
+
+
+def slope_per(points: List[Tuple[int, int]], per: int = PER) -> float:
+    """Least-squares growth in bytes per `per` requests."""
+    if len(points) < 2:
+        return 0.0
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    var = sum((x - mean_x) ** 2 for x, _ in points)
+    if not var:
+        return 0.0
+    cov = sum((x - mean_x) * (y - mean_y) for x, y in points)
+    return cov / var * per
+
+
+class Probe:
+    """Reads the worker's memory from /proc or the admin diagnostics API."""
+
+    def __init__(self, client: httpx.AsyncClient, pid: Optional[int], admin_auth: Optional[httpx.BasicAuth]):
+        self.client = client
+        self.pid = pid
+        self.admin_auth = admin_auth
+
+    async def read(self) -> Dict[str, Any]:
+        if self.pid:
+            return {"rssBytes": read_proc_rss(self.pid), "tracedBytes": None}
+        response = await self.client.get("/api/admin/diagnostics/memory", auth=self.admin_auth)
+        response.raise_for_status()
+        data = response.json()
+        return {"rssBytes": data["rssBytes"], "tracedBytes": data["tracemalloc"]["tracedBytes"] or None}
+
+
+async def soak(args: argparse.Namespace) -> int:
+    admin_auth = httpx.BasicAuth(args.admin_email, args.admin_password) if args.admin_email else None
+    if not args.pid and admin_auth is None:
+        raise SystemExit("Pass --pid (same host) or --admin-email to read the worker's memory")
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=httpx.Timeout(30.0)) as client:
+        ctx = await discover(client, args.users, admin_auth, args.no_cache)
+        probe = Probe(client, args.pid, admin_auth)
+        scenarios = [SCENARIOS[name] for name in args.scenarios]
+        total = args.warmup_requests + args.requests
+        state = {"sent": 0, "errors": 0, "next": args.warmup_requests}
+        checkpoints: List[Dict[str, Any]] = []
+        snapshot_id = None
+        started = time.perf_counter()
+
+        async def checkpoint(done: int) -> None:
+            nonlocal snapshot_id
+            reading = await probe.read()
+            reading["requests"] = done - args.warmup_requests
+            checkpoints.append(reading)
+            traced = f"  traced {reading['tracedBytes'] / 2**20:8.1f} MiB" if reading["tracedBytes"] else ""
+            print(f"  {reading['requests']:>9,} req  rss {reading['rssBytes'] / 2**20:8.1f} MiB{traced}"
+                  f"  errors {state['errors']}  {time.perf_counter() - started:6.0f}s")
+            if args.tracemalloc_diff and snapshot_id is None:
+                await client.post("/api/admin/diagnostics/memory/tracemalloc", params={"frames": 10}, auth=admin_auth)
+                snap = await client.post("/api/admin/diagnostics/memory/snapshots", params={"label": "soak baseline"}, auth=admin_auth)
+                snapshot_id = snap.json()["id"]
+
+        async def worker(index: int) -> None:
+            rng = random.Random(f"{args.seed}:soak:{index}")
+            while state["sent"] < total:
+                state["sent"] += 1
+                try:
+                    response = await rng.choice(scenarios)(client, ctx, rng, index)
+                    if response.status_code >= 400:
+                        state["errors"] += 1
+                except httpx.HTTPError:
+                    state["errors"] += 1
+                if state["sent"] >= state["next"]:
+                    state["next"] += args.checkpoint
+                    await checkpoint(state["sent"])
+
+        await asyncio.gather(*(worker(i) for i in range(args.concurrency)))
+
+        points = [(c["requests"], c["rssBytes"]) for c in checkpoints]
+        growth = slope_per(points)
+        print(f"\nRSS growth: {growth / 2**20:.2f} MiB per {PER:,} requests "
+              f"({len(checkpoints)} checkpoints, {state['errors']} errors)")
+        traced_points = [(c["requests"], c["tracedBytes"]) for c in checkpoints if c["tracedBytes"]]
+        if len(traced_points) >= 2:
+            print(f"Traced heap growth: {slope_per(traced_points) / 2**20:.2f} MiB per {PER:,} requests")
+        if snapshot_id is not None:
+            diff = (await client.get("/api/admin/diagnostics/memory/diff", params={"base": snapshot_id, "limit": 15},
+                                     auth=admin_auth)).json()
+            print("\nTop growing allocators since warm-up:")
+            for stat in diff.get("top", []):
+                print(f"  {stat['sizeDiffBytes'] / 1024:>10.1f} KiB  {stat['countDiff']:>8,} blocks  {stat['location']}")
+        if args.max_growth_mb is not None and growth / 2**20 > args.max_growth_mb:
+            print(f"\nFAIL: growth above {args.max_growth_mb} MiB per {PER:,} requests", file=sys.stderr)
+            return 1
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--pid", type=int, help="Worker process id (read /proc/<pid>/status)")
+    parser.add_argument("--admin-email", help="Admin account for /api/admin/diagnostics/memory")
+    parser.add_argument("--admin-password", default=BENCH_PASSWORD)
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=["catalog", "product_detail", "cart"])
+    parser.add_argument("--requests", type=int, default=100_000, help="Measured requests after warm-up")
+    parser.add_argument("--warmup-requests", type=int, default=10_000, help="Requests before the first checkpoint")
+    parser.add_argument("--checkpoint", type=int, default=PER, help="Requests between memory readings")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--users", type=int, default=200, help="Distinct bench users for cart/checkout")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the microcache for anonymous GETs")
+    parser.add_argument("--tracemalloc-diff", action="store_true", help="Diff admin tracemalloc snapshots (needs --admin-email)")
+    parser.add_argument("--max-growth-mb", type=float, help="Fail above this RSS growth (MiB per 10k requests)")
+    args = parser.parse_args(argv)
+    if args.tracemalloc_diff and not args.admin_email:
+        parser.error("--tracemalloc-diff needs --admin-email")
+    return asyncio.run(soak(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
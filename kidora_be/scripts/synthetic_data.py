@@ -0,0 +1,383 @@
+"""Synthetic data generator for scale testing: bulk-loads the app's tables with COPY.
+
+Rows are generated in Python from a seeded RNG (same arguments, same data) and streamed into
+Postgres with psycopg's COPY protocol, one table at a time:
+
+    python -m scripts.synthetic_data --database-url postgresql://localhost/kidora_scale
+    python -m scripts.synthetic_data --database-url ... --scale 0.01          # quick 1% run
+    python -m scripts.synthetic_data --database-url ... --order-sizes 1:40,2:30,3:15,4:10,6:5 \\
+        --popularity-exponent 1.3 --category-skew 1.5
+
+Default volumes are production scale: 200k users, 500k products (all with sizes_stock),
+5M orders with ~2.1 items each, carts, wishlists and return requests. Distributions:
+
+- category skew: Zipf weights over the category list (--category-skew, 0 = uniform)
+- product popularity: Zipf weights over products for order, cart and wishlist items
+  (--popularity-exponent); a shuffled rank so popular products are spread across ids/categories
+- order size: explicit "items:weight" pairs (--order-sizes)
+- buyer activity: Zipf weights over users (--buyer-exponent), a few heavy buyers
+
+Generated users are synth<N>@example.test (password "synthetic"); the run refuses to add a
+second batch on top of an existing one. Only for dedicated databases.
+"""
+import argparse
+import bisect
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import create_engine, text
+
+SYNTH_MARKER = "synth%@example.test"
+SYNTH_PASSWORD = "synthetic"
+
+VOLUMES = {
+    "users": 200_000,
+    "products": 500_000,
+    "orders": 5_000_000,
+    "cart_rate": 0.25,       # share of users with a cart
+    "wishlist_rate": 0.15,   # share of users with a wishlist
+    "return_rate": 0.03,     # share of delivered orders with a return request
+    "hero_banners": 20,
+}
+
+CATEGORIES = ["kids", "boys", "girls", "baby", "toys", "shoes", "accessories", "school", "winter", "summer"]
+SIZES = ["XS", "S", "M", "L", "XL", "XXL"]
+ORDER_STATUSES = [("PENDING", 8), ("CONFIRMED", 6), ("PACKED", 4), ("SHIPPED", 7), ("DELIVERED", 65), ("CANCELLED", 10)]
+PAYMENT_METHODS = [("COD", 70), ("bkash", 20), ("nagad", 7), ("rocket", 3)]
+CITIES = ["Dhaka", "Chattogram", "Khulna", "Rajshahi", "Sylhet", "Barishal", "Rangpur", "Mymensingh"]
+DEFAULT_ORDER_SIZES = "1:45,2:25,3:14,4:8,5:5,8:3"
+
+
+# ---- distributions -----------------------------------------------------------------------
+
+def zipf_cum_weights(n: int, exponent: float) -> List[float]:
+    """Cumulative Zipf weights for ranks 1..n (exponent 0 gives a uniform distribution)."""
+    return list(itertools.accumulate(1.0 / (rank ** exponent) for rank in range(1, n + 1)))
+
+
+def parse_weights(spec: str) -> Tuple[List[int], List[float]]:
+    """'1:45,2:25,...' -> ([1, 2, ...], cumulative weights)."""
+    values, weights = [], []
+    for part in spec.split(","):
+        value, _, weight = part.partition(":")
+        values.append(int(value))
+        weights.append(float(weight or 1))
+    if not values or min(values) < 1:
+        raise argparse.ArgumentTypeError(f"invalid order sizes: {spec!r}")
+    return values, list(itertools.accumulate(weights))
+
+
+class Sampler:
+    """Draw from a fixed population with cumulative weights (bisect, no per-draw allocation)."""
+
+    def __init__(self, rng: random.Random, population: Sequence[Any], cum_weights: List[float]):
+        self.rng = rng
+        self.population = population
+        self.cum_weights = cum_weights
+        self.total = cum_weights[-1]
+
+    def __call__(self) -> Any:
+        return self.population[bisect.bisect_right(self.cum_weights, self.rng.random() * self.total)]
+
+
+def _weighted(rng: random.Random, pairs: Sequence[Tuple[str, float]]) -> Sampler:
+    return Sampler(rng, [v for v, _ in pairs], list(itertools.accumulate(w for _, w in pairs)))
+
+
+# ---- COPY helpers ------------------------------------------------------------------------
+
+def _check_columns(table: str, columns: Sequence[str]) -> None:
+    # Keep the generator honest against the models: fail before loading anything stale
+    from app.migrations.versions import Base  # importing versions registers every model
+
+    known = set(Base.metadata.tables[table].columns.keys())
+    missing = [c for c in columns if c not in known]
+    if missing:
+        raise SystemExit(f"{table}: columns {missing} are not on the model; update scripts/synthetic_data.py")
+
+
+def copy_rows(conn, table: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> int:
+    """Stream rows into `table` with COPY and commit; returns the row count."""
+    _check_columns(table, columns)
+    started = time.perf_counter()
+    count = 0
+    with conn.cursor() as cur:
+        with cur.copy(f"COPY {table} ({', '.join(columns)}) FROM STDIN") as copy:
+            for row in rows:
+                copy.write_row(row)
+                count += 1
+    conn.commit()
+    _report(table, count, time.perf_counter() - started)
+    return count
+
+
+def copy_file(conn, table: str, columns: Sequence[str], path: str, count: int) -> None:
+    """COPY a pre-rendered text-format file (used for order_items, written alongside orders)."""
+    _check_columns(table, columns)
+    started = time.perf_counter()
+    with conn.cursor() as cur, open(path, "rb") as f:
+        with cur.copy(f"COPY {table} ({', '.join(columns)}) FROM STDIN") as copy:
+            while chunk := f.read(1 << 20):
+                copy.write(chunk)
+    conn.commit()
+    _report(table, count, time.perf_counter() - started)
+
+
+def _report(table: str, count: int, elapsed: float) -> None:
+    rate = count / elapsed if elapsed else 0
+    print(f"  {table:<16} {count:>11,} rows  {elapsed:7.1f}s  {rate:>10,.0f} rows/s")
+
+
+def _next_id(conn, table: str) -> int:
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT coalesce(max(id), 0) + 1 FROM {table}")
+        return cur.fetchone()[0]
+
+
+def _sync_sequence(conn, table: str) -> None:
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT coalesce(max(id), 1) FROM {table}))")
+    conn.commit()
+
+
+# ---- generation --------------------------------------------------------------------------
+
+class Generator:
+    def __init__(self, args: argparse.Namespace):
+        self.rng = random.Random(args.seed)
+        self.now = datetime.utcnow().replace(microsecond=0)
+        self.days = args.days
+        self.n_users = max(1, int(VOLUMES["users"] * args.scale))
+        self.n_products = max(1, int(VOLUMES["products"] * args.scale))
+        self.n_orders = int(VOLUMES["orders"] * args.scale)
+        self.category = Sampler(self.rng, CATEGORIES, zipf_cum_weights(len(CATEGORIES), args.category_skew))
+        sizes, size_weights = parse_weights(args.order_sizes)
+        self.order_size = Sampler(self.rng, sizes, size_weights)
+        self.status = _weighted(self.rng, ORDER_STATUSES)
+        self.payment = _weighted(self.rng, PAYMENT_METHODS)
+        self.popularity_exponent = args.popularity_exponent
+        self.buyer_exponent = args.buyer_exponent
+        # Filled as tables are loaded
+        self.user_ids: List[int] = []
+        self.product_ids: List[int] = []
+        self.product_prices: Dict[int, float] = {}
+        self.product_sizes: Dict[int, List[str]] = {}
+
+    def _timestamp(self) -> datetime:
+        return self.now - timedelta(seconds=self.rng.random() * self.days * 86400)
+
+    def users(self, first_id: int) -> Iterator[Tuple]:
+        for i in range(self.n_users):
+            n = i + 1
+            self.user_ids.append(first_id + i)
+            yield (first_id + i, "Synthetic", f"User {n}", f"synth{n}@example.test", f"0171{n:07d}", SYNTH_PASSWORD, "USER")
+
+    def products(self, first_id: int) -> Iterator[Tuple]:
+        rng = self.rng
+        descriptions = ["Soft cotton, machine washable. " * (1 + k) for k in range(20)]
+        for i in range(self.n_products):
+            pid = first_id + i
+            start = rng.randrange(0, 3)
+            sizes = SIZES[start:start + rng.randint(2, 4)]
+            sizes_stock = {s: rng.randrange(0, 40) for s in sizes}
+            price = round(100 + rng.random() ** 2 * 4900, 2)
+            self.product_ids.append(pid)
+            self.product_prices[pid] = price
+            self.product_sizes[pid] = sizes
+            yield (
+                pid,
+                f"Synthetic product {i + 1}",
+                descriptions[i % 20],
+                price,
+                self.category(),
+                sum(sizes_stock.values()),
+                round(rng.random() * 5, 1),
+                rng.choice((0, 0, 0, 5, 10, 15, 20)),
+                f"/media/products/synth-{i + 1}.jpg",
+                f'["/media/products/synth-{i + 1}-1.jpg", "/media/products/synth-{i + 1}-2.jpg"]',
+                json.dumps(sizes_stock),
+                rng.random() < 0.2,
+            )
+
+    def popular_products(self) -> Sampler:
+        # Popularity rank is shuffled over ids so hot products are not just the lowest ids
+        ranked = list(self.product_ids)
+        self.rng.shuffle(ranked)
+        return Sampler(self.rng, ranked, zipf_cum_weights(len(ranked), self.popularity_exponent))
+
+    def orders(self, first_id: int, first_item_id: int, items_file) -> Iterator[Tuple]:
+        """Yield order rows; their items are written to `items_file` in COPY text format."""
+        rng = self.rng
+        product = self.popular_products()
+        buyers = list(self.user_ids)
+        rng.shuffle(buyers)
+        buyer = Sampler(rng, buyers, zipf_cum_weights(len(buyers), self.buyer_exponent))
+        item_id = first_item_id
+        self.order_item_count = 0
+        self.delivered: List[Tuple[int, int, datetime]] = []
+        for i in range(self.n_orders):
+            oid = first_id + i
+            uid = buyer()
+            created = self._timestamp()
+            status = self.status()
+            total = 0.0
+            lines = []
+            for pid in {product() for _ in range(self.order_size())}:
+                qty = 1 if rng.random() < 0.8 else rng.randint(2, 4)
+                price = self.product_prices[pid]
+                total += price * qty
+                lines.append(f"{item_id}\t{oid}\t{pid}\t{qty}\t{rng.choice(self.product_sizes[pid])}\t{price}\n")
+                item_id += 1
+            items_file.write("".join(lines).encode())
+            self.order_item_count += len(lines)
+            if status == "DELIVERED":
+                self.delivered.append((oid, uid, created))
+            payment = self.payment()
+            yield (
+                oid, uid, "Synthetic User", "01700000000", f"{rng.randint(1, 200)} Test Road", rng.choice(CITIES),
+                "Dhaka", "1200", "Bangladesh", payment,
+                None if payment == "COD" else payment, round(total, 2), status,
+                "PAID" if status in ("DELIVERED", "SHIPPED") or payment != "COD" else "PENDING",
+                created, created,
+            )
+
+    def carts(self, first_id: int, rate: float) -> Iterator[Tuple]:
+        self.cart_ids = []
+        for i, uid in enumerate(u for u in self.user_ids if self.rng.random() < rate):
+            self.cart_ids.append(first_id + i)
+            yield (first_id + i, uid, self.now, self.now)
+
+    def cart_items(self) -> Iterator[Tuple]:
+        product = self.popular_products()
+        for cid in self.cart_ids:
+            seen = set()
+            for _ in range(self.rng.randint(1, 5)):
+                pid = product()
+                size = self.rng.choice(self.product_sizes[pid])
+                if (pid, size) in seen:
+                    continue
+                seen.add((pid, size))
+                yield (cid, pid, size, self.rng.randint(1, 3), self.now, self.now)
+
+    def wishlists(self, first_id: int, rate: float) -> Iterator[Tuple]:
+        self.wishlist_owners = []
+        for i, uid in enumerate(u for u in self.user_ids if self.rng.random() < rate):
+            self.wishlist_owners.append((first_id + i, uid))
+            yield (first_id + i, uid, self.now, self.now)
+
+    def wishlist_items(self) -> Iterator[Tuple]:
+        product = self.popular_products()
+        for wid, uid in self.wishlist_owners:
+            for pid in {product() for _ in range(self.rng.randint(1, 10))}:
+                yield (uid, wid, pid, self._timestamp())
+
+    def return_requests(self, rate: float) -> Iterator[Tuple]:
+        reasons = ("Wrong size", "Damaged item", "Changed my mind", "Not as described")
+        for oid, uid, created in self.delivered:
+            if self.rng.random() < rate:
+                ts = created + timedelta(days=3)
+                yield (oid, uid, self.rng.choice(reasons), "PENDING", ts, ts)
+
+    def hero_banners(self) -> Iterator[Tuple]:
+        for g in range(1, VOLUMES["hero_banners"] + 1):
+            ts = self.now - timedelta(days=g)
+            yield (f"Synthetic banner {g}", "Season sale", f"/media/banners/synth-{g}.jpg", "/sale", ts, ts)
+
+
+def generate(conn, args: argparse.Namespace) -> None:
+    gen = Generator(args)
+    print(f"Generating (scale {args.scale}, seed {args.seed}) ...")
+    t0 = time.perf_counter()
+
+    copy_rows(conn, "users", ["id", "first_name", "last_name", "email", "phone", "password", "role"],
+              gen.users(_next_id(conn, "users")))
+    copy_rows(conn, "products", ["id", "title", "description", "price", "category", "stock", "rating", "discount",
+                                 "main_image", "images", "sizes_stock", "free_shipping"],
+              gen.products(_next_id(conn, "products")))
+
+    with tempfile.NamedTemporaryFile(prefix="synth_order_items_", suffix=".copy", delete=False) as items_file:
+        items_path = items_file.name
+        copy_rows(conn, "orders", ["id", "user_id", "shipping_name", "shipping_phone", "shipping_street", "shipping_city",
+                                   "shipping_state", "shipping_zip_code", "shipping_country", "payment_method",
+                                   "payment_provider", "total_amount", "status", "payment_status", "created_at", "updated_at"],
+                  gen.orders(_next_id(conn, "orders"), _next_id(conn, "order_items"), items_file))
+    try:
+        copy_file(conn, "order_items", ["id", "order_id", "product_id", "quantity", "selected_size", "price"],
+                  items_path, gen.order_item_count)
+    finally:
+        os.unlink(items_path)
+
+    copy_rows(conn, "carts", ["id", "user_id", "created_at", "updated_at"],
+              gen.carts(_next_id(conn, "carts"), VOLUMES["cart_rate"]))
+    copy_rows(conn, "cart_items", ["cart_id", "product_id", "selected_size", "quantity", "created_at", "updated_at"],
+              gen.cart_items())
+    copy_rows(conn, "wishlists", ["id", "user_id", "created_at", "updated_at"],
+              gen.wishlists(_next_id(conn, "wishlists"), VOLUMES["wishlist_rate"]))
+    copy_rows(conn, "wishlist_items", ["user_id", "wishlist_id", "product_id", "created_at"], gen.wishlist_items())
+    copy_rows(conn, "return_requests", ["order_id", "user_id", "reason", "status", "created_at", "updated_at"],
+              gen.return_requests(VOLUMES["return_rate"]))
+    copy_rows(conn, "hero_banners", ["title", "subtitle", "image_url", "link_url", "created_at", "updated_at"],
+              gen.hero_banners())
+
+    # Ids were assigned here, so move the serial sequences past them
+    for table in ("users", "products", "orders", "order_items", "carts", "wishlists"):
+        _sync_sequence(conn, table)
+    started = time.perf_counter()
+    with conn.cursor() as cur:
+        cur.execute("ANALYZE")
+    conn.commit()
+    print(f"  {'ANALYZE':<16} {'':>11}       {time.perf_counter() - started:7.1f}s")
+    print(f"Done in {time.perf_counter() - t0:.1f}s")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--database-url", required=True, help="Dedicated scale-test database (never production)")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier for the default volumes")
+    parser.add_argument("--seed", type=int, default=42, help="RNG seed; same arguments produce the same data")
+    parser.add_argument("--days", type=int, default=365, help="Order history length")
+    parser.add_argument("--category-skew", type=float, default=1.1, help="Zipf exponent over categories (0 = uniform)")
+    parser.add_argument("--popularity-exponent", type=float, default=1.1, help="Zipf exponent of product popularity")
+    parser.add_argument("--buyer-exponent", type=float, default=0.8, help="Zipf exponent of orders per user")
+    parser.add_argument("--order-sizes", default=DEFAULT_ORDER_SIZES,
+                        help="Items-per-order distribution as items:weight pairs (default %(default)s)")
+    args = parser.parse_args(argv)
+    parse_weights(args.order_sizes)
+
+    # Importing the app needs a DATABASE_URL (normally from .env); the generator uses its own engine
+    os.environ.setdefault("DATABASE_URL", args.database_url)
+    from app.migrations.runner import run_migrations
+    from app.models.user import normalize_database_url
+
+    engine = create_engine(normalize_database_url(args.database_url), future=True)
+    run_migrations(engine)
+    with engine.connect() as sa_conn:
+        existing = sa_conn.execute(text("SELECT count(*) FROM users WHERE email LIKE :m"), {"m": SYNTH_MARKER}).scalar()
+    if existing:
+        print(f"Database already has {existing:,} synthetic users; use a fresh database", file=sys.stderr)
+        return 1
+
+    raw = engine.raw_connection()
+    try:
+        conn = raw.driver_connection  # psycopg connection, for COPY
+        with conn.cursor() as cur:
+            cur.execute("SET statement_timeout = 0")
+            # Nothing here needs to survive a crash until the final commit of each table
+            cur.execute("SET synchronous_commit = off")
+        conn.commit()
+        generate(conn, args)
+    finally:
+        raw.close()
+        engine.dispose()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())